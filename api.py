@@ -0,0 +1,203 @@
+#----------------------------------------------------------------------------#
+# Read-only JSON API.
+#----------------------------------------------------------------------------#
+import hashlib
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from bookings import check_bookings, make_booking
+from cache import cached_page
+from detail import artist_context, detail_view, venue_context
+from directory import estimated_count, name_page, venue_directory
+from models import db, Venue, Artist
+from pagination import page_size, InvalidCursor
+from show_calendar import calendar_query, calendar_range
+from show_listing import show_page
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Proposed shows one /shows/conflicts request may check.
+MAX_BOOKINGS = 10000
+
+
+def _default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+
+def dumps(data):
+  """JSON bytes; orjson when installed, the stdlib encoder otherwise."""
+  if orjson is not None:
+    return orjson.dumps(data)
+  return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def select_fields(data, fields):
+  """Keep only `fields` of a dict, or of every dict in a list."""
+  if not fields:
+    return data
+  if isinstance(data, list):
+    return [select_fields(item, fields) for item in data]
+  return {key: value for key, value in data.items() if key in fields}
+
+
+def requested_fields():
+  fields = request.args.get('fields')
+  return set(field.strip() for field in fields.split(',') if field.strip()) if fields else None
+
+
+def requested_past_limit():
+  """?past_limit= of a detail request, else PAST_SHOWS_LIMIT."""
+  value = request.args.get('past_limit')
+  if value is None:
+    return current_app.config.get('PAST_SHOWS_LIMIT')
+  return page_size(value, default=None)
+
+
+def json_response(data, status=200):
+  body = dumps(data)
+  response = Response(body, status=status, mimetype='application/json')
+  response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
+
+
+@api.after_request
+def conditional(response):
+  # Runs for cached and freshly built responses alike, so a matching
+  # If-None-Match turns either into an empty 304.
+  return response.make_conditional(request)
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+  return Response(dumps({'error': error.code, 'message': error.description}),
+                  status=error.code, mimetype='application/json')
+
+
+def name_listing(model):
+  """One keyset page of `model` by name, with the table's estimated size."""
+  try:
+    page = name_page(
+      db.session, model,
+      after=request.args.get('after'),
+      before=request.args.get('before'),
+      limit=page_size(request.args.get('limit')),
+    )
+  except InvalidCursor:
+    abort(400, 'invalid cursor')
+  return json_response({
+    'data': select_fields([row._asdict() for row in page.items], requested_fields()),
+    'next_cursor': page.next_cursor,
+    'prev_cursor': page.prev_cursor,
+    'estimated_total': estimated_count(db.session, model),
+  })
+
+
+@api.route('/venues')
+@cached_page(lambda: ['venues'])
+def venue_areas():
+  """Venues grouped by area; ?group=none lists them by name, a page at a time."""
+  if request.args.get('group') == 'none':
+    return name_listing(Venue)
+  fields = requested_fields()
+  areas = venue_directory(db.session)
+  if fields:
+    for area in areas:
+      area['venues'] = select_fields(area['venues'], fields)
+  return json_response({'areas': areas})
+
+
+@api.route('/venues/<int:venue_id>')
+@cached_page(lambda venue_id: ['venue:{}'.format(venue_id)])
+@detail_view(Venue, past_limit=requested_past_limit)
+def venue(venue, shows):
+  return json_response(select_fields(venue_context(venue, shows), requested_fields()))
+
+
+@api.route('/artists')
+@cached_page(lambda: ['artists'])
+def artist_names():
+  return name_listing(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+@cached_page(lambda artist_id: ['artist:{}'.format(artist_id)])
+@detail_view(Artist, past_limit=requested_past_limit)
+def artist(artist, shows):
+  return json_response(select_fields(artist_context(artist, shows), requested_fields()))
+
+
+@api.route('/shows')
+@cached_page(lambda: ['shows'])
+def shows():
+  """Shows by start time; ?from=&to=&city= narrows them to a calendar range."""
+  try:
+    calendar = calendar_range(request.args)
+  except ValueError as e:
+    abort(400, str(e))
+  try:
+    page = show_page(
+      db.session,
+      after=request.args.get('after'),
+      before=request.args.get('before'),
+      limit=page_size(request.args.get('limit')),
+      query=calendar_query(db.session, calendar) if calendar is not None else None,
+    )
+  except InvalidCursor:
+    abort(400, 'invalid cursor')
+  data = [row._asdict() for row in page.items]
+  body = {
+    'data': select_fields(data, requested_fields()),
+    'next_cursor': page.next_cursor,
+    'prev_cursor': page.prev_cursor,
+  }
+  if calendar is not None:
+    body['range'] = {'from': calendar.start, 'to': calendar.end, 'city': calendar.city}
+  return json_response(body)
+
+
+def _timestamp(value):
+  if value is None:
+    return None
+  if not isinstance(value, str):
+    raise ValueError('timestamps must be ISO 8601 strings')
+  return datetime.fromisoformat(value)
+
+
+# The one POST of the API: a batch of proposals is too large for a query
+# string, but the check only reads, so it belongs with the other reads.
+@api.route('/shows/conflicts', methods=['POST'])
+def show_conflicts():
+  """Check a batch of proposed shows for double bookings; nothing is written.
+
+  Body: {"shows": [{"venue_id", "artist_id", "start_time", "end_time"?}, ...]}.
+  Each result lists the existing shows, or earlier proposals of the batch,
+  that the proposal overlaps.
+  """
+  payload = request.get_json(silent=True)
+  proposals = payload.get('shows') if isinstance(payload, dict) else None
+  if not isinstance(proposals, list):
+    abort(400, 'expected {"shows": [...]}')
+  if len(proposals) > MAX_BOOKINGS:
+    abort(400, 'at most {} shows per request'.format(MAX_BOOKINGS))
+  bookings = []
+  for n, proposal in enumerate(proposals):
+    try:
+      bookings.append(make_booking(proposal.get('venue_id'), proposal.get('artist_id'),
+                                   _timestamp(proposal.get('start_time')), _timestamp(proposal.get('end_time'))))
+    except (AttributeError, ValueError) as e:
+      abort(400, 'shows[{}]: {}'.format(n, e))
+  results = check_bookings(db.session, bookings)
+  return json_response({'data': [
+    {'ok': not conflicts, 'conflicts': [conflict._asdict() for conflict in conflicts]} for conflicts in results
+  ]})
@@ -2,144 +2,162 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from datetime import timedelta
+import click
+from flask import Flask, current_app, render_template, request, flash, redirect, url_for, abort, jsonify
+from flask.cli import AppGroup, ScriptInfo
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-from models import *
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
-
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import import_string
+from models import db, Venue, Artist, Show
+from bookings import conflicting_shows, find_conflicts, make_booking
+from detail import artist_context, detail_view, venue_context
+from assets import Assets
+from cache import PageCache, cached_page
+from counters import ShowRollover, delete_venue_shows, record_new_show
+from database import engine_options, init_statement_timeouts, pool_status, statement_timeout
+from directory import estimated_count, name_page, venue_directory
+from formatting import format_datetime
+from group_commit import GroupCommit
+from instrumentation import SqlProfiler, query_budget
+from genres import GenreFilter, encode_genres, genre_criterion, invalidate_genre_index
+from pagination import page_size, InvalidCursor
+from replicas import Replicas, replica_reads
+from show_calendar import ARGS as CALENDAR_ARGS, by_day, calendar_query, calendar_range
+from show_listing import show_page, show_tiles, stream_template
+from show_partitions import ShowPartitions
+from templating import Templates
+from typeahead import Typeahead, refresh_typeahead
+from search import venue_search, artist_search, invalidate_search_index, DEFAULT_LIMIT as SEARCH_LIMIT
+# Forms (wtforms), babel, Flask-Migrate (alembic) and the CLI commands are
+# imported where they are first needed, so a web worker starts without
+# them; benchmarks.bench_startup keeps an eye on that.
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+# Registered on each app by create_app(), under the same endpoint names.
+ROUTES = []
+
+
+def route(rule, **options):
+  def decorator(view):
+    ROUTES.append((rule, view.__name__, view, options))
+    return view
+  return decorator
+
+
+@route('/')
 def index():
   return render_template('pages/home.html')
 
 
+def venue_tags(venue_id):
+  """Cache tags of every page that renders this venue."""
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:{}'.format(venue_id)] + ['artist:{}'.format(id) for (id,) in artist_ids]
+
+
+def artist_tags(artist_id):
+  """Cache tags of every page that renders this artist."""
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artists', 'shows', 'artist:{}'.format(artist_id)] + ['venue:{}'.format(id) for (id,) in venue_ids]
+
+
+def invalidate_indexes(model=None):
+  """Drop the in-process search and genre indexes after a write."""
+  invalidate_search_index(model)
+  invalidate_genre_index(model)
+
+
+def invalidate_pages(*tags):
+  current_app.extensions['page_cache'].invalidate(*tags)
+
+
+def rolled_over(venue_ids, artist_ids):
+  invalidate_pages('venues', 'artists', *(['venue:{}'.format(id) for id in venue_ids] +
+                                          ['artist:{}'.format(id) for id in artist_ids]))
+  refresh_typeahead(db.session, 'venues', *venue_ids)
+  refresh_typeahead(db.session, 'artists', *artist_ids)
+
+
+def write(work):
+  """work(session)'s result once committed, grouped with other requests' writes under GROUP_COMMIT."""
+  return current_app.extensions['group_commit'].run(work)
+
+
+def insert(session, row):
+  session.add(row)
+  session.flush()
+  return row.id
+
+
+def book_show(booking):
+  """A write adding the show unless it's double-booked: (show id, []) or (None, conflicting shows)."""
+  def work(session):
+    conflicts = conflicting_shows(session, find_conflicts(session, booking))
+    if conflicts:
+      return None, conflicts
+    show = Show(**booking._asdict())
+    show_id = insert(session, show)
+    record_new_show(session, show)
+    return show_id, []
+  return work
+
+
+def search_paging():
+  try:
+    offset = max(0, int(request.args.get('offset', 0)))
+  except ValueError:
+    offset = 0
+  return {'limit': page_size(request.args.get('limit'), default=SEARCH_LIMIT), 'offset': offset}
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@route('/venues')
+# Off Postgres, a genre filter may check and rebuild the bitmap index first.
+@query_budget(3)
+@cached_page(lambda: ['venues'])
 def venues():
-  venues = Venue.query.order_by(Venue.state, Venue.city).all()
-  venue_data = []
-  temp_data  = {}
-
-  city = None
-  state = None
-
-  for item in venues:
-    single_venue = {
-      'id': item['id'],
-      'name': item['name'],
-      'future_show_count': len(list(filter(lambda x: x.start_time > datetime.today(), item['shows'])))
-    }
-
-    if item['city'] == city and item['state'] == state:
-      temp_data['venue'].append(single_venue)
-    else:
-      if city is not None:
-        venue_data.append(temp_data)
-      temp_data['city'] = item['city']
-      temp_data['state'] = item['state']
-      temp_data['venue'] = [single_venue]
-    city = item['city']
-    state = item['state']
-  venue_data.append(temp_data)
+  genre_filter = GenreFilter.from_args(request.args)
+  criterion = genre_criterion(db.session, Venue, genre_filter) if genre_filter else None
+  venue_data = venue_directory(db.session, criterion=criterion)
   return render_template('pages/venues.html', areas=venue_data)
 
-@app.route('/venues/search', methods=['POST'])
+@route('/venues/search', methods=['POST'])
+@query_budget(3)
+@statement_timeout('SEARCH_STATEMENT_TIMEOUT')
+@replica_reads
 def search_venues():
   search_query = request.form.get('search_term', '')
-  result = Venue.query.filter(Venue.name.ilike(f'%{search_query}%')).all()
-  query_data = []
-
-  for item in result:
-    query_data.append({
-      'id': item['id'],
-      'name': item['name'],
-      'future_show_count': len(db.session.query(Show).filter(Show.venue_id ==item.id).filter(Show.start_time > datetime.now()).all())
-    })
-  response={
-    "count": len(result),
-    "data": query_data
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-
-  venue = Venue.query.get(venue_id)
-  future_shows = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time>datetime.now()).all()
-  future_shows_array = []
-
-  previous_show = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time<datetime.now()).all()
-  previous_show_array = []
-
-  for show in previous_show:
-    previous_show_array.append({
-      "artist_id": show['artist_id'],
-      "artist_name": show['artist'].name,
-      "artist_image_link": show['artist'].image_link,
-      "start_time": show['start_time'].strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  for show in future_shows:
-    future_shows_array.append({
-      "artist_id": show['artist_id'],
-      "artist_name": show['artist'].name,
-      "artist_image_link": show['artist'].image_link,
-      "start_time": show['start_time'].strftime("%Y-%m-%d %H:%M:%S")    
-    })
-  venue_data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description": venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": previous_show_array,
-    "upcoming_shows": future_shows_array,
-    "past_shows_count": len(previous_show_array),
-    "upcoming_shows_count": len(future_shows_array),
-  }
+  response = venue_search(db.session, search_query, **search_paging())
+  return render_template('pages/search_venues.html', results=response._asdict(), search_term=search_query)
 
-  return render_template('pages/show_venue.html', venue=venue_data)
+@route('/venues/<int:venue_id>')
+@query_budget(2)
+@cached_page(lambda venue_id: ['venue:{}'.format(venue_id)])
+@detail_view(Venue, past_limit=lambda: current_app.config.get('PAST_SHOWS_LIMIT'))
+def show_venue(venue, shows):
+  return render_template('pages/show_venue.html', venue=venue_context(venue, shows))
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@route('/venues/create', methods=['GET'])
 def create_venue_form():
+  from forms import VenueForm
   form = VenueForm()
 
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@route('/venues/create', methods=['POST'])
 def create_venue_submission():
+  from forms import VenueForm
   form = VenueForm(request.form)
   error = False
   try:
@@ -149,13 +167,18 @@ def create_venue_submission():
       state =form.state.data,
       address =form.address.data,
       phone =form.phone.data,
-      tmp_genres =form.getlist('genres'),
-      genres = ','.join(tmp_genres),
+      genre_ids =encode_genres(form.genres.data),
+      image_link =form.image_link.data,
       facebook_link =form.facebook_link.data,
+      venue_web_url =form.website_link.data,
+      seeking_talent =form.seeking_talent.data,
+      talent_description =form.seeking_description.data,
       )
-    
-    db.session.add(venue)
-    db.session.commit()
+
+    venue_id = write(lambda session: insert(session, venue))
+    invalidate_indexes(Venue)
+    invalidate_pages('venues')
+    refresh_typeahead(db.session, 'venues', venue_id)
   except:
     error = True
     db.session.rollback()
@@ -163,17 +186,24 @@ def create_venue_submission():
     db.session.close()
     if error:
         flash('ooopps, an error occured. Venue ' +
-              venue.name + ' Could not be listed!')
+              form.name.data + ' Could not be listed!')
     else:
-        flash('Venue ' + venue.name +  ' was successfully listed!')
+        flash('Venue ' + form.name.data +  ' was successfully listed!')
   return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
+  error = False
   try:
     delete = Venue.query.get(venue_id)
+    tags = venue_tags(delete.id)
+    deleted_id = delete.id
+    delete_venue_shows(db.session, deleted_id)
     db.session.delete(delete)
     db.session.commit()
+    invalidate_indexes(Venue)
+    invalidate_pages(*tags)
+    refresh_typeahead(db.session, 'venues', deleted_id)
   except:
     error = True
     db.session.rollback()
@@ -187,88 +217,63 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@route('/artists')
+# Off Postgres, a genre filter may check and rebuild the bitmap index first.
+@query_budget(3)
+@cached_page(lambda: ['artists'])
 def artists():
-
-  artists = Artist.query.all()
-  
-  return render_template('pages/artists.html', artists=artists)
-
-@app.route('/artists/search', methods=['POST'])
+  genre_filter = GenreFilter.from_args(request.args)
+  criterion = genre_criterion(db.session, Artist, genre_filter) if genre_filter else None
+  try:
+    page = name_page(
+      db.session, Artist,
+      criterion=criterion,
+      after=request.args.get('after'),
+      before=request.args.get('before'),
+      limit=page_size(request.args.get('limit')),
+    )
+  except InvalidCursor:
+    abort(400)
+  # Statistics only cover the whole table; a filtered listing has no total.
+  total = estimated_count(db.session, Artist) if criterion is None else None
+  filters = dict((key, values) for key, values in request.args.lists() if key not in ('after', 'before'))
+  return render_template('pages/artists.html', artists=page.items, page=page, total=total, filters=filters)
+
+@route('/artists/search', methods=['POST'])
+@query_budget(3)
+@statement_timeout('SEARCH_STATEMENT_TIMEOUT')
+@replica_reads
 def search_artists():
   search_query = request.form.get('search_term', '')
-  artist_result = Artist.query.filter(Artist.name.ilike(f'%{search_query}%')).all()
-  Artist_data = []
-
-
-  for item in artist_result:
-    Artist_data.append({
-      'id': item['id'],
-      'name': item['name'],
-      'total_upcoming_shows': Show.query.filter(Show.id == item['id']).filter(Show.start_time > datetime.now()).all(),
-    })
-
-  response={
-    "count": len(artist_result),
-    "data": Artist_data
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-
-
+  response = artist_search(db.session, search_query, **search_paging())
+  return render_template('pages/search_artists.html', results=response._asdict(), search_term=search_query)
 
-  artist = Artist.query.get(artist_id)
-
-  artist_data = artist.to_dict()
-  
-  future_shows = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
-  future_shows_array = []
-
-  previous_show = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time<datetime.now()).all()
-  previous_show_array = []
-
-  for show in previous_show:
-    previous_show_array.append({
-      "artist_id": show['artist_id'],
-      "artist_name": show['artist'].name,
-      "artist_image_link": show['artist'].image_link,
-      "start_time": show['start_time'].strftime('%Y-%m-%d %H:%M:%S')
-    })
-
-  for show in future_shows:
-    future_shows_array.append({
-      "artist_id": show['artist_id'],
-      "artist_name": show['artist'].name,
-      "artist_image_link": show['artist'].image_link,
-      "start_time": show['start_time'].strftime("%Y-%m-%d %H:%M:%S")    
-    })
-  artist_data['previous_shows'] = previous_show_array
-  artist_data['future_shows'] = future_shows_array
-  artist_data['previous_shows_count'] = len(previous_shows)
-  artist_data['future_shows_count'] = len(future_shows)
-  
-  return render_template('pages/show_artist.html', artist=artist_data)
+@route('/artists/<int:artist_id>')
+@query_budget(2)
+@cached_page(lambda artist_id: ['artist:{}'.format(artist_id)])
+@detail_view(Artist, past_limit=lambda: current_app.config.get('PAST_SHOWS_LIMIT'))
+def show_artist(artist, shows):
+  return render_template('pages/show_artist.html', artist=artist_context(artist, shows))
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
+  from forms import ArtistForm
   form = ArtistForm()
   artist= Artist.query.get(artist_id)
 
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-
-
-
+  invalidate_pages(*artist_tags(artist_id))
+  refresh_typeahead(db.session, 'artists', artist_id)
   return redirect(url_for('show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
+  from forms import VenueForm
   form = VenueForm()
   venue={
     "id": 1,
@@ -287,38 +292,44 @@ def edit_venue(venue_id):
 
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-
-
+  invalidate_pages(*venue_tags(venue_id))
+  refresh_typeahead(db.session, 'venues', venue_id)
   return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@route('/artists/create', methods=['GET'])
 def create_artist_form():
+  from forms import ArtistForm
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@route('/artists/create', methods=['POST'])
 def create_artist_submission():
+  from forms import ArtistForm
   form = ArtistForm(request.form)
   error = False
   try:
-      artist = Artist.query.get(artist_id)
-      artist['name'] = form.name.data
-      artist['city'] = form.city.data
-      artist['state'] = form.state.data
-      artist['phone'] = form.phone.data
-      tmp_genres = form.getlist('genres')
-      artist['genres'] = ','.join(tmp_genres)
-      artist['website'] = form.website.data
-      artist['image_link'] = form.image_link.data
-      artist['facebook_link'] = form.facebook_link.data
-      artist['seeking_description'] = form.seeking_description.data
-      db.session.add(artist)
-      db.session.commit()
+      artist = Artist(
+        name=form.name.data,
+        city=form.city.data,
+        state=form.state.data,
+        phone=form.phone.data,
+        genres=form.genres.data,
+        genre_ids=encode_genres(form.genres.data),
+        artist_web_url=form.website_link.data,
+        image_link=form.image_link.data,
+        facebook_link=form.facebook_link.data,
+        artist_seeking_talent=form.seeking_venue.data,
+        artist_talent_description=form.seeking_description.data,
+      )
+      artist_id = write(lambda session: insert(session, artist))
+      invalidate_indexes(Artist)
+      invalidate_pages(*artist_tags(artist_id))
+      refresh_typeahead(db.session, 'artists', artist_id)
   except:
       error = True
       db.session.rollback()
@@ -327,76 +338,192 @@ def create_artist_submission():
       if error:
           return redirect(url_for('server_error'))
       else:
-          flash('Artist ' + artist.name + ' was successfully listed!')
+          flash('Artist ' + form.name.data + ' was successfully listed!')
           return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@route('/shows')
+@query_budget(1)
+@cached_page(lambda: ['shows'])
 def shows():
-  show_data = []
-  shows = Show.query.all()
-  
-  for show in shows:
-      show_data.append({
-          "venue_id": show['venue'].id,
-          "venue_name": show['venue'].name,
-          "artist_id": show['artist'].id,
-          "artist_name": show['artist'].name,
-          "artist_image_link": show['artist'].image_link,
-          "start_time": format_datetime(str(show.start_time))
-      })
-  return render_template('pages/shows.html', shows=show_data)
-
-@app.route('/shows/create', methods=['GET'])
+  try:
+    calendar = calendar_range(request.args)
+    page = show_page(
+      db.session,
+      after=request.args.get('after'),
+      before=request.args.get('before'),
+      limit=page_size(request.args.get('limit')),
+      query=calendar_query(db.session, calendar) if calendar is not None else None,
+    )
+  except ValueError:
+    # A `from` or `to` calendar_range() can't use, or an InvalidCursor.
+    abort(400)
+  if calendar is not None:
+    filters = dict((key, request.args[key]) for key in CALENDAR_ARGS + ('limit',) if request.args.get(key))
+    return stream_template('pages/show_calendar.html', days=by_day(show_tiles(page.items)), page=page,
+                           calendar=calendar, filters=filters)
+  return stream_template('pages/shows.html', shows=show_tiles(page.items), page=page)
+
+@route('/shows/create', methods=['GET'])
 def create_shows():
-
+  from forms import ShowForm
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@route('/shows/create', methods=['POST'])
 def create_show_submission():
+  from forms import ShowForm
   form = ShowForm(request.form)
   error = False
+  conflicts = []
   artist_id = form.artist_id.data
   venue_id = form.venue_id.data
   start_time = form.start_time.data
   
   try:
-      new_show = Show(start_time=start_time, artist_id=artist_id, venue_id=venue_id)
-      db.session.add(new_show)
-      db.session.commit()
+      booking = make_booking(venue_id, artist_id, start_time, form.end_time.data)
+      show_id, conflicts = write(book_show(booking))
+      if not conflicts:
+        current_app.extensions['show_rollover'].push(show_id, booking.start_time, booking.venue_id, booking.artist_id)
+        # The listings carry each venue's and artist's upcoming show count.
+        invalidate_pages('shows', 'venues', 'artists',
+                         'artist:{}'.format(booking.artist_id), 'venue:{}'.format(booking.venue_id))
+        refresh_typeahead(db.session, 'venues', booking.venue_id)
+        refresh_typeahead(db.session, 'artists', booking.artist_id)
+  except IntegrityError:
+      # Postgres' exclusion constraints: booked by another request since the check.
+      db.session.rollback()
+      conflicts = conflicting_shows(db.session, find_conflicts(db.session, booking))
+      error = not conflicts
   except:
       error = True
       db.session.rollback()
   finally:
       db.session.close()
+  if conflicts:
+      flash('That slot overlaps {} existing show(s) of this venue or artist.'.format(len(conflicts)))
+      return render_template('forms/new_show.html', form=form, conflicts=conflicts), 409
   if error:
       flash(f'Opp, an error occurred.')
   else:
       flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@route('/_internal/cache')
+def cache_stats():
+  return jsonify(current_app.extensions['page_cache'].stats())
+
+@route('/_internal/metrics')
+def internal_metrics():
+  extensions = current_app.extensions
+  return jsonify({'pool': pool_status(db.engine), 'cache': extensions['page_cache'].stats(),
+                  'sql': extensions['sql_profiler'].stats(), 'templates': extensions['templates'].stats(),
+                  'writes': extensions['group_commit'].stats(), 'replicas': extensions['replicas'].stats()})
+
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
+#----------------------------------------------------------------------------#
+# App Config.
+#----------------------------------------------------------------------------#
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+def under_cli():
+  """True while the flask command line is loading the app."""
+  ctx = click.get_current_context(silent=True)
+  return ctx is not None and ctx.find_object(ScriptInfo) is not None
+
+
+class LazyCommands(AppGroup):
+  """app.cli, importing commands.py the first time a command is looked up."""
+
+  loaded = False
+
+  def _load(self):
+    if not self.loaded:
+      from commands import cli
+      for cli_command in cli.commands.values():
+        self.add_command(cli_command)
+      self.loaded = True
+
+  def get_command(self, ctx, name):
+    self._load()
+    return super(LazyCommands, self).get_command(ctx, name)
+
+  def list_commands(self, ctx):
+    self._load()
+    return super(LazyCommands, self).list_commands(ctx)
+
+
+def init_logging(app):
+  file_handler = FileHandler('error.log')
+  file_handler.setFormatter(
+      Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+  )
+  app.logger.setLevel(logging.INFO)
+  file_handler.setLevel(logging.INFO)
+  app.logger.addHandler(file_handler)
+  app.logger.info('errors')
+
+  slow_handler = FileHandler(app.config['SLOW_LOG_PATH'])
+  slow_handler.setFormatter(Formatter('%(asctime)s %(levelname)s: %(message)s'))
+  sql_log = logging.getLogger('sql_profile')
+  sql_log.setLevel(logging.INFO)
+  sql_log.addHandler(slow_handler)
+
+
+def create_app(config='config', **overrides):
+  app = Flask(__name__)
+  app.config.from_object(config)
+  app.config.update(overrides)
+  Moment(app)
+  PageCache(app)
+  SqlProfiler(app)
+  app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+  db.init_app(app)
+  init_statement_timeouts(app, db)
+  GroupCommit(app)
+  Replicas(app)
+  ShowPartitions(app)
+  app.cli = LazyCommands(app.cli.name)
+  if under_cli():
+    # Only `flask db ...` needs it, and it brings in alembic.
+    from flask_migrate import Migrate
+    Migrate(app, db)
+  for name in app.config.get('BLUEPRINTS', ()):
+    app.register_blueprint(import_string(name))
+
+  app.jinja_env.filters['datetime'] = format_datetime
+  Templates(app)
+  Assets(app)
+  Typeahead(app)
+
+  show_rollover = ShowRollover(app, db, poll=timedelta(seconds=app.config['SHOW_ROLLOVER_POLL_SECONDS']),
+                               catch_up=timedelta(seconds=app.config['SHOW_ROLLOVER_CATCH_UP']),
+                               on_roll=rolled_over)
+  app.extensions['show_rollover'] = show_rollover
+
+  @app.before_request
+  def start_show_rollover():
+    if app.config['SHOW_ROLLOVER']:
+      show_rollover.start()
+
+  for rule, endpoint, view, options in ROUTES:
+    app.add_url_rule(rule, endpoint, view, **options)
+  app.register_error_handler(404, not_found_error)
+  app.register_error_handler(500, server_error)
+
+  if not app.debug:
+    init_logging(app)
+  return app
+
+
+app = create_app()
 
 #----------------------------------------------------------------------------#
 # Launch.
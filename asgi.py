@@ -0,0 +1,213 @@
+#----------------------------------------------------------------------------#
+# Async read path (ASGI).
+#----------------------------------------------------------------------------#
+# Serve with an ASGI server, one event loop per worker:
+#
+#   uvicorn asgi:create_application --factory --workers 4
+#
+# Needs an ASGI server, a2wsgi (or asgiref) and the async driver of the
+# database: asyncpg for Postgres, aiosqlite for SQLite.
+import asyncio
+import io
+import sys
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from werkzeug.exceptions import HTTPException
+
+from database import local_statement_timeout, view_statement_timeout
+from detail import detail_statements
+from replicas import READ_METHODS
+
+try:
+  from a2wsgi import WSGIMiddleware
+except ImportError:
+  from asgiref.wsgi import WsgiToAsgi as WSGIMiddleware
+
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+
+def async_database_url(url):
+  """The same database behind the async driver of its dialect."""
+  url = make_url(url)
+  backend = url.get_backend_name()
+  if backend not in ASYNC_DRIVERS:
+    raise ValueError('no async driver known for {}'.format(backend))
+  return url.set(drivername='{}+{}'.format(backend, ASYNC_DRIVERS[backend]))
+
+
+def async_engine_options(config, url):
+  """create_async_engine() options from the same DB_* settings as the WSGI app."""
+  if url.get_backend_name() == 'sqlite':
+    return {}
+  if config.get('DB_POOL_MODE') == 'transaction':
+    # PgBouncer in transaction mode cannot keep asyncpg's prepared statements.
+    return {'poolclass': NullPool, 'connect_args': {'statement_cache_size': 0}}
+  pool_size = config.get('DB_POOL_SIZE')
+  if not pool_size:
+    workers = max(int(config.get('WEB_CONCURRENCY') or 1), 1)
+    pool_size = max(config.get('DB_MAX_CONNECTIONS', 20) // workers, 1)
+  options = {
+    'pool_size': pool_size,
+    'max_overflow': config.get('DB_MAX_OVERFLOW', 0),
+    'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+    'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+    'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+  }
+  timeout = config.get('DB_STATEMENT_TIMEOUT')
+  if timeout:
+    options['connect_args'] = {'server_settings': {'statement_timeout': str(int(timeout))}}
+  return options
+
+
+def wsgi_environ(scope):
+  """A WSGI environ for an ASGI http scope, enough for a Flask request context."""
+  server = scope.get('server') or ('localhost', 80)
+  environ = {
+    'REQUEST_METHOD': scope['method'],
+    'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+    'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+    'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+    'SERVER_NAME': server[0],
+    'SERVER_PORT': str(server[1]),
+    'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': scope.get('scheme', 'http'),
+    'wsgi.input': io.BytesIO(),
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+  }
+  if scope.get('client'):
+    environ['REMOTE_ADDR'] = scope['client'][0]
+  for name, value in scope.get('headers', []):
+    name = name.decode('latin-1').upper().replace('-', '_')
+    value = value.decode('latin-1')
+    key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+    environ[key] = environ[key] + ',' + value if key in environ else value
+  return environ
+
+
+async def send_response(send, response, head=False):
+  body = b'' if head else response.get_data()
+  await send({
+    'type': 'http.response.start',
+    'status': response.status_code,
+    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+  })
+  await send({'type': 'http.response.body', 'body': body})
+
+
+class AsyncReadApp(object):
+  """ASGI app running the Flask app, with the detail pages' queries on async engines.
+
+  A venue or artist page (a view marked @detail_view) needs the entity row
+  and its show list; the two queries are independent, so they go out at
+  once on two pooled connections before the view runs, and while they wait
+  the event loop serves other requests. The rest is Flask's own request
+  handling -- routing, before/after request hooks, the page cache, query
+  budgets, statement timeouts, replica routing, error handlers -- and the
+  view itself, which finds its rows in g. Every other request, writes
+  included, is handed to the Flask app unchanged through a WSGI adapter.
+  """
+
+  def __init__(self, app, engine=None):
+    self.app = app
+    self.engines = {} if engine is None else {None: engine}
+    self.wsgi = WSGIMiddleware(app)
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      return await self._lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] in READ_METHODS and self._detail_view(scope):
+      return await self._serve(scope, send)
+    await self.wsgi(scope, receive, send)
+
+  def _detail_view(self, scope):
+    adapter = self.app.url_map.bind_to_environ(wsgi_environ(scope))
+    try:
+      endpoint, _ = adapter.match()
+    except HTTPException:
+      return None
+    return getattr(self.app.view_functions.get(endpoint), 'detail_view', None)
+
+  def engine(self, bind=None):
+    """Async engine to the primary, or to the replica with bind key `bind`."""
+    engine = self.engines.get(bind)
+    if engine is None:
+      config = self.app.config
+      if bind is None:
+        url = config.get('ASYNC_DATABASE_URL') or config['SQLALCHEMY_DATABASE_URI']
+      else:
+        url = config['SQLALCHEMY_BINDS'][bind]
+      url = async_database_url(url)
+      engine = self.engines[bind] = create_async_engine(url, **async_engine_options(config, url))
+      if bind is not None:
+        self.app.extensions['replicas'].watch(bind, engine.sync_engine)
+    return engine
+
+  async def _lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        for engine in self.engines.values():
+          await engine.dispose()
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  async def _serve(self, scope, send):
+    # Flask's full_dispatch_request, awaiting the view's queries before it runs.
+    with self.app.request_context(wsgi_environ(scope)):
+      try:
+        try:
+          rv = self.app.preprocess_request()
+          if rv is None:
+            await self._prefetch()
+            rv = self.app.dispatch_request()
+          response = self.app.make_response(rv)
+        except Exception as e:
+          response = self.app.make_response(self.app.handle_user_exception(e))
+        response = self.app.process_response(response)
+      except Exception as e:
+        response = self.app.handle_exception(e)
+      await send_response(send, response, head=scope['method'] == 'HEAD')
+
+  async def _prefetch(self):
+    if request.routing_exception is not None:
+      return
+    view = self.app.view_functions[request.url_rule.endpoint]
+    # No queries for a page the cache has; the view's own lookup reuses this one.
+    cache, tags = self.app.extensions.get('page_cache'), getattr(view, 'cache_tags', None)
+    if cache is not None and tags is not None:
+      g.page_lookup = cache.lookup(tags(**request.view_args))
+      if g.page_lookup[1] is not None:
+        return
+    timeout = view_statement_timeout(view)
+    if timeout is not None:
+      g.statement_timeout = timeout
+    replicas = self.app.extensions.get('replicas')
+    engine = self.engine(replicas.read_bind() if replicas is not None else None)
+    spec = view.detail_view
+    statements = detail_statements(spec.model, request.view_args[spec.id_arg], datetime.now(),
+                                   past_limit=spec.past_limit())
+    g.detail_rows = await asyncio.gather(*(self._fetch(engine, statement) for statement in statements))
+
+  async def _fetch(self, engine, statement):
+    async with engine.connect() as connection:
+      if connection.dialect.name == 'postgresql':
+        timeout = local_statement_timeout()
+        if timeout is not None:
+          await connection.execute(timeout)
+      return (await connection.execute(statement)).all()
+
+
+def create_application():
+  """Factory for the ASGI server (--factory); the app is built when it's called."""
+  from app import app
+  return AsyncReadApp(app)
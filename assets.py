@@ -0,0 +1,222 @@
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+# `flask build-assets` copies static/ into STATIC_BUILD_DIR under content
+# hashed names (css/main.css -> css/main.1a2b3c4d5e.css), with .gz and .br
+# siblings for text assets and narrower variants of every image, and
+# records the mapping in manifest.json. Templates link assets through
+# asset_url() and asset_srcset(); a hashed name never changes content, so
+# those files are served precompressed and cached as immutable.
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_file, url_for
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot')
+IMAGES = ('.jpg', '.jpeg', '.png', '.webp')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _hashed_name(name, data):
+  root, ext = posixpath.splitext(name)
+  return '{}.{}{}'.format(root, hashlib.sha1(data).hexdigest()[:10], ext)
+
+
+def _write(path, data):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(data)
+
+
+def _rewrite_css(name, css, assets):
+  """Point url() references of a stylesheet at the hashed files."""
+  folder = posixpath.dirname(name)
+
+  def replace(match):
+    quote, ref = match.groups()
+    if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+      return match.group(0)
+    path, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+    target = posixpath.normpath(posixpath.join(folder, path))
+    if target not in assets:
+      return match.group(0)
+    return 'url({0}{1}{2}{0})'.format(quote, posixpath.relpath(assets[target], folder or '.'), suffix)
+  return _CSS_URL.sub(replace, css.decode('utf-8')).encode('utf-8')
+
+
+def _precompress(path, data):
+  """Write .gz (and .br, with brotli installed) next to `path` when they pay off."""
+  written = []
+  try:
+    import brotli
+  except ImportError:
+    brotli = None
+  encoded = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+  if brotli is not None:
+    encoded['.br'] = brotli.compress(data, quality=11)
+  for suffix, body in encoded.items():
+    if len(body) < len(data) * 0.95:
+      _write(path + suffix, body)
+      written.append(suffix)
+  return written
+
+
+def _image_variants(name, data, widths, output):
+  """Narrower copies of an image, as [(width, hashed name)]; needs Pillow."""
+  try:
+    from PIL import Image
+  except ImportError:
+    return []
+  image = Image.open(io.BytesIO(data))
+  root, ext = posixpath.splitext(name)
+  variants = []
+  for width in sorted(widths):
+    if width >= image.width:
+      break
+    height = max(1, round(image.height * width / float(image.width)))
+    buffer = io.BytesIO()
+    options = {'quality': 82, 'optimize': True, 'progressive': True} if ext.lower() in ('.jpg', '.jpeg') else {'optimize': True}
+    image.resize((width, height), Image.LANCZOS).save(buffer, format=image.format, **options)
+    variant = _hashed_name('{}.{}w{}'.format(root, width, ext), buffer.getvalue())
+    _write(os.path.join(output, variant), buffer.getvalue())
+    variants.append((width, variant))
+  return variants
+
+
+def build_assets(static_folder, target, widths=(480, 960, 1440, 1920)):
+  """Build the fingerprinted copy of `static_folder` into `target`; returns the manifest."""
+  names = []
+  for folder, dirs, files in os.walk(static_folder):
+    dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+    for filename in sorted(f for f in files if not f.startswith('.')):
+      names.append(os.path.relpath(os.path.join(folder, filename), static_folder).replace(os.sep, '/'))
+  staging = target.rstrip(os.sep) + '.tmp'
+  shutil.rmtree(staging, ignore_errors=True)
+  os.makedirs(staging)
+
+  manifest = {'assets': {}, 'sources': {}, 'encodings': {}, 'variants': {}}
+  # Stylesheets last, so their url() references can be rewritten.
+  for name in sorted(names, key=lambda name: name.endswith('.css')):
+    source = os.path.join(static_folder, name)
+    with open(source, 'rb') as f:
+      data = f.read()
+    if name.endswith('.css'):
+      data = _rewrite_css(name, data, manifest['assets'])
+    hashed = _hashed_name(name, data)
+    _write(os.path.join(staging, hashed), data)
+    stat = os.stat(source)
+    manifest['assets'][name] = hashed
+    manifest['sources'][name] = [stat.st_size, int(stat.st_mtime)]
+    if name.lower().endswith(COMPRESSIBLE):
+      manifest['encodings'][hashed] = _precompress(os.path.join(staging, hashed), data)
+    if name.lower().endswith(IMAGES) and widths:
+      variants = _image_variants(name, data, widths, staging)
+      if variants:
+        manifest['variants'][name] = variants
+
+  with open(os.path.join(staging, MANIFEST), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  previous = target.rstrip(os.sep) + '.old'
+  shutil.rmtree(previous, ignore_errors=True)
+  if os.path.isdir(target):
+    os.rename(target, previous)
+  os.rename(staging, target)
+  shutil.rmtree(previous, ignore_errors=True)
+  return manifest
+
+
+class Assets(object):
+  """Fingerprinted static files, once `flask build-assets` has run.
+
+  Without a build, asset_url() is url_for('static') and static files are
+  served from static/ as before. A source file changed since the build
+  falls back to the same, until the next build.
+  """
+
+  def __init__(self, app=None):
+    self.directory = None
+    self.assets = {}
+    self.variants = {}
+    self.encodings = {}
+    self.files = set()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.max_age = app.config.get('ASSET_MAX_AGE', 365 * 24 * 3600)
+    app.extensions['assets'] = self
+    app.add_template_global(self.asset_url)
+    app.add_template_global(self.asset_srcset)
+    directory = app.config.get('STATIC_BUILD_DIR')
+    try:
+      with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    except (TypeError, OSError, ValueError):
+      return
+    stale = []
+    for name, hashed in manifest['assets'].items():
+      try:
+        stat = os.stat(os.path.join(app.static_folder, name))
+      except OSError:
+        continue
+      if [stat.st_size, int(stat.st_mtime)] != manifest['sources'].get(name):
+        stale.append(name)
+        continue
+      self.assets[name] = hashed
+      self.files.add(hashed)
+      if name in manifest['variants']:
+        self.variants[name] = [tuple(variant) for variant in manifest['variants'][name]]
+        self.files.update(variant for width, variant in self.variants[name])
+    if stale:
+      logger.warning('%d static files changed since the asset build (%s...); run `flask build-assets`',
+                     len(stale), ', '.join(sorted(stale)[:3]))
+    self.encodings = manifest['encodings']
+    self.directory = directory
+    app.view_functions['static'] = self.send_static_file
+
+  def asset_url(self, filename, width=None):
+    """url_for('static') of the built file; with `width`, the narrowest variant at least that wide."""
+    name = self.assets.get(filename, filename)
+    if width is not None:
+      wide_enough = [variant for w, variant in self.variants.get(filename, ()) if w >= width]
+      if wide_enough:
+        name = wide_enough[0]
+    return url_for('static', filename=name)
+
+  def asset_srcset(self, filename):
+    """srcset of an image's narrower variants; empty without a build."""
+    variants = self.variants.get(filename)
+    if not variants:
+      return ''
+    return ', '.join('{} {}w'.format(url_for('static', filename=variant), width) for width, variant in variants)
+
+  def send_static_file(self, filename):
+    if filename not in self.files:
+      return current_app.send_static_file(filename)
+    path = os.path.join(self.directory, filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    available = self.encodings.get(filename, ())
+    for name, suffix in ENCODINGS:
+      if suffix in available and request.accept_encodings[name]:
+        encoding, path = name, path + suffix
+        break
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=self.max_age)
+    response.cache_control.immutable = True
+    if available:
+      response.vary.add('Accept-Encoding')
+    if encoding:
+      response.headers['Content-Encoding'] = encoding
+    return response
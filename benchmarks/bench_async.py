@@ -0,0 +1,118 @@
+"""Latency under concurrency: the ASGI read path against the WSGI app.
+
+  python -m benchmarks.bench_async [--paths /venues/1,/artists/1]
+                                   [--concurrency 1,8,32,128] [--requests 400]
+                                   [--output async.json] [--baseline async-base.json]
+
+Starts both apps under uvicorn, one worker each, with the page cache off:
+asgi:create_application (detail pages on the async engine) and app:app through
+uvicorn's WSGI interface (a thread pool). Each concurrency level keeps that
+many requests in flight from one asyncio client. Needs uvicorn and httpx;
+the gap between the two only shows against a database with real round
+trip latency, such as Postgres over the network.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.support import compare, environment, load_results, report, report_comparison, save_results, summarize
+
+SERVER_ARGS = {'asgi': ['--factory', '--interface', 'asgi3'], 'wsgi': ['--interface', 'wsgi']}
+
+
+def free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+def start_server(target, port, env):
+  command = [sys.executable, '-m', 'uvicorn', '--port', str(port), '--log-level', 'warning'] + target
+  process = subprocess.Popen(command, env=env)
+  deadline = time.time() + 30
+  while time.time() < deadline:
+    if process.poll() is not None:
+      raise RuntimeError('{} exited with {}'.format(' '.join(command), process.returncode))
+    try:
+      with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+        return process
+    except OSError:
+      time.sleep(0.1)
+  process.kill()
+  raise RuntimeError('{} did not start'.format(' '.join(command)))
+
+
+async def drive(base, paths, concurrency, requests):
+  latencies = []
+  errors = 0
+  issued = 0
+  limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+  async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+    async def worker():
+      nonlocal issued, errors
+      while issued < requests:
+        path = paths[issued % len(paths)]
+        issued += 1
+        began = time.perf_counter()
+        try:
+          response = await client.get(path)
+          errors += response.status_code >= 400
+        except httpx.HTTPError:
+          errors += 1
+          continue
+        latencies.append(time.perf_counter() - began)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+  return summarize(latencies, seconds, errors=errors)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--paths', default='/venues/1,/artists/1,/api/v1/venues/1,/api/v1/artists/1')
+  parser.add_argument('--concurrency', default='1,8,32,128')
+  parser.add_argument('--requests', type=int, default=400, help='Per concurrency level.')
+  parser.add_argument('--asgi-app', default='asgi:create_application')
+  parser.add_argument('--wsgi-app', default='app:app')
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+  levels = [int(level) for level in args.concurrency.split(',')]
+  env = dict(os.environ, CACHE_BACKEND='none', SHOW_ROLLOVER='false')
+  results = {}
+  for name, target in (('asgi', args.asgi_app), ('wsgi', args.wsgi_app)):
+    port = free_port()
+    process = start_server([target] + SERVER_ARGS[name], port, env)
+    try:
+      base = 'http://127.0.0.1:{}'.format(port)
+      asyncio.run(drive(base, paths, 1, len(paths) * 2))
+      for level in levels:
+        results['{} c={}'.format(name, level)] = asyncio.run(drive(base, paths, level, args.requests))
+    finally:
+      process.terminate()
+      process.wait()
+
+  report('async vs wsgi ({})'.format(', '.join(paths)),
+         [dict([('target', label)] + list(summary.items())) for label, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'paths': paths, 'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,110 @@
+"""Double-booking checks: one proposed show at a time, and in batches.
+
+  python -m benchmarks.bench_bookings [--shows 500000] [--checks 2000]
+                                      [--batch 5000] [--output bookings.json]
+                                      [--baseline bookings-base.json]
+
+Loads a benchmarks.dataset set of shows into an in-memory SQLite database
+and checks proposed bookings against it: find_conflicts() per proposal,
+next to the unbounded overlap query it replaces (every earlier show of the
+venue or artist is a candidate), for random and for the busiest venue and
+artist, and check_bookings() over --batch proposals spread over a month
+and over a year.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+from sqlalchemy import and_
+
+from bookings import check_bookings, find_conflicts, make_booking, BOOKED
+from models import Show
+from benchmarks.dataset import Dataset
+from benchmarks.support import (QueryCounter, compare, environment, load_results, report, report_comparison,
+                                save_results, session_for, sqlite_engine, summarize)
+
+
+def unbounded_conflicts(session, booking):
+  """Overlapping shows without the MAX_SHOW_LENGTH lower bound on start_time."""
+  found = []
+  for kind, fk, field in BOOKED:
+    found.extend(session.query(Show.id).filter(and_(
+      fk == booking[field], Show.start_time < booking.end_time, Show.end_time > booking.start_time)))
+  return found
+
+
+def proposals(dataset, count, span, rnd):
+  """Bookings of skewed venues and artists at hours within `span` of the dataset's now."""
+  return [make_booking(int(dataset.venues * rnd.random() ** 2) + 1, int(dataset.artists * rnd.random() ** 2) + 1,
+                       dataset.now + timedelta(hours=rnd.randint(0, int(span.total_seconds() // 3600))))
+          for _ in range(count)]
+
+
+def measure_each(engine, session, check, bookings):
+  latencies = []
+  conflicting = 0
+  with QueryCounter(engine) as counter:
+    start = time.perf_counter()
+    for booking in bookings:
+      began = time.perf_counter()
+      conflicting += bool(check(session, booking))
+      latencies.append(time.perf_counter() - began)
+    seconds = time.perf_counter() - start
+  return summarize(latencies, seconds, queries=counter.count), conflicting
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--venues', type=int, default=20000)
+  parser.add_argument('--artists', type=int, default=50000)
+  parser.add_argument('--shows', type=int, default=500000)
+  parser.add_argument('--checks', type=int, default=2000)
+  parser.add_argument('--batch', type=int, default=5000)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  dataset = Dataset(venues=args.venues, artists=args.artists, shows=args.shows)
+  engine = sqlite_engine(tables=[Show])
+  session = session_for(engine)
+  rows = list(dataset.show_rows())
+  for i in range(0, len(rows), 10000):
+    session.execute(Show.__table__.insert(), rows[i:i + 10000])
+  session.commit()
+
+  rnd = random.Random(0)
+  singles = proposals(dataset, args.checks, timedelta(days=365), rnd)
+  # Venue 1 and artist 1 have the longest histories of the skewed dataset.
+  busiest = [booking._replace(venue_id=1, artist_id=1) for booking in singles]
+  results = {}
+  for label, bookings in (('', singles), (', busiest', busiest)):
+    for name, check in (('find_conflicts', find_conflicts), ('unbounded query', unbounded_conflicts)):
+      results[name + label], conflicting = measure_each(engine, session, check, bookings)
+    print('{} of {} single proposals{} conflict'.format(conflicting, len(bookings), label))
+
+  for label, span in (('batch, one month', timedelta(days=30)), ('batch, one year', timedelta(days=365))):
+    batch = proposals(dataset, args.batch, span, rnd)
+    with QueryCounter(engine) as counter:
+      began = time.perf_counter()
+      found = check_bookings(session, batch)
+      seconds = time.perf_counter() - began
+    results[label] = summarize([seconds], seconds, queries=counter.count)
+    print('{}: {} proposals, {} conflicting, {:.0f} per second'.format(
+      label, len(batch), sum(1 for conflicts in found if conflicts), len(batch) / seconds))
+
+  report('bookings, {} shows'.format(args.shows),
+         [dict([('case', label)] + list(summary.items())) for label, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'shows': args.shows, 'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
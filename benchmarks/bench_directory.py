@@ -0,0 +1,95 @@
+"""Name-ordered directory pages as the table grows.
+
+  python -m benchmarks.bench_directory [--sizes 10000,100000,1000000] [--pages 200]
+                                       [--full-max 100000] [--output directory.json]
+                                       [--baseline directory-base.json]
+
+Fills an in-memory SQLite Artists table with each of --sizes artists and
+fetches --pages random name_page() pages (60 rows, from a cursor anywhere
+in the table, forwards and backwards), next to the full-object listing
+the artist directory used to render; the latter only up to --full-max
+rows.
+"""
+import argparse
+import random
+import sys
+import time
+
+from directory import name_page
+from models import Artist
+from pagination import encode_cursor
+from benchmarks.support import (QueryCounter, compare, environment, load_results, report, report_comparison,
+                                save_results, session_for, sqlite_engine, summarize)
+
+WORDS = ['Blue', 'Golden', 'Velvet', 'Crystal', 'Hall', 'Room', 'Club', 'Lounge', 'Stage', 'Garden']
+
+
+def seed(session, size):
+  rnd = random.Random(size)
+  for start in range(1, size + 1, 50000):
+    session.execute(Artist.__table__.insert(), [{
+      'id': i,
+      'name': '{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), rnd.randint(1, size)),
+      'city': 'City {}'.format(i % 250),
+      'state': 'CA',
+      'genres': [],
+      'genre_ids': [],
+    } for i in range(start, min(start + 50000, size + 1))])
+  session.commit()
+
+
+def measure(engine, fetch, count):
+  latencies = []
+  with QueryCounter(engine) as counter:
+    start = time.perf_counter()
+    for n in range(count):
+      began = time.perf_counter()
+      fetch(n)
+      latencies.append(time.perf_counter() - began)
+    seconds = time.perf_counter() - start
+  return summarize(latencies, seconds, queries=counter.count)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', default='10000,100000,1000000')
+  parser.add_argument('--pages', type=int, default=200)
+  parser.add_argument('--full-max', type=int, default=100000)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  results = {}
+  for size in [int(size) for size in args.sizes.split(',')]:
+    engine = sqlite_engine(tables=[Artist])
+    session = session_for(engine)
+    seed(session, size)
+    rnd = random.Random(0)
+    ids = [rnd.randint(1, size) for _ in range(args.pages)]
+    cursors = [encode_cursor((name or '', id)) for id, name in
+               session.query(Artist.id, Artist.name).filter(Artist.id.in_(set(ids)))]
+
+    results['first page, {}'.format(size)] = measure(engine, lambda n: name_page(session, Artist), args.pages)
+    results['after cursor, {}'.format(size)] = measure(
+      engine, lambda n: name_page(session, Artist, after=cursors[n % len(cursors)]), args.pages)
+    results['before cursor, {}'.format(size)] = measure(
+      engine, lambda n: name_page(session, Artist, before=cursors[n % len(cursors)]), args.pages)
+    if size <= args.full_max:
+      results['all artists, {}'.format(size)] = measure(
+        engine, lambda n: session.query(Artist).order_by(Artist.name).all(), max(args.pages // 20, 1))
+    session.close()
+    engine.dispose()
+
+  report('directory pages', [dict([('case', label)] + list(summary.items())) for label, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
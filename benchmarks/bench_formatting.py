@@ -0,0 +1,48 @@
+"""Compare the string round-trip datetime filter with formatting.py.
+
+  python -m benchmarks.bench_formatting [--count 5000]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from formatting import format_datetime, format_datetimes
+from benchmarks.support import report
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--count', type=int, default=5000)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  start = datetime(2026, 1, 1, 20, 0)
+  values = [start + timedelta(hours=i) for i in range(args.count)]
+  assert legacy_format_datetime(str(values[0]), 'full') == format_datetime(values[0], 'full')
+
+  cases = [
+    ('legacy (str round-trip)', lambda: [legacy_format_datetime(str(value), 'full') for value in values]),
+    ('format_datetime', lambda: [format_datetime(value, 'full') for value in values]),
+    ('format_datetimes (batch)', lambda: format_datetimes(values, 'full')),
+  ]
+  rows = []
+  for label, case in cases:
+    best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+    rows.append({'case': label, 'ms': round(best * 1000, 1), 'us_per_value': round(best * 1e6 / args.count, 2)})
+  report('datetime filter, {} timestamps'.format(args.count), rows)
+
+
+if __name__ == '__main__':
+  main()
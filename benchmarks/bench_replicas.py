@@ -0,0 +1,183 @@
+"""Replica routing, read-your-writes and replica ejection on SQLite stand-ins.
+
+  python -m benchmarks.bench_replicas [--venues 500] [--reads 2000] [--concurrency 8]
+                                      [--writes 20] [--lag 1.0]
+                                      [--output replicas.json] [--baseline replicas-base.json]
+
+Creates a primary and two replica SQLite files that replicas.SqliteReplicator
+keeps --lag seconds behind, and an app reading from them. Through the
+Flask test client it then
+  - sends --reads GET /api/v1/venues from --concurrency threads and reports
+    which database answered them;
+  - --writes times, creates a venue and lists the venues right away, once
+    from the creating client (pinned to the primary) and once from a fresh
+    one, and reports how often each saw the new venue and how long the
+    fresh client had to wait for it;
+  - deletes one replica's database and reports the reads that failed
+    before it was ejected, then restores it and times its return.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, func
+
+from models import Venue, Show
+from replicas import SqliteReplicator
+from benchmarks.dataset import Dataset
+from benchmarks.support import (compare, environment, load_results, report, report_comparison, save_results,
+                                session_for, sqlite_engine, summarize)
+
+READ_PATH = '/api/v1/venues?fields=id,name'
+
+VENUE_FORM = {'city': 'City 1', 'state': 'CA', 'address': '1 Main St', 'phone': '415-555-0100',
+              'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/replica'}
+
+
+def databases(venues):
+  directory = tempfile.mkdtemp(prefix='bench-replicas-')
+  paths = [os.path.join(directory, name) for name in ('primary.db', 'replica_1.db', 'replica_2.db')]
+  engine = sqlite_engine(tables=[Venue, Show], url='sqlite:///' + paths[0])
+  rows = list(Dataset(venues=venues, artists=1, shows=0).venue_rows())
+  with engine.begin() as connection:
+    connection.execute(Venue.__table__.insert(), rows)
+  engine.dispose()
+  return paths
+
+
+def make_app(paths, lag):
+  from app import create_app
+  app = create_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + paths[0],
+                   SQLALCHEMY_BINDS={'replica_1': 'sqlite:///' + paths[1], 'replica_2': 'sqlite:///' + paths[2]},
+                   REPLICA_BINDS=['replica_1', 'replica_2'], REPLICA_STICKY_SECONDS=lag * 3,
+                   REPLICA_MAX_LAG_SECONDS=lag * 2, REPLICA_CHECK_SECONDS=0.2, REPLICA_EJECT_SECONDS=1,
+                   WTF_CSRF_ENABLED=False, SHOW_ROLLOVER=False, SHOW_PARTITIONS=False, TYPEAHEAD_INDEX=False,
+                   SQL_PROFILE=False)
+  app.extensions['page_cache'].backend = None
+  return app
+
+
+def read_load(app, reads, concurrency):
+  """(summary, statuses) of `reads` venue listings from `concurrency` threads."""
+  remaining = iter(range(reads))
+  take = threading.Lock()
+  latencies, statuses = [], []
+
+  def worker():
+    client = app.test_client()
+    while True:
+      with take:
+        if next(remaining, None) is None:
+          return
+      began = time.perf_counter()
+      try:
+        status = client.get(READ_PATH).status_code
+      except Exception:
+        status = 500
+      latencies.append(time.perf_counter() - began)
+      statuses.append(status)
+
+  threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  seconds = time.perf_counter() - start
+  return summarize(latencies, seconds, errors=sum(1 for status in statuses if status >= 400)), statuses
+
+
+def routed_since(replicas, before):
+  return dict((route, count - before.get(route, 0)) for route, count in replicas.stats()['routed'].items()
+              if count - before.get(route, 0))
+
+
+def read_your_writes(app, writes, timeout):
+  """Whether the writer and a fresh client saw each new venue at once; the fresh client's wait."""
+  writer = app.test_client()
+  own, others, waits = 0, 0, []
+  for n in range(writes):
+    name = 'Replica Hall {}-{}'.format(os.getpid(), n)
+    writer.post('/venues/create', data=dict(VENUE_FORM, name=name))
+    written = time.perf_counter()
+    own += name in writer.get(READ_PATH).get_data(as_text=True)
+    reader = app.test_client()
+    seen = name in reader.get(READ_PATH).get_data(as_text=True)
+    others += seen
+    while not seen and time.perf_counter() - written < timeout:
+      time.sleep(0.02)
+      seen = name in reader.get(READ_PATH).get_data(as_text=True)
+    waits.append(time.perf_counter() - written)
+  return own, others, waits
+
+
+def eject_and_restore(app, replicator, path, key, concurrency, timeout):
+  replicas = app.extensions['replicas']
+  replicator.replicas.remove(path)
+  os.remove(path)
+  replicas.engines()[key].dispose()
+  lost = time.perf_counter()
+  summary, statuses = read_load(app, 200, concurrency)
+  failed = sum(1 for status in statuses if status >= 500)
+  ejected = not replicas.stats()['replicas'][key]['healthy']
+  replicator.replicas.append(path)
+  while not replicas.stats()['replicas'][key]['healthy'] and time.perf_counter() - lost < timeout:
+    time.sleep(0.05)
+  back = time.perf_counter() - lost
+  return failed, ejected, back
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--venues', type=int, default=500)
+  parser.add_argument('--reads', type=int, default=2000)
+  parser.add_argument('--concurrency', type=int, default=8)
+  parser.add_argument('--writes', type=int, default=20)
+  parser.add_argument('--lag', type=float, default=1.0)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  paths = databases(args.venues)
+  replicator = SqliteReplicator(paths[0], paths[1:], lag=args.lag).start()
+  app = make_app(paths, args.lag)
+  replicas = app.extensions['replicas']
+  results = {}
+
+  before = dict(replicas.stats()['routed'])
+  results['reads'], statuses = read_load(app, args.reads, args.concurrency)
+  report('{} x GET {}, {} threads, 2 replicas'.format(args.reads, READ_PATH, args.concurrency),
+         [dict([('case', 'reads')] + list(results['reads'].items()))])
+  print('served by: {}'.format(routed_since(replicas, before)))
+
+  own, others, waits = read_your_writes(app, args.writes, timeout=args.lag * 10)
+  results['replication wait'] = summarize(waits, sum(waits))
+  print('read-your-writes: writer saw {}/{} new venues at once, a fresh client {}/{}; '
+        'fresh client waited p50 {:.0f} ms, max {:.0f} ms'.format(
+          own, args.writes, others, args.writes, sorted(waits)[len(waits) // 2] * 1000, max(waits) * 1000))
+
+  failed, ejected, back = eject_and_restore(app, replicator, paths[2], 'replica_2', args.concurrency,
+                                            timeout=args.lag * 20)
+  print('replica_2 lost: {} of 200 reads failed, {}, back in rotation after {:.1f}s'.format(
+    failed, 'ejected' if ejected else 'NOT ejected', back))
+  replicator.stop()
+
+  session = session_for(create_engine('sqlite:///' + paths[0]))
+  print('{} venues on the primary; {} replica copies made'.format(
+    session.query(func.count(Venue.id)).scalar(), replicator.copies))
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'lag': args.lag, 'routes': results,
+                               'replicas': replicas.stats()})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
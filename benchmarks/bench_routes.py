@@ -0,0 +1,175 @@
+"""Latency, throughput and queries per request of every route in app.py.
+
+  python -m benchmarks.bench_routes [--requests 50] [--warmup 3] [--cache]
+                                    [--no-writes] [--only venues,shows]
+                                    [--output results.json]
+                                    [--baseline baseline.json] [--tolerance 0.1]
+
+Drives the app through the Flask test client against DATABASE_URL, which
+should hold a benchmarks.dataset load. Pages are measured uncached unless
+--cache is given. With --baseline, routes whose p95 grew by more than the
+tolerance, or that run more queries than before, are reported and the
+exit status is 1.
+"""
+import argparse
+import itertools
+import re
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import Venue, Artist, Show
+from benchmarks.support import (QueryCounter, compare, environment, load_results, report,
+                                report_comparison, save_results, summarize)
+
+_CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# `data` is form fields, or a function returning fresh fields for each request.
+Route = namedtuple('Route', ['label', 'method', 'path', 'data', 'writes'])
+
+
+def routes(session):
+  """One request per route of app.py, with ids sampled from the database."""
+  venue_id = session.query(func.min(Venue.id)).scalar() or 1
+  artist_id = session.query(func.min(Artist.id)).scalar() or 1
+  busy_venue = (session.query(Show.venue_id).group_by(Show.venue_id)
+                .order_by(func.count(Show.id).desc()).limit(1).scalar()) or venue_id
+  busy_artist = (session.query(Show.artist_id).group_by(Show.artist_id)
+                 .order_by(func.count(Show.id).desc()).limit(1).scalar()) or artist_id
+  # Each create-show request books the next slot after every existing show.
+  slots = itertools.count()
+  latest = session.query(func.max(Show.end_time)).scalar() or datetime.now()
+  first_slot = latest.replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+  venue_form = {'name': 'Benchmark Hall', 'city': 'City 1', 'state': 'CA', 'address': '1 Main St',
+                'phone': '415-555-0100', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/bench'}
+  artist_form = {'name': 'Benchmark Band', 'city': 'City 1', 'state': 'CA', 'phone': '415-555-0100',
+                 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/bench'}
+
+  def show_form():
+    start = first_slot + timedelta(hours=3 * next(slots))
+    return {'artist_id': str(artist_id), 'venue_id': str(venue_id), 'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+  return [
+    Route('index', 'GET', '/', None, False),
+    Route('venues', 'GET', '/venues', None, False),
+    Route('venues by genre', 'GET', '/venues?genre=Jazz&genre=Blues&match=any', None, False),
+    Route('search venues', 'POST', '/venues/search', {'search_term': 'hall'}, False),
+    Route('show venue', 'GET', '/venues/{}'.format(venue_id), None, False),
+    Route('show busy venue', 'GET', '/venues/{}'.format(busy_venue), None, False),
+    Route('artists', 'GET', '/artists', None, False),
+    Route('artists by genre', 'GET', '/artists?genre=Jazz', None, False),
+    Route('search artists', 'POST', '/artists/search', {'search_term': 'band'}, False),
+    Route('show artist', 'GET', '/artists/{}'.format(artist_id), None, False),
+    Route('show busy artist', 'GET', '/artists/{}'.format(busy_artist), None, False),
+    Route('edit artist form', 'GET', '/artists/{}/edit'.format(artist_id), None, False),
+    Route('edit venue form', 'GET', '/venues/{}/edit'.format(venue_id), None, False),
+    Route('shows', 'GET', '/shows', None, False),
+    Route('show calendar', 'GET', '/shows?from={:%Y-%m-%d}'.format(datetime.now()), None, False),
+    Route('show calendar by city', 'GET', '/shows?from={:%Y-%m-%d}&city=City+1'.format(datetime.now()), None, False),
+    Route('create venue form', 'GET', '/venues/create', None, False),
+    Route('create artist form', 'GET', '/artists/create', None, False),
+    Route('create show form', 'GET', '/shows/create', None, False),
+    Route('api venues', 'GET', '/api/v1/venues', None, False),
+    Route('api venue', 'GET', '/api/v1/venues/{}'.format(busy_venue), None, False),
+    Route('api artist', 'GET', '/api/v1/artists/{}'.format(busy_artist), None, False),
+    Route('api shows', 'GET', '/api/v1/shows', None, False),
+    Route('api show calendar', 'GET', '/api/v1/shows?from={:%Y-%m-%d}'.format(datetime.now()), None, False),
+    Route('create venue', 'POST', '/venues/create', venue_form, True),
+    Route('create artist', 'POST', '/artists/create', artist_form, True),
+    Route('create show', 'POST', '/shows/create', show_form, True),
+  ]
+
+
+def with_csrf_token(client, route):
+  """Route data plus the CSRF token its form page renders, if any."""
+  try:
+    match = _CSRF.search(client.get(route.path).get_data(as_text=True))
+  except Exception:
+    match = None
+  if not match:
+    return route
+  if callable(route.data):
+    fields = route.data
+    return route._replace(data=lambda: dict(fields(), csrf_token=match.group(1)))
+  return route._replace(data=dict(route.data, csrf_token=match.group(1)))
+
+
+def request_once(client, route):
+  """Status code of one request; exceptions propagated under DEBUG count as 500."""
+  data = route.data() if callable(route.data) else route.data
+  try:
+    response = client.open(route.path, method=route.method, data=data)
+    response.get_data()
+    return response.status_code
+  except Exception:
+    return 500
+
+
+def measure(app, engine, route, requests, warmup):
+  client = app.test_client()
+  if route.writes:
+    route = with_csrf_token(client, route)
+  for _ in range(warmup):
+    request_once(client, route)
+  latencies = []
+  errors = 0
+  with QueryCounter(engine) as counter:
+    start = time.perf_counter()
+    for _ in range(requests):
+      began = time.perf_counter()
+      status = request_once(client, route)
+      latencies.append(time.perf_counter() - began)
+      errors += status >= 400
+    seconds = time.perf_counter() - start
+  return summarize(latencies, seconds, queries=counter.count, errors=errors)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--requests', type=int, default=50)
+  parser.add_argument('--warmup', type=int, default=3)
+  parser.add_argument('--cache', action='store_true', help='Leave the page cache on.')
+  parser.add_argument('--no-writes', action='store_true', help='Skip the routes that insert rows.')
+  parser.add_argument('--only', help='Comma-separated route labels.')
+  parser.add_argument('--output', help='Write the results as JSON.')
+  parser.add_argument('--baseline', help='Compare with a previous --output file.')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  from app import app, db
+  from query_plans import without_background_jobs
+  if not args.cache:
+    app.extensions['page_cache'].backend = None
+
+  with app.app_context():
+    selected = routes(db.session)
+    counts = dict((model.__tablename__, db.session.query(func.count(model.id)).scalar())
+                  for model in (Venue, Artist, Show))
+    engine = db.engine
+  if args.only:
+    labels = set(label.strip() for label in args.only.split(','))
+    selected = [route for route in selected if route.label in labels]
+  if args.no_writes:
+    selected = [route for route in selected if not route.writes]
+  # Outside any app context, so each request gets its own as in production.
+  results = {}
+  with without_background_jobs(app):
+    for route in selected:
+      results[route.label] = measure(app, engine, route, args.requests, args.warmup)
+
+  report('routes ({})'.format(', '.join('{}={}'.format(k, v) for k, v in sorted(counts.items()))),
+         [dict([('route', label)] + list(summary.items())) for label, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'rows': counts, 'cache': args.cache,
+                               'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
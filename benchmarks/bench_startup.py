@@ -0,0 +1,121 @@
+"""Cold start: what `import app` pulls in and how long a fresh process takes.
+
+  python -m benchmarks.bench_startup [--runs 10] [--top 15] [--strict]
+                                     [--output startup.json]
+                                     [--baseline startup-base.json] [--tolerance 0.1]
+
+First an import-time report: `python -X importtime` of `import app`, the
+slowest top-level imports by cumulative time, and any of the modules that
+create_app() is meant to leave for later (babel, dateutil, wtforms,
+alembic...) that were imported anyway; --strict makes those an error.
+Then --runs fresh interpreters each time `import app` (module import plus
+create_app()) and the first request to /, the numbers a worker restart or
+a serverless cold start pays. With --baseline, a p95 that grew by more
+than the tolerance is reported and the exit status is 1, as for the route
+benchmarks.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from benchmarks.support import compare, environment, load_results, report, report_comparison, save_results, summarize
+
+# Imported where first used, never while the app starts.
+DEFERRED = ['babel', 'dateutil', 'wtforms', 'flask_wtf', 'flask_migrate', 'alembic', 'forms',
+            'bulk_import', 'query_plans', 'commands']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = '''
+import json, time
+began = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+app.test_client().get('/')
+print(json.dumps([imported - began, time.perf_counter() - imported]))
+'''
+
+Import = namedtuple('Import', ['module', 'self_us', 'cumulative_us', 'depth'])
+
+
+def run_python(args, env):
+  return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(env, statement='import app'):
+  """Every import `statement` triggers, in -X importtime order."""
+  imports = []
+  for line in run_python(['-X', 'importtime', '-c', statement], env).stderr.splitlines():
+    if not line.startswith('import time:') or 'imported package' in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    depth = (len(name) - len(name.lstrip())) // 2
+    imports.append(Import(name.strip(), int(self_us), int(cumulative_us), depth))
+  return imports
+
+
+def deferred_imports(imports):
+  loaded = set(i.module for i in imports)
+  return [name for name in DEFERRED if name in loaded]
+
+
+def cold_starts(env, runs):
+  """(import seconds, first request seconds, process seconds) per fresh interpreter."""
+  samples = []
+  for _ in range(runs):
+    began = time.perf_counter()
+    result = run_python(['-c', COLD_START], env)
+    process = time.perf_counter() - began
+    imported, first_request = json.loads(result.stdout.strip().splitlines()[-1])
+    samples.append((imported, first_request, process))
+  return samples
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--runs', type=int, default=10)
+  parser.add_argument('--top', type=int, default=15, help='Top-level imports to list.')
+  parser.add_argument('--strict', action='store_true', help='Fail if a deferred module is imported at start.')
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  # No show rollover thread in a timing run.
+  env = dict(os.environ, SHOW_ROLLOVER='false')
+  imports = import_times(env)
+  total_us = sum(i.self_us for i in imports)
+  top = sorted((i for i in imports if i.depth == 1), key=lambda i: i.cumulative_us, reverse=True)[:args.top]
+  report('import app ({:.1f} ms, {} modules)'.format(total_us / 1000.0, len(imports)),
+         [{'module': i.module, 'cumulative_ms': round(i.cumulative_us / 1000.0, 1),
+           'self_ms': round(i.self_us / 1000.0, 1)} for i in top])
+  eager = deferred_imports(imports)
+  if eager:
+    print('imported at start but meant to be deferred: {}'.format(', '.join(eager)))
+
+  samples = cold_starts(env, args.runs)
+  results = {}
+  for n, label in enumerate(('import app', 'first request', 'process')):
+    latencies = [sample[n] for sample in samples]
+    results[label] = summarize(latencies, sum(latencies))
+  report('cold start ({} runs)'.format(args.runs),
+         [dict([('phase', label)] + list(summary.items())) for label, summary in results.items()])
+
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'deferred_imported': eager,
+                               'import_ms': round(total_us / 1000.0, 1), 'routes': results})
+  failed = bool(eager) and args.strict
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    failed = failed or bool(regressions)
+  if failed:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+"""Typeahead index: build time, memory and per-keystroke latency.
+
+  python -m benchmarks.bench_typeahead [--names 1000000] [--queries 20000]
+                                       [--output typeahead.json]
+                                       [--baseline typeahead-base.json]
+
+Indexes --names synthetic names (two to four words from a large seeded
+vocabulary, some with diacritics, ranks skewed like show counts) and
+replays queries typed the way a picker sees them: every prefix of a name,
+one keystroke at a time, plus multi-word and accented queries. No
+database is needed.
+"""
+import argparse
+import random
+import resource
+import sys
+import time
+
+from typeahead import TypeaheadIndex
+from benchmarks.support import compare, environment, load_results, report, report_comparison, save_results, summarize
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ne', 'so', 'tu', 'vel', 'dor', 'an', 'bri', 'cel', 'fa', 'gor', 'hal',
+             'is', 'jun', 'ke', 'lum', 'mar', 'no', 'pe', 'qui', 'ros', 'sil', 'tor', 'ul', 'ven', 'wy', 'zel']
+ACCENTED = {'a': 'á', 'e': 'é', 'o': 'ö', 'u': 'ü', 'n': 'ñ', 'c': 'ç'}
+
+
+def vocabulary(rnd, size):
+  words = set()
+  while len(words) < size:
+    words.add(''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(1, 4))).capitalize())
+  return sorted(words)
+
+
+def accent(rnd, word):
+  return ''.join(ACCENTED.get(c, c) if rnd.random() < 0.3 else c for c in word)
+
+
+def names(count, seed=0):
+  rnd = random.Random(seed)
+  words = vocabulary(rnd, 50000)
+  for id in range(1, count + 1):
+    parts = [words[int(len(words) * rnd.random() ** 2)] for _ in range(rnd.randint(2, 4))]
+    if rnd.random() < 0.05:
+      parts = [accent(rnd, part) for part in parts]
+    yield id, ' '.join(parts), int(20 * rnd.random() ** 6)
+
+
+def keystrokes(rows, count, seed=0):
+  """Queries as typed: each prefix of the first or second word of a sample of names."""
+  rnd = random.Random('queries:{}'.format(seed))
+  queries = []
+  while len(queries) < count:
+    id, name, rank = rows[rnd.randrange(len(rows))]
+    words = name.split()
+    kind = rnd.random()
+    if kind < 0.6:
+      word = words[0] if rnd.random() < 0.5 else words[1]
+      queries.extend(word[:n] for n in range(1, len(word) + 1))
+    elif kind < 0.9:
+      query = words[0] + ' ' + words[1][:rnd.randint(1, len(words[1]))]
+      queries.append(query)
+    else:
+      queries.append(''.join(rnd.choice(SYLLABLES) for _ in range(3)))
+  return queries[:count]
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--names', type=int, default=1000000)
+  parser.add_argument('--queries', type=int, default=20000)
+  parser.add_argument('--writes', type=int, default=2000)
+  parser.add_argument('--limit', type=int, default=10)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  rows = list(names(args.names))
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  began = time.perf_counter()
+  index = TypeaheadIndex(rows)
+  build_seconds = time.perf_counter() - began
+  # Peak RSS growth (KB on Linux), an upper bound on what the index holds.
+  memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) * 1024
+
+  queries = keystrokes(rows, args.queries)
+  results = {}
+  for label, pass_queries in (('cold (first pass)', queries), ('warm', queries)):
+    latencies = []
+    start = time.perf_counter()
+    for query in pass_queries:
+      began = time.perf_counter()
+      index.search(query, limit=args.limit)
+      latencies.append(time.perf_counter() - began)
+    results['search ' + label] = summarize(latencies, time.perf_counter() - start)
+
+  rnd = random.Random(1)
+  latencies = []
+  start = time.perf_counter()
+  for n in range(args.writes):
+    id, name, rank = rows[rnd.randrange(len(rows))]
+    began = time.perf_counter()
+    index.put(id, name, rank + 1)
+    latencies.append(time.perf_counter() - began)
+  results['put (rank change)'] = summarize(latencies, time.perf_counter() - start)
+
+  report('typeahead, {} names: built in {:.1f}s, {:.0f} MB'.format(args.names, build_seconds, memory / 2.0 ** 20),
+         [dict([('case', label)] + list(summary.items())) for label, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'names': args.names, 'build_seconds': round(build_seconds, 2),
+                               'memory_mb': round(memory / 2.0 ** 20, 1), 'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,58 @@
+"""Query count and latency of the /venues directory as the venue table grows.
+
+  python -m benchmarks.bench_venues [--sizes 1000,10000,100000]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from counters import recount
+from directory import venue_directory
+from models import Venue, Show
+from benchmarks.support import sqlite_engine, session_for, QueryCounter, timer, report
+
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'GA', 'OR']
+
+
+def seed(session, venue_count, shows_per_venue=3):
+  rnd = random.Random(venue_count)
+  now = datetime.now()
+  session.bulk_insert_mappings(Venue, [{
+    'id': i,
+    'name': 'Venue {}'.format(i),
+    'city': 'City {}'.format(i % 250),
+    'state': STATES[i % len(STATES)],
+  } for i in range(1, venue_count + 1)])
+  session.bulk_insert_mappings(Show, [{
+    'artist_id': 1,
+    'venue_id': rnd.randint(1, venue_count),
+    'start_time': now + timedelta(days=rnd.randint(-365, 365)),
+  } for _ in range(venue_count * shows_per_venue)])
+  recount(session, venue_ids=range(1, venue_count + 1), now=now)
+  session.commit()
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', default='1000,10000,100000')
+  args = parser.parse_args()
+
+  rows = []
+  for size in [int(size) for size in args.sizes.split(',')]:
+    engine = sqlite_engine(tables=[Venue, Show])
+    session = session_for(engine)
+    seed(session, size)
+    with QueryCounter(engine) as counter, timer() as elapsed:
+      areas = venue_directory(session)
+    rows.append({
+      'venues': size,
+      'areas': len(areas),
+      'queries': counter.count,
+      'ms': round(elapsed['seconds'] * 1000, 1),
+    })
+    session.close()
+  report('venue_directory', rows)
+
+
+if __name__ == '__main__':
+  main()
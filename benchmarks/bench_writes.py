@@ -0,0 +1,146 @@
+"""Write throughput of create handlers, one commit per request vs group commit.
+
+  python -m benchmarks.bench_writes [--requests 2000] [--concurrency 32]
+                                    [--route venues|shows] [--database URL]
+                                    [--max-items 64] [--max-wait-ms 5]
+                                    [--output writes.json] [--baseline writes-base.json]
+
+Posts --requests creations from --concurrency threads through the Flask
+test client, first with GROUP_COMMIT off, then on, and reports requests
+per second, latency, the rows actually written and, for group commit, the
+batch sizes and commit latency the committer saw. Without --database
+venues go to a fresh SQLite file with synchronous=FULL, where each commit
+is an fsync; point it at a Postgres database (with synchronous_commit on)
+for production-like numbers. Shows need a --database holding venues and
+artists, e.g. a benchmarks.dataset load; they are booked at distinct
+slots after every existing show, so none conflict.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func
+
+from models import Venue, Artist, Show
+from benchmarks.support import (compare, environment, load_results, report, report_comparison, save_results,
+                                session_for, sqlite_engine, summarize)
+
+MODELS = {'venues': Venue, 'shows': Show}
+
+VENUE_FORM = {'name': 'Load Hall', 'city': 'City 1', 'state': 'CA', 'address': '1 Main St',
+              'phone': '415-555-0100', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/load'}
+
+
+def sqlite_database():
+  path = os.path.join(tempfile.mkdtemp(prefix='bench-writes-'), 'writes.db')
+  url = 'sqlite:///' + path
+  engine = sqlite_engine(tables=[Venue, Show], url=url)
+  engine.dispose()
+  return url
+
+
+def forms(session, route, count):
+  """Form data of `count` creations; shows spread over venues, artists and three-hour slots."""
+  if route == 'venues':
+    return [dict(VENUE_FORM, name='Load Hall {}'.format(n)) for n in range(count)]
+  venue_ids = [id for (id,) in session.query(Venue.id).order_by(Venue.id).limit(1000)]
+  artist_ids = [id for (id,) in session.query(Artist.id).order_by(Artist.id).limit(1000)]
+  latest = session.query(func.max(Show.end_time)).scalar() or datetime.now()
+  first = latest.replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+  return [{'venue_id': str(venue_ids[n % len(venue_ids)]), 'artist_id': str(artist_ids[n % len(artist_ids)]),
+           'start_time': (first + timedelta(hours=3 * n)).strftime('%Y-%m-%d %H:%M:%S')} for n in range(count)]
+
+
+def run(url, route, data, concurrency, group_commit, max_items, max_wait_ms):
+  from app import create_app
+  app = create_app(SQLALCHEMY_DATABASE_URI=url, GROUP_COMMIT=group_commit, GROUP_COMMIT_MAX_ITEMS=max_items,
+                   GROUP_COMMIT_MAX_WAIT_MS=max_wait_ms, WTF_CSRF_ENABLED=False, SHOW_ROLLOVER=False,
+                   SHOW_PARTITIONS=False, TYPEAHEAD_INDEX=False, SQL_PROFILE=False, DB_POOL_SIZE=concurrency + 2)
+  app.extensions['page_cache'].backend = None
+  if url.startswith('sqlite'):
+    with app.app_context():
+      from models import db
+      event.listen(db.engine, 'connect', lambda conn, record: conn.execute('PRAGMA synchronous=FULL'))
+  path = '/{}/create'.format(route)
+  pending = iter(data)
+  take = threading.Lock()
+  latencies, errors = [], []
+
+  def worker():
+    client = app.test_client()
+    while True:
+      with take:
+        form = next(pending, None)
+      if form is None:
+        return
+      began = time.perf_counter()
+      try:
+        status = client.post(path, data=form).status_code
+      except Exception:
+        status = 500
+      latencies.append(time.perf_counter() - began)
+      if status >= 400:
+        errors.append(status)
+
+  threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  summary = summarize(latencies, time.perf_counter() - start, errors=len(errors))
+  return summary, app.extensions['group_commit'].stats()
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--requests', type=int, default=2000)
+  parser.add_argument('--concurrency', type=int, default=32)
+  parser.add_argument('--route', choices=sorted(MODELS), default='venues')
+  parser.add_argument('--database', help='Defaults to a fresh SQLite file.')
+  parser.add_argument('--max-items', type=int, default=64)
+  parser.add_argument('--max-wait-ms', type=float, default=5)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  if args.route == 'shows' and not args.database:
+    parser.error('--route shows needs a --database with venues and artists')
+  url = args.database or sqlite_database()
+  session = session_for(create_engine(url))
+  model = MODELS[args.route]
+  data = forms(session, args.route, args.requests * 2)
+  results, batches = {}, None
+  for label, group_commit, chunk in (('commit per request', False, data[:args.requests]),
+                                     ('group commit', True, data[args.requests:])):
+    before = session.query(func.count(model.id)).scalar()
+    session.rollback()
+    summary, stats = run(url, args.route, chunk, args.concurrency, group_commit, args.max_items, args.max_wait_ms)
+    summary['written'] = session.query(func.count(model.id)).scalar() - before
+    session.rollback()
+    results[label] = summary
+    if group_commit:
+      batches = stats
+
+  report('{} x POST /{}/create, {} threads'.format(args.requests, args.route, args.concurrency),
+         [dict([('mode', label)] + list(summary.items())) for label, summary in results.items()])
+  report('group commit batches', [dict((key, value) for key, value in batches.items()
+                                       if key.startswith(('batch', 'commit', 'write', 'retried', 'failed')))])
+  print('throughput gain: {:.1f}x'.format(results['group commit']['rps'] / results['commit per request']['rps']))
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'route': args.route, 'routes': results,
+                               'batches': batches})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,192 @@
+"""Deterministic, configurably large Fyyur dataset.
+
+  python -m benchmarks.dataset [--venues 20000] [--artists 50000]
+                               [--shows 2000000] [--past 0.7] [--seed 0]
+
+Loads into the app's database (DATABASE_URL); the same arguments always
+produce the same rows, with show times relative to the current hour. City/state pairs, genres and show counts per venue
+are skewed the way real listings are: a few big cities and popular genres,
+a long tail of small ones.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from counters import recount_all
+from genres import GENRES, encode_genres
+from models import Venue, Artist, Show, DEFAULT_SHOW_LENGTH
+
+STATES = [
+  'AL', 'AZ', 'CA', 'CO', 'FL', 'GA', 'IL', 'LA', 'MA', 'MI', 'MN', 'MO',
+  'NC', 'NJ', 'NV', 'NY', 'OH', 'OR', 'PA', 'TN', 'TX', 'UT', 'WA', 'WI',
+]
+NAME_WORDS = [
+  'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Wild',
+  'Lucky', 'Broken', 'Neon', 'Crystal', 'Hollow', 'Rusty', 'Little', 'Grand',
+]
+VENUE_KINDS = ['Hall', 'Room', 'Lounge', 'Club', 'Theatre', 'Bar', 'Garden', 'Arena']
+ARTIST_KINDS = ['Band', 'Trio', 'Collective', 'Orchestra', 'Quartet', 'Project', 'Ensemble', 'Crew']
+BATCH_SIZE = 10000
+
+
+class Dataset(object):
+
+  def __init__(self, venues=20000, artists=50000, shows=2000000, cities=2000, past=0.7, seed=0, now=None):
+    self.venues = venues
+    self.artists = artists
+    self.shows = shows
+    self.cities = cities
+    self.past = past
+    self.seed = seed
+    self.now = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+
+  def _areas(self, rnd):
+    return [('City {}'.format(i), STATES[rnd.randrange(len(STATES))]) for i in range(self.cities)]
+
+  def _skewed(self, rnd, n):
+    # Power law over 1..n: low ids are picked far more often than the tail.
+    return int(n * rnd.random() ** 2) + 1
+
+  def _pick_area(self, rnd, areas):
+    return areas[self._skewed(rnd, len(areas)) - 1]
+
+  def _genres(self, rnd):
+    count = 1 + min(int(rnd.expovariate(1.2)), 3)
+    return sorted(set(GENRES[min(int(rnd.expovariate(0.25)), len(GENRES) - 1)] for _ in range(count)))
+
+  def _name(self, rnd, kinds, i):
+    return '{} {} {} {}'.format(rnd.choice(NAME_WORDS), rnd.choice(NAME_WORDS), rnd.choice(kinds), i)
+
+  def venue_rows(self):
+    rnd = random.Random('venues:{}'.format(self.seed))
+    areas = self._areas(random.Random('areas:{}'.format(self.seed)))
+    for i in range(1, self.venues + 1):
+      city, state = self._pick_area(rnd, areas)
+      genres = self._genres(rnd)
+      yield {
+        'id': i,
+        'name': self._name(rnd, VENUE_KINDS, i),
+        'city': city,
+        'state': state,
+        'address': '{} Main St'.format(rnd.randint(1, 9999)),
+        'phone': '{:03d}-{:03d}-{:04d}'.format(rnd.randint(200, 999), rnd.randint(0, 999), rnd.randint(0, 9999)),
+        'image_link': 'https://images.example.com/venues/{}.jpg'.format(i),
+        'seeking_talent': rnd.random() < 0.3,
+        'genre_ids': encode_genres(genres),
+      }
+
+  def artist_rows(self):
+    rnd = random.Random('artists:{}'.format(self.seed))
+    areas = self._areas(random.Random('areas:{}'.format(self.seed)))
+    for i in range(1, self.artists + 1):
+      city, state = self._pick_area(rnd, areas)
+      genres = self._genres(rnd)
+      yield {
+        'id': i,
+        'name': self._name(rnd, ARTIST_KINDS, i),
+        'city': city,
+        'state': state,
+        'phone': '{:03d}-{:03d}-{:04d}'.format(rnd.randint(200, 999), rnd.randint(0, 999), rnd.randint(0, 9999)),
+        'genres': genres,
+        'genre_ids': encode_genres(genres),
+        'image_link': 'https://images.example.com/artists/{}.jpg'.format(i),
+        'artist_seeking_talent': rnd.random() < 0.3,
+      }
+
+  def show_rows(self):
+    # Popular venues and artists host far more shows than the tail. Shows
+    # fill three-hour slots, and a draw that would book a venue or an
+    # artist twice in one slot is drawn again, so the rows load under the
+    # exclusion constraints of Shows.
+    rnd = random.Random('shows:{}'.format(self.seed))
+    length = int(DEFAULT_SHOW_LENGTH.total_seconds() // 3600)
+    venue_slots, artist_slots = set(), set()
+    for i in range(1, self.shows + 1):
+      while True:
+        if rnd.random() < self.past:
+          slot = -rnd.randint(1, 24 * 365 * 3 // length)
+        else:
+          slot = rnd.randint(1, 24 * 365 // length)
+        venue_id = self._skewed(rnd, self.venues)
+        artist_id = self._skewed(rnd, self.artists)
+        venue_slot = slot * (self.venues + 1) + venue_id
+        artist_slot = slot * (self.artists + 1) + artist_id
+        if venue_slot not in venue_slots and artist_slot not in artist_slots:
+          break
+      venue_slots.add(venue_slot)
+      artist_slots.add(artist_slot)
+      start = self.now + timedelta(hours=slot * length)
+      yield {
+        'id': i,
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': start,
+        'end_time': start + DEFAULT_SHOW_LENGTH,
+      }
+
+  def load(self, session, batch_size=BATCH_SIZE, progress=None):
+    """Insert every row in batches, then fill the upcoming show counters."""
+    for model, rows in ((Venue, self.venue_rows()), (Artist, self.artist_rows()), (Show, self.show_rows())):
+      table = model.__table__
+      batch = []
+      inserted = 0
+      for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+          session.execute(table.insert(), batch)
+          session.commit()
+          inserted += len(batch)
+          batch = []
+          if progress:
+            progress(table.name, inserted)
+      if batch:
+        session.execute(table.insert(), batch)
+        session.commit()
+        inserted += len(batch)
+        if progress:
+          progress(table.name, inserted)
+    recount_all(session, now=self.now)
+    session.commit()
+    _reset_sequences(session)
+
+
+def _reset_sequences(session):
+  # Explicit ids leave Postgres sequences at 1; move them past the data.
+  if session.get_bind().dialect.name != 'postgresql':
+    return
+  for model in (Venue, Artist, Show):
+    session.execute(text(
+      "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), COALESCE(MAX(id), 1)) FROM \"{0}\"".format(
+        model.__tablename__)))
+  session.execute(text('ANALYZE'))
+  session.commit()
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--venues', type=int, default=20000)
+  parser.add_argument('--artists', type=int, default=50000)
+  parser.add_argument('--shows', type=int, default=2000000)
+  parser.add_argument('--cities', type=int, default=2000)
+  parser.add_argument('--past', type=float, default=0.7, help='Fraction of shows in the past.')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+  args = parser.parse_args()
+
+  from app import app, db
+  dataset = Dataset(args.venues, args.artists, args.shows, cities=args.cities, past=args.past, seed=args.seed)
+  start = time.perf_counter()
+
+  def progress(table, count):
+    print('  {}: {} rows ({:.0f}s)'.format(table, count, time.perf_counter() - start))
+
+  with app.app_context():
+    dataset.load(db.session, batch_size=args.batch_size, progress=progress)
+  print('loaded in {:.1f}s'.format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,95 @@
+"""Multi-process HTTP load generator for a running server.
+
+  python -m benchmarks.load http://127.0.0.1:5000 [--paths /venues,/shows]
+                            [--processes 4] [--duration 30]
+                            [--output load.json] [--baseline load-base.json]
+
+Each process keeps one keep-alive connection and requests the paths round
+robin for --duration seconds. Queries per request come from the app's
+Server-Timing header (instrumentation.py), when the server sends it.
+"""
+import argparse
+import http.client
+import multiprocessing
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.support import compare, environment, load_results, report, report_comparison, save_results, summarize
+
+DEFAULT_PATHS = '/venues,/artists,/shows,/venues/1,/artists/1,/api/v1/shows'
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def worker(args):
+  base, paths, duration, offset = args
+  url = urlsplit(base)
+  connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+  connection = connection_class(url.hostname, url.port, timeout=30)
+  samples = dict((path, ([], [0], [0])) for path in paths)
+  deadline = time.perf_counter() + duration
+  i = offset
+  while time.perf_counter() < deadline:
+    path = paths[i % len(paths)]
+    i += 1
+    latencies, queries, errors = samples[path]
+    began = time.perf_counter()
+    try:
+      connection.request('GET', url.path.rstrip('/') + path)
+      response = connection.getresponse()
+      response.read()
+    except (OSError, http.client.HTTPException):
+      errors[0] += 1
+      connection.close()
+      continue
+    latencies.append(time.perf_counter() - began)
+    errors[0] += response.status >= 400
+    match = _QUERIES.search(response.getheader('Server-Timing') or '')
+    if match:
+      queries[0] += int(match.group(1))
+  connection.close()
+  return dict((path, (latencies, queries[0], errors[0])) for path, (latencies, queries, errors) in samples.items())
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('base', help='e.g. http://127.0.0.1:5000')
+  parser.add_argument('--paths', default=DEFAULT_PATHS)
+  parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+  parser.add_argument('--duration', type=float, default=30)
+  parser.add_argument('--output')
+  parser.add_argument('--baseline')
+  parser.add_argument('--tolerance', type=float, default=0.10)
+  args = parser.parse_args()
+
+  paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+  with multiprocessing.Pool(args.processes) as pool:
+    start = time.perf_counter()
+    parts = pool.map(worker, [(args.base, paths, args.duration, n) for n in range(args.processes)])
+    seconds = time.perf_counter() - start
+
+  results = {}
+  everything = []
+  for path in paths:
+    latencies = [latency for part in parts for latency in part[path][0]]
+    everything.extend(latencies)
+    results[path] = summarize(latencies, seconds,
+                              queries=sum(part[path][1] for part in parts),
+                              errors=sum(part[path][2] for part in parts))
+  results['all'] = summarize(everything, seconds, errors=sum(results[path]['errors'] for path in paths))
+
+  report('load {} ({} processes, {:.0f}s)'.format(args.base, args.processes, seconds),
+         [dict([('path', path)] + list(summary.items())) for path, summary in results.items()])
+  if args.output:
+    save_results(args.output, {'environment': environment(), 'base': args.base,
+                               'processes': args.processes, 'routes': results})
+  if args.baseline:
+    regressions = compare(results, load_results(args.baseline)['routes'], tolerance=args.tolerance)
+    report_comparison(regressions)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Shared helpers for the benchmark scripts.
+#----------------------------------------------------------------------------#
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from models import db
+
+
+def sqlite_engine(tables=None, url='sqlite://'):
+  """An SQLite engine with the given model tables created."""
+  engine = create_engine(url)
+  db.metadata.create_all(engine, tables=[model.__table__ for model in tables] if tables else None)
+  return engine
+
+
+def session_for(engine):
+  return Session(engine)
+
+
+class QueryCounter(object):
+  """Counts statements sent through an engine while active."""
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.count = 0
+
+  def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+    self.count += 1
+
+  def __enter__(self):
+    self.count = 0
+    event.listen(self.engine, 'before_cursor_execute', self._before_execute)
+    return self
+
+  def __exit__(self, *exc):
+    event.remove(self.engine, 'before_cursor_execute', self._before_execute)
+
+
+@contextmanager
+def timer():
+  result = {}
+  start = time.perf_counter()
+  yield result
+  result['seconds'] = time.perf_counter() - start
+
+
+def report(label, rows):
+  print(label)
+  for row in rows:
+    print('  ' + '  '.join('{}={}'.format(key, value) for key, value in row.items()))
+
+
+def percentile(sorted_values, fraction):
+  """Nearest-rank percentile of an already sorted list."""
+  if not sorted_values:
+    return 0.0
+  rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[rank]
+
+
+def summarize(latencies, seconds, queries=None, errors=0):
+  """Latency percentiles (ms), throughput and queries per request."""
+  latencies = sorted(latencies)
+  summary = {
+    'requests': len(latencies),
+    'errors': errors,
+    'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+    'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+    'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    'rps': round(len(latencies) / seconds, 1) if seconds else 0.0,
+  }
+  if queries is not None:
+    summary['queries_per_request'] = round(queries / len(latencies), 2) if latencies else 0.0
+  return summary
+
+
+def environment():
+  import platform
+  import subprocess
+  try:
+    commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  return {'python': platform.python_version(), 'machine': platform.machine(), 'commit': commit,
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def save_results(path, results):
+  import json
+  with open(path, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+  import json
+  with open(path) as f:
+    return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.10):
+  """Routes whose p95 grew by more than `tolerance`, or that run more queries.
+
+  Both arguments map a route label to a summary(); routes missing from
+  either side are skipped.
+  """
+  regressions = []
+  for label, current in sorted(results.items()):
+    before = baseline.get(label)
+    if before is None:
+      continue
+    if before['p95_ms'] and current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+      regressions.append((label, 'p95_ms', before['p95_ms'], current['p95_ms']))
+    if current.get('queries_per_request', 0) > before.get('queries_per_request', 0):
+      regressions.append((label, 'queries_per_request', before['queries_per_request'], current['queries_per_request']))
+  return regressions
+
+
+def report_comparison(regressions):
+  if not regressions:
+    print('no regressions against baseline')
+  for label, metric, before, after in regressions:
+    print('REGRESSION {}: {} {} -> {}'.format(label, metric, before, after))
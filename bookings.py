@@ -0,0 +1,178 @@
+#----------------------------------------------------------------------------#
+# Double-booking checks.
+#----------------------------------------------------------------------------#
+# A venue or an artist can't be in two shows at once. Proposed bookings are
+# checked here before they're inserted; on Postgres the exclusion
+# constraints of Shows (btree_gist on tsrange(start_time, end_time)) also
+# refuse an overlap that slips in between the check and the insert.
+import bisect
+from collections import namedtuple
+from datetime import timedelta, timezone
+from operator import itemgetter
+
+from sqlalchemy import and_, or_
+
+from models import Show, DEFAULT_SHOW_LENGTH, MAX_SHOW_LENGTH
+from show_listing import show_rows_query
+
+Booking = namedtuple('Booking', ['venue_id', 'artist_id', 'start_time', 'end_time'])
+
+# `show_id` is the existing show a booking overlaps; `proposal` the index of
+# an earlier booking of the same batch when the overlap is within the batch.
+Conflict = namedtuple('Conflict', ['kind', 'show_id', 'proposal', 'start_time', 'end_time'])
+
+BOOKED = (
+  ('venue', Show.venue_id, 0),
+  ('artist', Show.artist_id, 1),
+)
+
+# Ids per IN (...) when loading the shows of a batch, within SQLite's
+# parameter limit.
+LOAD_CHUNK = 500
+
+
+def naive_utc(value):
+  """`value` as the naive timestamps Shows stores; an aware one is converted to UTC first."""
+  if value is None or value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def make_booking(venue_id, artist_id, start_time, end_time=None):
+  """A Booking from form or JSON values; ValueError when they can't be one."""
+  try:
+    venue_id, artist_id = int(venue_id), int(artist_id)
+  except (TypeError, ValueError):
+    raise ValueError('artist_id and venue_id must be integers')
+  if start_time is None:
+    raise ValueError('start_time is required')
+  # An aware time can't be compared with the stored naive ones.
+  start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+  if end_time is None:
+    end_time = start_time + DEFAULT_SHOW_LENGTH
+  if end_time <= start_time:
+    raise ValueError('end_time must be after start_time')
+  if end_time - start_time > MAX_SHOW_LENGTH:
+    raise ValueError('a show lasts at most {} hours'.format(int(MAX_SHOW_LENGTH.total_seconds() // 3600)))
+  return Booking(venue_id, artist_id, start_time, end_time)
+
+
+class IntervalIndex(object):
+  """Half-open [start, end) intervals per key, kept sorted by start.
+
+  Every interval of a key is at most `longest` long, so the ones that
+  overlap [start, end) begin in (start - longest, end): two bisections find
+  that window, and only the few intervals inside it are compared.
+  """
+
+  def __init__(self):
+    self.intervals = {}
+    self.longest = {}
+
+  def load(self, key, intervals):
+    """Replace the intervals of `key` with [(start, end, ref)]."""
+    self.intervals[key] = sorted(intervals, key=itemgetter(0))
+    self.longest[key] = max([end - start for start, end, ref in intervals] or [timedelta(0)])
+
+  def add(self, key, start, end, ref):
+    bisect.insort(self.intervals.setdefault(key, []), (start, end, ref), key=itemgetter(0))
+    self.longest[key] = max(self.longest.get(key, timedelta(0)), end - start)
+
+  def overlapping(self, key, start, end):
+    """[(start, end, ref)] of `key` that overlap [start, end)."""
+    intervals = self.intervals.get(key)
+    if not intervals:
+      return []
+    lo = bisect.bisect_right(intervals, start - self.longest[key], key=itemgetter(0))
+    hi = bisect.bisect_left(intervals, end, lo, key=itemgetter(0))
+    return [interval for interval in intervals[lo:hi] if interval[1] > start]
+
+
+def _load_shows(session, fk, ids, start, end, exclude_ids):
+  """(key, start_time, end_time, id) of the shows of `ids` that may overlap [start, end)."""
+  ids = sorted(ids)
+  for i in range(0, len(ids), LOAD_CHUNK):
+    query = (
+      session.query(fk, Show.start_time, Show.end_time, Show.id)
+      .filter(fk.in_(ids[i:i + LOAD_CHUNK]),
+              Show.start_time > start - MAX_SHOW_LENGTH, Show.start_time < end, Show.end_time > start)
+    )
+    if exclude_ids:
+      query = query.filter(Show.id.notin_(exclude_ids))
+    yield from query
+
+
+def check_bookings(session, bookings, exclude_ids=()):
+  """The conflicts of each booking, as a list parallel to `bookings`.
+
+  A booking conflicts with the existing shows of its venue or artist that
+  it overlaps, and with an earlier booking of the list that was itself
+  free. Costs one range query per LOAD_CHUNK venues and per LOAD_CHUNK
+  artists, over the time span of the batch, then an index lookup per
+  booking. Shows in `exclude_ids` (one being rescheduled) don't count.
+  """
+  if not bookings:
+    return []
+  start = min(booking.start_time for booking in bookings)
+  end = max(booking.end_time for booking in bookings)
+  indexes = {}
+  for kind, fk, field in BOOKED:
+    ids = set(booking[field] for booking in bookings)
+    by_key = {}
+    for key, show_start, show_end, show_id in _load_shows(session, fk, ids, start, end, exclude_ids):
+      by_key.setdefault(key, []).append((show_start, show_end, ('show', show_id)))
+    index = indexes[kind] = IntervalIndex()
+    for key, intervals in by_key.items():
+      index.load(key, intervals)
+
+  results = []
+  for n, booking in enumerate(bookings):
+    conflicts = []
+    for kind, fk, field in BOOKED:
+      for show_start, show_end, (source, ref) in indexes[kind].overlapping(booking[field], booking.start_time, booking.end_time):
+        conflicts.append(Conflict(kind, ref if source == 'show' else None, ref if source == 'proposal' else None,
+                                  show_start, show_end))
+    if not conflicts:
+      for kind, fk, field in BOOKED:
+        indexes[kind].add(booking[field], booking.start_time, booking.end_time, ('proposal', n))
+    results.append(conflicts)
+  return results
+
+
+def find_conflicts(session, booking, exclude_ids=()):
+  """Conflicts of one booking with existing shows."""
+  return check_bookings(session, [booking], exclude_ids=exclude_ids)[0]
+
+
+def conflicting_shows(session, conflicts):
+  """Listing rows (venue and artist names, times) of the shows behind `conflicts`."""
+  ids = set(conflict.show_id for conflict in conflicts if conflict.show_id is not None)
+  if not ids:
+    return []
+  return show_rows_query(session).filter(Show.id.in_(ids)).order_by(Show.start_time, Show.id).all()
+
+
+def double_bookings(session, limit=None):
+  """(kind, show id, show id) of every pair of existing shows that overlap.
+
+  Each show is compared with the later-starting shows of its venue and
+  artist, through the (fk, start_time) indexes.
+  """
+  pairs = []
+  later = Show.__table__.alias('later')
+  for kind, fk, field in BOOKED:
+    later_fk = later.c[fk.key]
+    query = (
+      session.query(Show.id, later.c.id)
+      .join(later, and_(
+        later_fk == fk,
+        later.c.start_time >= Show.start_time,
+        later.c.start_time < Show.end_time,
+        or_(later.c.start_time > Show.start_time, later.c.id > Show.id),
+      ))
+      .order_by(Show.id, later.c.id)
+    )
+    if limit is not None:
+      query = query.limit(limit)
+    pairs.extend((kind, first, second) for first, second in query)
+  return pairs
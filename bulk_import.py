@@ -0,0 +1,274 @@
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from werkzeug.datastructures import MultiDict
+
+from bookings import Booking, check_bookings, make_booking
+from counters import recount
+from forms import VenueForm, ArtistForm, ShowForm
+from genres import encode_genres
+from models import Venue, Artist, Show
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def venue_values(form):
+  return {
+    'name': form.name.data,
+    'city': form.city.data,
+    'state': form.state.data,
+    'address': form.address.data,
+    'phone': form.phone.data,
+    'image_link': form.image_link.data,
+    'facebook_link': form.facebook_link.data,
+    'venue_web_url': form.website_link.data,
+    'seeking_talent': form.seeking_talent.data,
+    'talent_description': form.seeking_description.data,
+    'genre_ids': encode_genres(form.genres.data),
+  }
+
+
+def artist_values(form):
+  return {
+    'name': form.name.data,
+    'city': form.city.data,
+    'state': form.state.data,
+    'phone': form.phone.data,
+    'genres': form.genres.data,
+    'genre_ids': encode_genres(form.genres.data),
+    'image_link': form.image_link.data,
+    'facebook_link': form.facebook_link.data,
+    'artist_web_url': form.website_link.data,
+    'artist_seeking_talent': form.seeking_venue.data,
+    'artist_talent_description': form.seeking_description.data,
+  }
+
+
+def show_values(form):
+  return {
+    'artist_id': form.artist_id.data,
+    'venue_id': form.venue_id.data,
+    'start_time': form.start_time.data,
+    'end_time': form.end_time.data,
+  }
+
+
+IMPORTERS = {
+  'venues': (Venue, VenueForm, venue_values),
+  'artists': (Artist, ArtistForm, artist_values),
+  'shows': (Show, ShowForm, show_values),
+}
+
+
+class ImportResult(object):
+
+  def __init__(self, kind):
+    self.kind = kind
+    self.read = 0
+    self.inserted = 0
+    self.errors = []
+    self.seconds = 0.0
+    self.touched = {'venue': set(), 'artist': set()}
+
+  @property
+  def rows_per_second(self):
+    return self.inserted / self.seconds if self.seconds else 0.0
+
+  def error(self, line, message):
+    self.errors.append((line, message))
+
+
+def _form_value(value):
+  if isinstance(value, bool):
+    return 'y' if value else 'false'
+  return '' if value is None else str(value)
+
+
+def read_rows(stream, format):
+  """Yield (line number, MultiDict) from CSV or JSON Lines text."""
+  if format == 'csv':
+    reader = csv.reader(stream)
+    header = next(reader, None) or []
+    for row in reader:
+      data = MultiDict()
+      for key, value in zip(header, row):
+        if key == 'genres':
+          for genre in value.split(','):
+            if genre.strip():
+              data.add(key, genre.strip())
+        else:
+          data.add(key, value)
+      yield reader.line_num, data
+    return
+  for number, line in enumerate(stream, 1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as e:
+      yield number, e
+      continue
+    data = MultiDict()
+    for key, value in row.items():
+      for item in (value if isinstance(value, list) else [value]):
+        data.add(key, _form_value(item))
+    yield number, data
+
+
+def _resolve_show_references(session, rows, result):
+  """Check every artist/venue id of a batch with two queries."""
+  artist_ids = set(values['artist_id'] for line, values in rows)
+  venue_ids = set(values['venue_id'] for line, values in rows)
+  known_artists = set(id for (id,) in session.query(Artist.id).filter(Artist.id.in_(artist_ids)))
+  known_venues = set(id for (id,) in session.query(Venue.id).filter(Venue.id.in_(venue_ids)))
+  resolved = []
+  for line, values in rows:
+    if values['artist_id'] not in known_artists:
+      result.error(line, 'unknown artist_id {}'.format(values['artist_id']))
+    elif values['venue_id'] not in known_venues:
+      result.error(line, 'unknown venue_id {}'.format(values['venue_id']))
+    else:
+      result.touched['artist'].add(values['artist_id'])
+      result.touched['venue'].add(values['venue_id'])
+      resolved.append((line, values))
+  return resolved
+
+
+def _reject_double_bookings(session, rows, result):
+  """Drop the rows that overlap an existing show, or an earlier row, of their venue or artist."""
+  found = check_bookings(session, [Booking(**values) for line, values in rows])
+  accepted = []
+  for (line, values), conflicts in zip(rows, found):
+    if not conflicts:
+      accepted.append((line, values))
+      continue
+    conflict = conflicts[0]
+    other = 'show {}'.format(conflict.show_id) if conflict.show_id is not None else 'line {}'.format(rows[conflict.proposal][0])
+    result.error(line, '{} already booked by {} from {} to {}'.format(
+      conflict.kind, other, conflict.start_time.isoformat(), conflict.end_time.isoformat()))
+  return accepted
+
+
+def _copy_value(value):
+  if value is None:
+    return None
+  if isinstance(value, bool):
+    return 't' if value else 'f'
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if isinstance(value, list):
+    return '{' + ','.join('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"' for item in value) + '}'
+  return value
+
+
+def copy_rows(session, table, rows):
+  """Load rows with Postgres COPY ... FROM STDIN through the DBAPI cursor."""
+  columns = list(rows[0].keys())
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for row in rows:
+    writer.writerow([_copy_value(row[column]) for column in columns])
+  buffer.seek(0)
+  cursor = session.connection().connection.cursor()
+  try:
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+      table.name, ', '.join('"{}"'.format(column) for column in columns)), buffer)
+  finally:
+    cursor.close()
+
+
+def insert_rows(session, table, rows):
+  session.execute(table.insert(), rows)
+
+
+def _reason(error):
+  # The driver's own message, without SQLAlchemy's statement and parameters.
+  return str(getattr(error, 'orig', None) or error).strip().splitlines()[0]
+
+
+def _flush(session, table, batch, result, use_copy):
+  """Insert and commit `batch`.
+
+  When the database refuses it (a unique violation, a foreign key gone
+  since the rows were checked, ...), its two halves are retried on their
+  own, down to the single rows that fail: those are rejected with their
+  own error and every other row is still inserted, at the cost of a few
+  round trips per bad row.
+  """
+  if not batch:
+    return
+  rows = [values for line, values in batch]
+  try:
+    if use_copy:
+      copy_rows(session, table, rows)
+    else:
+      insert_rows(session, table, rows)
+    session.commit()
+    result.inserted += len(rows)
+  except Exception as e:
+    session.rollback()
+    if len(batch) == 1:
+      result.error(batch[0][0], _reason(e))
+      return
+    middle = len(batch) // 2
+    _flush(session, table, batch[:middle], result, use_copy)
+    _flush(session, table, batch[middle:], result, use_copy)
+
+
+def import_rows(session, kind, rows, batch_size=DEFAULT_BATCH_SIZE, use_copy=None):
+  """Validate (line, MultiDict) rows with the app's forms and insert in batches.
+
+  Invalid rows are reported in the result and skipped; they never abort the
+  batch they belong to.
+  """
+  model, form_class, values_of = IMPORTERS[kind]
+  table = model.__table__
+  if use_copy is None:
+    use_copy = session.get_bind().dialect.driver == 'psycopg2'
+  result = ImportResult(kind)
+  start = time.perf_counter()
+  batch = []
+  for line, data in rows:
+    result.read += 1
+    if isinstance(data, Exception):
+      result.error(line, str(data))
+      continue
+    form = form_class(formdata=data, meta={'csrf': False})
+    if not form.validate():
+      result.error(line, '; '.join('{}: {}'.format(name, ', '.join(messages))
+                                   for name, messages in form.errors.items()))
+      continue
+    values = values_of(form)
+    if kind == 'shows':
+      try:
+        values.update(make_booking(**values)._asdict())
+      except ValueError as e:
+        result.error(line, str(e))
+        continue
+    batch.append((line, values))
+    if len(batch) >= batch_size:
+      if kind == 'shows':
+        batch = _reject_double_bookings(session, _resolve_show_references(session, batch, result), result)
+      _flush(session, table, batch, result, use_copy)
+      batch = []
+  if kind == 'shows':
+    batch = _reject_double_bookings(session, _resolve_show_references(session, batch, result), result)
+  _flush(session, table, batch, result, use_copy)
+  if kind == 'shows':
+    recount(session, venue_ids=result.touched['venue'], artist_ids=result.touched['artist'])
+    session.commit()
+  result.seconds = time.perf_counter() - start
+  return result
+
+
+def import_file(session, kind, path, format=None, **kwargs):
+  if format is None:
+    format = 'csv' if path.endswith('.csv') else 'jsonl'
+  with open(path, newline='', encoding='utf-8') as f:
+    return import_rows(session, kind, read_rows(f, format), **kwargs)
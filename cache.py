@@ -0,0 +1,291 @@
+#----------------------------------------------------------------------------#
+# Rendered page cache.
+#----------------------------------------------------------------------------#
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, make_response, request, session
+
+
+class MemoryBackend(object):
+  """LRU + TTL store bounded by the total size of cached bodies."""
+
+  def __init__(self, max_bytes=32 * 1024 * 1024):
+    self.max_bytes = max_bytes
+    self.used_bytes = 0
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._versions = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires, size, value = entry
+      if expires < time.time():
+        self._remove(key)
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl, size):
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (time.time() + ttl, size, value)
+      self.used_bytes += size
+      while self.used_bytes > self.max_bytes:
+        self._remove(next(iter(self._entries)))
+        self.evictions += 1
+
+  def _remove(self, key):
+    expires, size, value = self._entries.pop(key)
+    self.used_bytes -= size
+
+  def versions(self, tags):
+    with self._lock:
+      return [self._versions.get(tag, '0') for tag in tags]
+
+  def bump(self, tag):
+    with self._lock:
+      self._versions[tag] = uuid.uuid4().hex
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._versions.clear()
+      self.used_bytes = 0
+
+  def info(self):
+    return {'entries': len(self._entries), 'bytes': self.used_bytes,
+            'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class FileSystemBackend(object):
+  """Entries as files in a directory shared by every worker on the host.
+
+  Point CACHE_DIR at /dev/shm to keep it in shared memory. Reads refresh
+  the file's mtime so pruning drops the least recently used entries first.
+  """
+
+  PRUNE_EVERY = 64
+
+  def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self.evictions = 0
+    self._sets = 0
+    os.makedirs(os.path.join(directory, 'tags'), exist_ok=True)
+
+  def _path(self, key, folder=''):
+    return os.path.join(self.directory, folder, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+  def _write(self, path, data):
+    tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(tmp, 'wb') as f:
+      f.write(data)
+    os.replace(tmp, path)
+
+  def get(self, key):
+    path = self._path(key)
+    try:
+      with open(path, 'rb') as f:
+        expires, value = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+      return None
+    if expires < time.time():
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      return None
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+    return value
+
+  def set(self, key, value, ttl, size):
+    if size > self.max_bytes:
+      return
+    self._write(self._path(key), pickle.dumps((time.time() + ttl, value), pickle.HIGHEST_PROTOCOL))
+    self._sets += 1
+    if self._sets % self.PRUNE_EVERY == 0:
+      self.prune()
+
+  def _files(self):
+    files = []
+    for entry in os.scandir(self.directory):
+      if entry.is_file() and not entry.name.endswith('.tmp'):
+        stat = entry.stat()
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+    return files
+
+  def prune(self):
+    files = sorted(self._files())
+    used = sum(size for mtime, size, path in files)
+    for mtime, size, path in files:
+      if used <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        continue
+      used -= size
+      self.evictions += 1
+
+  def versions(self, tags):
+    versions = []
+    for tag in tags:
+      try:
+        with open(self._path(tag, 'tags'), 'rb') as f:
+          versions.append(f.read().decode('ascii'))
+      except OSError:
+        versions.append('0')
+    return versions
+
+  def bump(self, tag):
+    # A fresh random token rather than a counter: two workers bumping at
+    # once can never write the same value back.
+    self._write(self._path(tag, 'tags'), uuid.uuid4().hex.encode('ascii'))
+
+  def clear(self):
+    for root, dirs, files in os.walk(self.directory):
+      for name in files:
+        os.remove(os.path.join(root, name))
+
+  def info(self):
+    files = self._files()
+    return {'entries': len(files), 'bytes': sum(size for mtime, size, path in files),
+            'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class PageCache(object):
+  """Caches GET responses under tags that write handlers invalidate.
+
+  Each cache key embeds the current version of its tags, so invalidating a
+  tag makes every page carrying it miss without scanning the store; the
+  orphaned entries then age out through the backend's LRU/TTL eviction.
+  """
+
+  def __init__(self, app=None):
+    self.backend = None
+    self.ttl = 300
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    kind = app.config.get('CACHE_BACKEND', 'memory')
+    max_bytes = app.config.get('CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    if kind == 'filesystem':
+      self.backend = FileSystemBackend(app.config['CACHE_DIR'], max_bytes=max_bytes)
+    elif kind == 'memory':
+      self.backend = MemoryBackend(max_bytes=max_bytes)
+    else:
+      self.backend = None
+    self.ttl = app.config.get('CACHE_TTL', 300)
+    app.extensions['page_cache'] = self
+
+  def _key(self, tags):
+    versions = self.backend.versions(tags)
+    return 'page:{}|{}'.format(request.full_path, ','.join(versions))
+
+  def lookup(self, tags):
+    """(key, cached Response or None) for the current request.
+
+    The key is None when the request must not be cached at all.
+    """
+    if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+      return None, None
+    key = self._key(tags)
+    if g.get('read_primary'):
+      # Pinned to the primary after a write (replicas.py); a cached copy
+      # may have been rendered from a replica that hadn't seen it yet.
+      self.misses += 1
+      return key, None
+    entry = self.backend.get(key)
+    if entry is None:
+      self.misses += 1
+      return key, None
+    self.hits += 1
+    status, headers, body = entry
+    return key, Response(body, status=status, headers=headers)
+
+  def store(self, key, response):
+    if key is not None and response.status_code == 200:
+      self._store(key, response)
+
+  def cached(self, tags):
+    """Decorator; `tags(**view_args)` names the data a page depends on."""
+    def decorator(view):
+      @wraps(view)
+      def wrapper(**view_args):
+        # asgi.py may have looked the page up already.
+        key, response = g.pop('page_lookup', None) or self.lookup(tags(**view_args))
+        if response is not None:
+          return response
+        response = make_response(view(**view_args))
+        self.store(key, response)
+        return response
+      return wrapper
+    return decorator
+
+  def _store(self, key, response):
+    # Pages read from a replica are kept no longer than its allowed lag.
+    ttl = min(self.ttl, g.get('cache_ttl', self.ttl))
+    headers = [(name, value) for name, value in response.headers if name.lower() != 'set-cookie']
+    if not response.is_streamed:
+      body = response.get_data()
+      self.backend.set(key, (response.status_code, headers, body), ttl, len(body))
+      return
+    # Streamed pages are cached once the last chunk has gone out.
+    chunks = []
+    source = response.response
+
+    def tee():
+      for chunk in source:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        yield chunk
+      body = b''.join(chunks)
+      self.backend.set(key, (response.status_code, headers, body), ttl, len(body))
+    response.response = tee()
+
+  def invalidate(self, *tags):
+    if self.backend is None:
+      return
+    for tag in tags:
+      self.backend.bump(tag)
+      self.invalidations += 1
+
+  def stats(self):
+    stats = {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+    if self.backend is not None:
+      stats.update(self.backend.info())
+    return stats
+
+
+def cached_page(tags):
+  """PageCache.cached for blueprints, using the app's cache at request time."""
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**view_args):
+      cache = current_app.extensions.get('page_cache')
+      if cache is None:
+        return view(**view_args)
+      return cache.cached(tags)(view)(**view_args)
+    wrapper.cache_tags = tags
+    return wrapper
+  return decorator
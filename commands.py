@@ -0,0 +1,192 @@
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+# Added to the app's `flask` command line by create_app(); web workers never
+# import this module.
+from datetime import datetime
+import time
+from urllib.parse import urlsplit
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.engine import make_url
+
+from assets import build_assets
+from bookings import double_bookings
+from bulk_import import import_file, IMPORTERS, DEFAULT_BATCH_SIZE
+from counters import check_counters
+from export import export_stream, EXPORTS
+from genres import invalidate_genre_index
+from models import db
+from query_plans import check_plans, hot_paths, seed_plan_dataset, without_background_jobs, without_page_cache
+from replicas import SqliteReplicator
+from search import invalidate_search_index
+from show_partitions import ensure_partitions, is_partitioned
+from templating import compile_bundle
+
+cli = AppGroup('fyyur')
+
+
+@cli.command('check-plans')
+@click.option('--seed', is_flag=True, help='Bulk-load a large dataset first.')
+@click.option('--verbose', is_flag=True, help='Print every explained statement.')
+def check_plans_command(seed, verbose):
+  """Fail if a hot-path query falls back to a sequential scan."""
+  if seed:
+    seed_plan_dataset(db.session)
+  results = check_plans(current_app._get_current_object(), db)
+  failures = [result for result in results if result.seq_scans]
+  for result in results:
+    if verbose or result.seq_scans:
+      click.echo('[{}] {}'.format(result.label, ' '.join(result.statement.split())))
+      click.echo('    scans: {}'.format(result.scans))
+  click.echo('{} statements explained, {} with sequential scans'.format(len(results), len(failures)))
+  if failures:
+    raise SystemExit(1)
+
+@cli.command('check-budgets')
+def check_budgets_command():
+  """Request every hot path uncached and fail if one exceeds its query budget."""
+  app = current_app._get_current_object()
+  sql_profiler = app.extensions['sql_profiler']
+  failures = 0
+  client = app.test_client()
+  with without_background_jobs(app), without_page_cache(app):
+    for path in hot_paths(db.session):
+      with client.open(path.path, method=path.method, data=path.data) as response:
+        # Drain the streamed body so the whole request, and its queries, runs.
+        response.get_data()
+      endpoint = app.url_map.bind('').match(urlsplit(path.path).path, method=path.method)[0]
+      budget = getattr(app.view_functions[endpoint], 'query_budget', None)
+      stats = sql_profiler.stats().get(endpoint, {})
+      queries = stats.get('max_queries', 0)
+      over = budget is not None and queries > budget
+      failures += over
+      click.echo('{:<16} {:>3} queries  budget {:<4} {}{}'.format(
+        path.label, queries, budget if budget is not None else '-', response.status_code, '  OVER' if over else ''))
+  if failures:
+    raise SystemExit(1)
+
+@cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option('--no-copy', is_flag=True, help='Use batched INSERTs even on Postgres.')
+def import_data_command(kind, path, format, batch_size, no_copy):
+  """Bulk-load venues, artists or shows from CSV or JSON Lines."""
+  result = import_file(db.session, kind, path, format=format, batch_size=batch_size,
+                       use_copy=False if no_copy else None)
+  for line, message in result.errors[:50]:
+    click.echo('line {}: {}'.format(line, message), err=True)
+  if len(result.errors) > 50:
+    click.echo('... {} more errors'.format(len(result.errors) - 50), err=True)
+  click.echo('{}: {} read, {} inserted, {} rejected in {:.2f}s ({:.0f} rows/s)'.format(
+    kind, result.read, result.inserted, len(result.errors), result.seconds, result.rows_per_second))
+  invalidate_search_index()
+  invalidate_genre_index()
+  current_app.extensions['page_cache'].invalidate(
+    kind, 'shows', *(['venue:{}'.format(id) for id in result.touched['venue']] +
+                     ['artist:{}'.format(id) for id in result.touched['artist']]))
+
+@cli.command('check-counters')
+@click.option('--fix', is_flag=True, help='Recount the venues and artists that disagree.')
+def check_counters_command(fix):
+  """Compare upcoming show counters with a full recount of Shows."""
+  mismatches = check_counters(db.session, fix=fix)
+  for m in mismatches[:50]:
+    click.echo('{} {}: count {} != {}, next_show_at {} != {}'.format(
+      m.kind, m.id, m.stored_count, m.actual_count, m.stored_next, m.actual_next), err=True)
+  if len(mismatches) > 50:
+    click.echo('... {} more mismatches'.format(len(mismatches) - 50), err=True)
+  click.echo('{} mismatched counters{}'.format(len(mismatches), ', repaired' if fix and mismatches else ''))
+  if mismatches and not fix:
+    raise SystemExit(1)
+  if mismatches:
+    current_app.extensions['page_cache'].invalidate('venues', 'artists')
+
+@cli.command('check-bookings')
+@click.option('--limit', default=1000, show_default=True, help='Pairs to list per venue/artist check.')
+def check_bookings_command(limit):
+  """List shows that overlap another show of the same venue or artist.
+
+  Postgres' exclusion constraints can't be added while any remain.
+  """
+  pairs = double_bookings(db.session, limit=limit)
+  for kind, first, second in pairs[:50]:
+    click.echo('{}: show {} overlaps show {}'.format(kind, first, second), err=True)
+  if len(pairs) > 50:
+    click.echo('... {} more overlapping pairs'.format(len(pairs) - 50), err=True)
+  click.echo('{} overlapping pairs of shows'.format(len(pairs)))
+  if pairs:
+    raise SystemExit(1)
+
+@cli.command('create-show-partitions')
+@click.option('--ahead', type=int, help='Months ahead to cover; defaults to SHOW_PARTITIONS_AHEAD.')
+def create_show_partitions_command(ahead):
+  """Create the monthly partitions of Shows missing from this month to --ahead months on."""
+  ahead = current_app.config['SHOW_PARTITIONS_AHEAD'] if ahead is None else ahead
+  with db.engine.begin() as connection:
+    if not is_partitioned(connection):
+      raise click.UsageError('Shows is not partitioned; partitioning needs Postgres and `flask db upgrade`')
+    created = ensure_partitions(connection, ahead=ahead)
+  click.echo('created {}'.format(', '.join(created)) if created else 'no partitions missing')
+
+@cli.command('export-data')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), default='ndjson', show_default=True)
+@click.option('--since', help='Only rows updated at or after this ISO 8601 timestamp.')
+@click.option('--gzip', 'compress', is_flag=True)
+def export_data_command(kind, path, format, since, compress):
+  """Stream a table to a CSV or NDJSON file."""
+  since = datetime.fromisoformat(since) if since else None
+  written = 0
+  with open(path, 'wb') as f:
+    for chunk in export_stream(db.session, kind, format, since=since, compress=compress):
+      f.write(chunk)
+      written += len(chunk)
+  click.echo('{}: wrote {} bytes to {}'.format(kind, written, path))
+
+@cli.command('compile-templates')
+@click.option('--target', type=click.Path(file_okay=False), help='Defaults to TEMPLATE_BUNDLE.')
+def compile_templates_command(target):
+  """Precompile every template into a bundle workers load without compiling."""
+  target = target or current_app.config['TEMPLATE_BUNDLE']
+  count = compile_bundle(current_app._get_current_object(), target)
+  click.echo('compiled {} templates into {}'.format(count, target))
+
+@cli.command('build-assets')
+@click.option('--target', type=click.Path(file_okay=False), help='Defaults to STATIC_BUILD_DIR.')
+def build_assets_command(target):
+  """Fingerprint, precompress and resize everything under static/."""
+  target = target or current_app.config['STATIC_BUILD_DIR']
+  manifest = build_assets(current_app.static_folder, target, widths=current_app.config['ASSET_IMAGE_WIDTHS'])
+  click.echo('{} assets, {} precompressed, {} image variants in {}'.format(
+    len(manifest['assets']), sum(1 for suffixes in manifest['encodings'].values() if suffixes),
+    sum(len(variants) for variants in manifest['variants'].values()), target))
+
+@cli.command('replicate-sqlite')
+@click.option('--lag', default=1.0, show_default=True, help='Seconds the replicas trail the primary by.')
+def replicate_sqlite_command(lag):
+  """Copy an SQLite primary over its SQLite REPLICA_BINDS, `lag` late, until interrupted.
+
+  A local stand-in for streaming replication, to try replica routing out.
+  """
+  config = current_app.config
+  binds = config.get('SQLALCHEMY_BINDS') or {}
+  urls = [make_url(config['SQLALCHEMY_DATABASE_URI'])]
+  for key in config.get('REPLICA_BINDS') or ():
+    bind = binds[key]
+    urls.append(make_url(bind['url'] if isinstance(bind, dict) else bind))
+  if len(urls) < 2 or any(url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:') for url in urls):
+    raise click.UsageError('needs an SQLite file primary and SQLite file REPLICA_BINDS')
+  replicator = SqliteReplicator(urls[0].database, [url.database for url in urls[1:]], lag=lag).start()
+  click.echo('replicating {} to {} with {}s lag'.format(urls[0].database, ', '.join(url.database for url in urls[1:]), lag))
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    replicator.stop()
+  click.echo('{} copies made'.format(replicator.copies))
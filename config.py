@@ -3,6 +3,11 @@ SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Integer settings; unset or empty takes the default.
+def _int_env(name, default=None):
+  value = os.getenv(name)
+  return int(value) if value else default
+
 # Enable debug mode.
 DEBUG = True
 
@@ -13,4 +18,117 @@ DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'postgres')
 DB_NAME = os.getenv('DB_NAME', 'fyyur')
 
-DB_PATH = 'postgresql://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
\ No newline at end of file
+DB_PATH = 'postgresql://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
+SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', DB_PATH)
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Most recent past shows listed on a venue or artist page; 0 lists them all.
+PAST_SHOWS_LIMIT = _int_env('PAST_SHOWS_LIMIT', 30) or None
+
+# Rendered page cache: 'memory' (per worker), 'filesystem' (shared through
+# CACHE_DIR, e.g. under /dev/shm) or 'none'. Invalidations only reach the
+# worker that made them in memory, so with more than one worker
+# (WEB_CONCURRENCY) the default is the shared filesystem store.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'filesystem' if _int_env('WEB_CONCURRENCY', 1) > 1 else 'memory')
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(basedir, '.cache', 'pages'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+
+# Connection pool. DB_POOL_MODE=transaction assumes PgBouncer (or similar)
+# does the pooling; otherwise each worker keeps DB_POOL_SIZE connections,
+# by default an even share of DB_MAX_CONNECTIONS across WEB_CONCURRENCY.
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'session')
+DB_MAX_CONNECTIONS = _int_env('DB_MAX_CONNECTIONS', 20)
+WEB_CONCURRENCY = _int_env('WEB_CONCURRENCY', 1)
+DB_POOL_SIZE = _int_env('DB_POOL_SIZE')
+DB_MAX_OVERFLOW = _int_env('DB_MAX_OVERFLOW', 0)
+DB_POOL_TIMEOUT = _int_env('DB_POOL_TIMEOUT', 10)
+DB_POOL_RECYCLE = _int_env('DB_POOL_RECYCLE', 1800)
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Milliseconds; per-route overrides use database.statement_timeout().
+DB_STATEMENT_TIMEOUT = _int_env('DB_STATEMENT_TIMEOUT', 5000)
+SEARCH_STATEMENT_TIMEOUT = _int_env('SEARCH_STATEMENT_TIMEOUT', 2000)
+
+# Background thread moving shows from upcoming to past at their start time,
+# keeping Venues/Artists.upcoming_show_count and next_show_at current.
+# Counters of shows booked by another worker lag by at most
+# SHOW_ROLLOVER_POLL_SECONDS; a worker's first pass recounts the shows that
+# started up to SHOW_ROLLOVER_CATCH_UP seconds before it.
+SHOW_ROLLOVER = os.getenv('SHOW_ROLLOVER', 'true').lower() == 'true'
+SHOW_ROLLOVER_POLL_SECONDS = _int_env('SHOW_ROLLOVER_POLL_SECONDS', 60)
+SHOW_ROLLOVER_CATCH_UP = _int_env('SHOW_ROLLOVER_CATCH_UP', 6 * 3600)
+
+# Per-request SQL profiling (instrumentation.py). Requests slower than
+# SLOW_REQUEST_MS are logged to SLOW_LOG_PATH with probability
+# SLOW_LOG_SAMPLE; a statement shape repeated N_PLUS_ONE_THRESHOLD times in
+# one request is reported as a possible N+1. SQL_ENFORCE_BUDGETS turns an
+# exceeded @query_budget into an exception (on by default under TESTING).
+SQL_PROFILE = os.getenv('SQL_PROFILE', 'true').lower() == 'true'
+SLOW_REQUEST_MS = _int_env('SLOW_REQUEST_MS', 500)
+SLOW_LOG_SAMPLE = float(os.getenv('SLOW_LOG_SAMPLE', 1.0))
+SLOW_LOG_PATH = os.getenv('SLOW_LOG_PATH', 'slow.log')
+N_PLUS_ONE_THRESHOLD = _int_env('N_PLUS_ONE_THRESHOLD', 5)
+SLOWEST_STATEMENTS = _int_env('SLOWEST_STATEMENTS', 5)
+if os.getenv('SQL_ENFORCE_BUDGETS'):
+  SQL_ENFORCE_BUDGETS = os.getenv('SQL_ENFORCE_BUDGETS').lower() == 'true'
+
+# Async read path (asgi.py); defaults to SQLALCHEMY_DATABASE_URI behind the
+# dialect's async driver.
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')
+
+# Templates (templating.py). `flask compile-templates` writes a precompiled
+# bundle to TEMPLATE_BUNDLE at deploy time; workers load it instead of
+# compiling, until a template source no longer matches its manifest. Other
+# templates compile once into TEMPLATE_CACHE_DIR, shared by all workers.
+TEMPLATE_BUNDLE = os.getenv('TEMPLATE_BUNDLE', os.path.join(basedir, '.cache', 'templates'))
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(basedir, '.cache', 'jinja'))
+TEMPLATE_METRICS = os.getenv('TEMPLATE_METRICS', 'true').lower() == 'true'
+
+# Static assets (assets.py). `flask build-assets` writes fingerprinted,
+# precompressed copies of static/ and image variants to STATIC_BUILD_DIR;
+# those are served with Cache-Control: immutable for ASSET_MAX_AGE seconds.
+STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', os.path.join(basedir, '.cache', 'static'))
+ASSET_MAX_AGE = _int_env('ASSET_MAX_AGE', 365 * 24 * 3600)
+ASSET_IMAGE_WIDTHS = [int(width) for width in os.getenv('ASSET_IMAGE_WIDTHS', '480,960,1440,1920').split(',')]
+
+# In-process typeahead indexes of artist and venue names (typeahead.py),
+# built by each worker on its first typeahead lookup and rebuilt once the
+# tables have changed.
+TYPEAHEAD_INDEX = os.getenv('TYPEAHEAD_INDEX', 'true').lower() == 'true'
+
+# Group commit (group_commit.py): venue, artist and show creations are
+# queued and committed by a background thread, up to GROUP_COMMIT_MAX_ITEMS
+# per transaction and GROUP_COMMIT_MAX_WAIT_MS after the first of a batch.
+GROUP_COMMIT = os.getenv('GROUP_COMMIT', 'false').lower() == 'true'
+GROUP_COMMIT_MAX_ITEMS = _int_env('GROUP_COMMIT_MAX_ITEMS', 64)
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv('GROUP_COMMIT_MAX_WAIT_MS', 5))
+GROUP_COMMIT_QUEUE_SIZE = _int_env('GROUP_COMMIT_QUEUE_SIZE', 10000)
+GROUP_COMMIT_TIMEOUT = _int_env('GROUP_COMMIT_TIMEOUT', 30)
+
+# Read replicas (replicas.py). DATABASE_REPLICA_URLS, comma-separated, become
+# the binds replica_1, replica_2, ...; GET requests read from a healthy one.
+# A client that wrote reads from the primary for REPLICA_STICKY_SECONDS,
+# which must cover the lag of a replica in rotation: one further behind
+# than REPLICA_MAX_LAG_SECONDS, or failing, is ejected for
+# REPLICA_EJECT_SECONDS. Replicas are probed every REPLICA_CHECK_SECONDS.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+SQLALCHEMY_BINDS = dict(('replica_{}'.format(n), url) for n, url in enumerate(DATABASE_REPLICA_URLS, 1))
+REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 15))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', 2))
+REPLICA_EJECT_SECONDS = float(os.getenv('REPLICA_EJECT_SECONDS', 30))
+
+# Monthly partitions of Shows on Postgres (show_partitions.py): each worker
+# checks every SHOW_PARTITION_CHECK_SECONDS that the next
+# SHOW_PARTITIONS_AHEAD months have theirs, and creates the missing ones.
+SHOW_PARTITIONS = os.getenv('SHOW_PARTITIONS', 'true').lower() == 'true'
+SHOW_PARTITIONS_AHEAD = _int_env('SHOW_PARTITIONS_AHEAD', 12)
+SHOW_PARTITION_CHECK_SECONDS = _int_env('SHOW_PARTITION_CHECK_SECONDS', 6 * 3600)
+
+# Blueprints create_app() registers, as 'module:attribute'; a module not
+# listed here is never imported by the web app. The table exports
+# (export:export) are opt-in, and answer only requests that send
+# `Authorization: Bearer <EXPORT_TOKEN>`.
+BLUEPRINTS = [name.strip() for name in os.getenv('BLUEPRINTS', 'api:api,typeahead:typeahead').split(',') if name.strip()]
+EXPORT_TOKEN = os.getenv('EXPORT_TOKEN')
@@ -0,0 +1,200 @@
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func, or_, select
+
+from models import Venue, Artist, Show
+
+logger = logging.getLogger(__name__)
+
+Mismatch = namedtuple('Mismatch', ['kind', 'id', 'stored_count', 'actual_count', 'stored_next', 'actual_next'])
+
+COUNTED = (
+  ('venue', Venue, Show.venue_id),
+  ('artist', Artist, Show.artist_id),
+)
+
+
+def record_new_show(session, show, now=None):
+  """Count a just-added show on its venue and artist, in the same transaction."""
+  if now is None:
+    now = datetime.now()
+  if show.start_time <= now:
+    return
+  for kind, model, fk in COUNTED:
+    entity_id = show.venue_id if kind == 'venue' else show.artist_id
+    session.query(model).filter(model.id == entity_id).update({
+      model.upcoming_show_count: model.upcoming_show_count + 1,
+      model.next_show_at: case(
+        (and_(model.next_show_at.isnot(None), model.next_show_at <= show.start_time), model.next_show_at),
+        else_=show.start_time,
+      ),
+    }, synchronize_session=False)
+
+
+# Ids per UPDATE ... WHERE id IN (...), within SQLite's parameter limit.
+RECOUNT_CHUNK = 500
+
+
+def _recount_query(session, model, fk, now):
+  upcoming = and_(fk == model.id, Show.start_time > now)
+  return {
+    model.upcoming_show_count: select(func.count(Show.id)).where(upcoming).scalar_subquery(),
+    model.next_show_at: select(func.min(Show.start_time)).where(upcoming).scalar_subquery(),
+  }
+
+
+def _stale(values):
+  """Rows whose stored counters differ from `values`."""
+  return or_(*[column.is_distinct_from(value) for column, value in values.items()])
+
+
+def recount(session, venue_ids=(), artist_ids=(), now=None):
+  """Recompute the counters of the given venues and artists from Shows.
+
+  Each entity costs a couple of range scans of its (fk, start_time) index.
+  Only rows whose counters change are written, so when several workers
+  recount the same entities, the ones after the first write nothing.
+  """
+  if now is None:
+    now = datetime.now()
+  for (kind, model, fk), ids in zip(COUNTED, (venue_ids, artist_ids)):
+    ids = sorted(ids)
+    values = _recount_query(session, model, fk, now)
+    for start in range(0, len(ids), RECOUNT_CHUNK):
+      chunk = ids[start:start + RECOUNT_CHUNK]
+      session.query(model).filter(model.id.in_(chunk), _stale(values)).update(values, synchronize_session=False)
+
+
+def recount_all(session, now=None):
+  """Recompute every counter; for seeding and repairs, not request paths."""
+  if now is None:
+    now = datetime.now()
+  for kind, model, fk in COUNTED:
+    session.query(model).update(_recount_query(session, model, fk, now), synchronize_session=False)
+
+
+def delete_venue_shows(session, venue_id, now=None):
+  """Delete a venue's shows and take its upcoming ones off its artists."""
+  artist_ids = [id for (id,) in session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+  session.query(Show).filter(Show.venue_id == venue_id).delete(synchronize_session=False)
+  recount(session, artist_ids=artist_ids, now=now)
+  return artist_ids
+
+
+def check_counters(session, now=None, fix=False):
+  """Compare every stored counter with a full recount; optionally repair."""
+  if now is None:
+    now = datetime.now()
+  mismatches = []
+  for kind, model, fk in COUNTED:
+    actual = dict(
+      (id, (count, first)) for id, count, first in
+      session.query(fk, func.count(Show.id), func.min(Show.start_time))
+      .filter(Show.start_time > now).group_by(fk)
+    )
+    for id, stored_count, stored_next in session.query(model.id, model.upcoming_show_count, model.next_show_at):
+      actual_count, actual_next = actual.get(id, (0, None))
+      if stored_count != actual_count or stored_next != actual_next:
+        mismatches.append(Mismatch(kind, id, stored_count, actual_count, stored_next, actual_next))
+  if fix and mismatches:
+    recount(
+      session,
+      venue_ids=[m.id for m in mismatches if m.kind == 'venue'],
+      artist_ids=[m.id for m in mismatches if m.kind == 'artist'],
+      now=now,
+    )
+    session.commit()
+  return mismatches
+
+
+class ShowRollover(object):
+  """Moves shows from upcoming to past at their start time, whoever booked them.
+
+  Each pass recounts the venues and artists of the shows that started
+  since the previous pass, then the thread sleeps until the next start
+  time in Shows, or `poll` at most. A show this worker books wakes it
+  early (push()); one another worker books after this one went to sleep
+  is picked up by the next pass, so a counter is at most `poll` late.
+  Every worker runs the passes, but recount() only writes the rows whose
+  counters are wrong: the first worker to get there does the UPDATE and
+  the others find nothing left to change. A worker's first pass looks
+  back `catch_up`, for shows that started while no worker was running.
+  `on_roll(venue_ids, artist_ids)` runs after each commit, e.g. to
+  invalidate cached pages.
+  """
+
+  def __init__(self, app, db, poll=timedelta(minutes=1), catch_up=timedelta(hours=6), on_roll=None):
+    self.app = app
+    self.db = db
+    self.on_roll = on_roll
+    self.poll = poll
+    self.catch_up = catch_up
+    self._rolled_until = None
+    self._next_at = None
+    self._condition = threading.Condition()
+    self._thread = None
+
+  def start(self):
+    with self._condition:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name='show-rollover', daemon=True)
+        self._thread.start()
+
+  def push(self, show_id, start_time, venue_id, artist_id):
+    """Wake up at the start of a show just booked, if that comes before the next pass."""
+    with self._condition:
+      if self._next_at is None or start_time < self._next_at:
+        self._next_at = start_time
+        self._condition.notify()
+
+  def run_once(self, now=None):
+    """Roll every show that started since the last pass, up to `now`; returns how many."""
+    if now is None:
+      now = datetime.now()
+    since = self._rolled_until if self._rolled_until is not None else now - self.catch_up
+    with self.app.app_context():
+      session = self.db.session
+      try:
+        started = (
+          session.query(Show.venue_id, Show.artist_id)
+          .filter(Show.start_time > since, Show.start_time <= now)
+          .all()
+        )
+        if started:
+          venue_ids, artist_ids = set(v for v, a in started), set(a for v, a in started)
+          recount(session, venue_ids=venue_ids, artist_ids=artist_ids, now=now)
+          session.commit()
+          if self.on_roll is not None:
+            self.on_roll(venue_ids, artist_ids)
+        next_at = session.query(func.min(Show.start_time)).filter(Show.start_time > now).scalar()
+      except Exception:
+        session.rollback()
+        raise
+      finally:
+        session.remove()
+    with self._condition:
+      self._rolled_until = now
+      # Keep an earlier start pushed meanwhile.
+      pushed = self._next_at if self._next_at is not None and self._next_at > now else None
+      upcoming = [at for at in (next_at, pushed) if at is not None]
+      self._next_at = min(upcoming) if upcoming else None
+    return len(started)
+
+  def _run(self):
+    while True:
+      try:
+        self.run_once()
+      except Exception:
+        logger.exception('show rollover failed')
+      with self._condition:
+        now = datetime.now()
+        wake = now + self.poll
+        if self._next_at is not None:
+          wake = min(wake, self._next_at)
+        self._condition.wait(max((wake - now).total_seconds(), 0.01))
@@ -0,0 +1,185 @@
+#----------------------------------------------------------------------------#
+# Connection management.
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, exc, func, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolMetrics(object):
+  """Checkout latency, waits and timeouts of one connection pool."""
+
+  SAMPLES = 1024
+
+  def __init__(self):
+    self.checkouts = 0
+    self.waits = 0
+    self.timeouts = 0
+    self.total_wait = 0.0
+    self.max_wait = 0.0
+    self._samples = deque(maxlen=self.SAMPLES)
+    self._lock = threading.Lock()
+
+  def record(self, seconds, waited):
+    with self._lock:
+      self.checkouts += 1
+      self.total_wait += seconds
+      self.max_wait = max(self.max_wait, seconds)
+      self._samples.append(seconds)
+      if waited:
+        self.waits += 1
+
+  def timed_out(self):
+    with self._lock:
+      self.timeouts += 1
+
+  def snapshot(self):
+    with self._lock:
+      samples = sorted(self._samples)
+    p95 = samples[int(len(samples) * 0.95)] if samples else 0.0
+    return {
+      'checkouts': self.checkouts,
+      'waits': self.waits,
+      'timeouts': self.timeouts,
+      'checkout_ms_avg': round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+      'checkout_ms_p95': round(p95 * 1000, 3),
+      'checkout_ms_max': round(self.max_wait * 1000, 3),
+    }
+
+
+class MeteredQueuePool(QueuePool):
+  """QueuePool that times every checkout and counts saturated ones."""
+
+  def __init__(self, *args, **kwargs):
+    super(MeteredQueuePool, self).__init__(*args, **kwargs)
+    self.metrics = PoolMetrics()
+
+  def _do_get(self):
+    waited = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+    start = time.perf_counter()
+    try:
+      return super(MeteredQueuePool, self)._do_get()
+    except exc.TimeoutError:
+      self.metrics.timed_out()
+      raise
+    finally:
+      self.metrics.record(time.perf_counter() - start, waited)
+
+
+def pool_status(engine):
+  pool = engine.pool
+  status = {'pool': type(pool).__name__}
+  if isinstance(pool, QueuePool):
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    status.update({
+      'size': pool.size(),
+      'max_overflow': pool._max_overflow,
+      'checked_out': pool.checkedout(),
+      'overflow': pool.overflow(),
+      'saturation': round(pool.checkedout() / float(capacity), 3) if capacity else 0.0,
+    })
+  if isinstance(pool, MeteredQueuePool):
+    status.update(pool.metrics.snapshot())
+  return status
+
+
+def engine_options(config):
+  """SQLALCHEMY_ENGINE_OPTIONS derived from the DB_* settings.
+
+  In 'transaction' mode a PgBouncer in front of Postgres does the pooling,
+  so each worker holds no connections of its own and no session state
+  (prepared statements, SET) may outlive a transaction.
+  """
+  url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+  if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+    return {}
+  if config.get('DB_POOL_MODE') == 'transaction':
+    options = {'poolclass': NullPool}
+    if url.get_driver_name() == 'psycopg':
+      options['connect_args'] = {'prepare_threshold': None}
+    return options
+
+  pool_size = config.get('DB_POOL_SIZE')
+  if not pool_size:
+    workers = max(int(config.get('WEB_CONCURRENCY') or 1), 1)
+    pool_size = max(config.get('DB_MAX_CONNECTIONS', 20) // workers, 1)
+  options = {
+    'poolclass': MeteredQueuePool,
+    'pool_size': pool_size,
+    'max_overflow': config.get('DB_MAX_OVERFLOW', 0),
+    'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+    'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+    'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+  }
+  timeout = config.get('DB_STATEMENT_TIMEOUT')
+  if timeout and url.get_backend_name() == 'postgresql':
+    options['connect_args'] = {'options': '-c statement_timeout={}'.format(int(timeout))}
+  return options
+
+
+def statement_timeout(milliseconds):
+  """Per-route statement timeout, applied with SET LOCAL on each transaction.
+
+  Takes milliseconds or the name of a config key holding them, read when
+  the view runs.
+  """
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      g.statement_timeout = view_statement_timeout(wrapper)
+      return view(*args, **kwargs)
+    wrapper.statement_timeout = milliseconds
+    return wrapper
+  return decorator
+
+
+def view_statement_timeout(view):
+  """Milliseconds `view` declared with @statement_timeout, or None."""
+  milliseconds = getattr(view, 'statement_timeout', None)
+  if isinstance(milliseconds, str):
+    return current_app.config.get(milliseconds)
+  return milliseconds
+
+
+def local_statement_timeout():
+  """The SET LOCAL a Postgres transaction starts with, or None."""
+  if not has_app_context():
+    return None
+  timeout = g.get('statement_timeout') if has_request_context() else None
+  # Session mode sets the default at connect time; transaction mode
+  # cannot keep session state, so it has to be repeated here.
+  if timeout is None and current_app.config.get('DB_POOL_MODE') == 'transaction':
+    timeout = current_app.config.get('DB_STATEMENT_TIMEOUT')
+  if timeout is None:
+    return None
+  return text('SET LOCAL statement_timeout = {}'.format(int(timeout)))
+
+
+def _set_statement_timeout(session, transaction, connection):
+  if connection.dialect.name != 'postgresql':
+    return
+  statement = local_statement_timeout()
+  if statement is not None:
+    connection.execute(statement)
+
+
+def init_statement_timeouts(app, db):
+  # db.session is shared by every app create_app() builds; listen once and
+  # read the settings of whichever app is current.
+  if not event.contains(db.session, 'after_begin', _set_statement_timeout):
+    event.listen(db.session, 'after_begin', _set_statement_timeout)
+
+
+def table_version(session, model):
+  """(row count, latest updated_at) of `model`'s table.
+
+  Changes with every insert, update and delete, whichever worker made it;
+  in-process indexes compare it to tell when to rebuild.
+  """
+  return tuple(session.query(func.count(model.id), func.max(model.updated_at)).one())
@@ -0,0 +1,171 @@
+#----------------------------------------------------------------------------#
+# Venue and artist detail pages.
+#----------------------------------------------------------------------------#
+from collections import namedtuple
+from datetime import datetime
+from functools import wraps
+
+from flask import abort, g
+from sqlalchemy import case, func, or_, select
+
+from genres import decode_genres
+from models import db, Venue, Artist, Show
+
+ShowSplit = namedtuple('ShowSplit', ['past', 'upcoming', 'past_count', 'upcoming_count'])
+DetailView = namedtuple('DetailView', ['model', 'id_arg', 'past_limit'])
+
+
+def split_shows_statement(fk_column, entity_id, columns, join, now, past_limit=None):
+  """All shows of one venue or artist in a single ordered SELECT.
+
+  Each row is tagged as past or upcoming against `now`; window functions
+  carry the size of each bucket and the recency of past rows so that the
+  past side can be truncated in SQL without a second COUNT query. Being a
+  plain statement, it runs on the ORM session or an async connection alike.
+  """
+  is_past = case((Show.start_time < now, 1), else_=0)
+  inner = (
+    select(
+      Show.start_time.label('start_time'),
+      is_past.label('is_past'),
+      func.row_number().over(partition_by=is_past, order_by=Show.start_time.desc()).label('recency'),
+      func.count().over(partition_by=is_past).label('bucket_count'),
+      *columns
+    )
+    .select_from(Show)
+    .join(*join)
+    .where(fk_column == entity_id)
+    .subquery()
+  )
+  statement = select(inner).order_by(inner.c.start_time)
+  if past_limit is not None:
+    statement = statement.where(or_(inner.c.is_past == 0, inner.c.recency <= max(past_limit, 1)))
+  return statement
+
+
+def split_shows(rows, past_limit=None):
+  """Partition rows tagged by split_shows_statement into a ShowSplit.
+
+  Past shows come back most recent first, upcoming shows soonest first.
+  """
+  past, upcoming = [], []
+  past_count = upcoming_count = 0
+  for row in rows:
+    if row.is_past:
+      past.append(row)
+      past_count = row.bucket_count
+    else:
+      upcoming.append(row)
+      upcoming_count = row.bucket_count
+  past.reverse()
+  if past_limit is not None:
+    past = past[:past_limit]
+  return ShowSplit(past, upcoming, past_count, upcoming_count)
+
+
+def venue_shows_statement(venue_id, now, past_limit=None):
+  return split_shows_statement(
+    Show.venue_id, venue_id,
+    columns=[
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+    ],
+    join=(Artist, Artist.id == Show.artist_id),
+    now=now, past_limit=past_limit,
+  )
+
+
+def artist_shows_statement(artist_id, now, past_limit=None):
+  return split_shows_statement(
+    Show.artist_id, artist_id,
+    columns=[
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link'),
+    ],
+    join=(Venue, Venue.id == Show.venue_id),
+    now=now, past_limit=past_limit,
+  )
+
+
+def detail_statements(model, entity_id, now, past_limit=None):
+  """The two independent SELECTs of a detail page: the entity row and its shows."""
+  shows_statement = venue_shows_statement if model is Venue else artist_shows_statement
+  return select(model.__table__).where(model.id == entity_id), shows_statement(entity_id, now, past_limit=past_limit)
+
+
+def detail_view(model, past_limit):
+  """Decorator loading a venue or artist detail view's data.
+
+  The view is called with the entity row and its ShowSplit in place of the
+  id, or the request 404s. `past_limit()` is read at request time. The rows
+  come from g.detail_rows when asgi.py has already fetched them on its
+  async engine, else from db.session.
+  """
+  id_arg = '{}_id'.format(model.__name__.lower())
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**view_args):
+      entity_id, limit = view_args.pop(id_arg), past_limit()
+      rows = g.pop('detail_rows', None)
+      if rows is None:
+        statements = detail_statements(model, entity_id, datetime.now(), past_limit=limit)
+        rows = [db.session.execute(statement).all() for statement in statements]
+      entity_rows, show_rows = rows
+      if not entity_rows:
+        abort(404)
+      return view(entity_rows[0], split_shows(show_rows, past_limit=limit), **view_args)
+    wrapper.detail_view = DetailView(model, id_arg, past_limit)
+    return wrapper
+  return decorator
+
+
+def _show_dicts(rows, fields):
+  return [{field: getattr(row, field) for field in fields + ('start_time',)} for row in rows]
+
+
+def venue_context(venue, shows):
+  """Context for pages/show_venue.html from a venue row and its ShowSplit."""
+  fields = ('artist_id', 'artist_name', 'artist_image_link')
+  return {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": decode_genres(venue.genre_ids),
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.venue_web_url,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.talent_description,
+    "image_link": venue.image_link,
+    "past_shows": _show_dicts(shows.past, fields),
+    "upcoming_shows": _show_dicts(shows.upcoming, fields),
+    "past_shows_count": shows.past_count,
+    "upcoming_shows_count": shows.upcoming_count,
+  }
+
+
+def artist_context(artist, shows):
+  """Context for pages/show_artist.html from an artist row and its ShowSplit."""
+  fields = ('venue_id', 'venue_name', 'venue_image_link')
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": artist.genres,
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.artist_web_url,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.artist_seeking_talent,
+    "seeking_description": artist.artist_talent_description,
+    "image_link": artist.image_link,
+    "past_shows": _show_dicts(shows.past, fields),
+    "upcoming_shows": _show_dicts(shows.upcoming, fields),
+    "past_shows_count": shows.past_count,
+    "upcoming_shows_count": shows.upcoming_count,
+  }
+
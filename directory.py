@@ -0,0 +1,86 @@
+#----------------------------------------------------------------------------#
+# Venue and artist directories.
+#----------------------------------------------------------------------------#
+from itertools import groupby
+
+from sqlalchemy import cast, column, func, literal, literal_column, select, table
+from sqlalchemy.dialects.postgresql import REGCLASS
+
+from models import Venue
+from pagination import keyset_page, DEFAULT_PAGE_SIZE
+
+
+def venue_directory_rows(session, criterion=None):
+  """Return one row per venue with its upcoming show count.
+
+  The count is the venue's maintained upcoming_show_count column (see
+  counters.py), so the directory is a plain scan of Venues with no join.
+  `criterion` optionally restricts the venues listed.
+  """
+  query = session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state,
+    Venue.upcoming_show_count.label('future_show_count'),
+  )
+  if criterion is not None:
+    query = query.filter(criterion)
+  return query.order_by(Venue.state, Venue.city, Venue.id).all()
+
+
+def group_by_area(rows):
+  areas = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': row.id,
+        'name': row.name,
+        'future_show_count': row.future_show_count,
+      } for row in venues],
+    })
+  return areas
+
+
+def venue_directory(session, criterion=None):
+  """Venues grouped by city/state, as rendered by pages/venues.html."""
+  return group_by_area(venue_directory_rows(session, criterion=criterion))
+
+
+def name_key(model):
+  """Sort key of the name listings, as indexed by ix_venues_name_id and ix_artists_name_id."""
+  return func.coalesce(model.name, literal_column("''"))
+
+
+def name_page(session, model, criterion=None, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+  """One keyset page of `model`'s (id, name) rows, ordered by name then id.
+
+  Only the two listed columns are read, and the cursor seeks the
+  (name, id) index, so a page costs the same at any depth and whatever the
+  size of the table. Venues or artists without a name sort first.
+  """
+  query = session.query(model.id, model.name)
+  if criterion is not None:
+    query = query.filter(criterion)
+  return keyset_page(
+    query,
+    keys=[name_key(model), model.id],
+    key_of=lambda row: (row.name or '', row.id),
+    after=after,
+    before=before,
+    limit=limit,
+  )
+
+
+def estimated_count(session, model):
+  """Rows in `model`'s table according to Postgres' statistics, instead of a COUNT(*).
+
+  pg_class.reltuples is refreshed by (auto)vacuum and ANALYZE; None before
+  the table's first ANALYZE and on other databases.
+  """
+  if session.get_bind().dialect.name != 'postgresql':
+    return None
+  reltuples = session.execute(
+    select(column('reltuples')).select_from(table('pg_class'))
+    .where(column('oid') == cast(literal('"{}"'.format(model.__tablename__)), REGCLASS))
+  ).scalar()
+  return int(reltuples) if reltuples is not None and reltuples >= 0 else None
@@ -0,0 +1,130 @@
+#----------------------------------------------------------------------------#
+# Streaming exports.
+#----------------------------------------------------------------------------#
+import csv
+import hmac
+import io
+import zlib
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+
+from api import dumps
+from models import db, Venue, Artist, Show
+
+EXPORTS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Rows fetched per round trip from the server-side cursor, and rows
+# encoded into each chunk written to the client or file.
+YIELD_PER = 2000
+CHUNK_ROWS = 500
+
+export = Blueprint('export', __name__, url_prefix='/_internal/export')
+
+
+@export.before_request
+def require_token():
+  # Whole tables: not without EXPORT_TOKEN, and hidden while none is set.
+  token = current_app.config.get('EXPORT_TOKEN')
+  if not token:
+    abort(404)
+  if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), 'Bearer {}'.format(token).encode()):
+    abort(401)
+
+
+def export_rows(session, kind, since=None):
+  """Stream every row of a table as a dict, oldest id first.
+
+  stream_results keeps the rows on the server (a named cursor on
+  Postgres) and yield_per pulls them a batch at a time, so memory stays
+  flat however large the table is.
+  """
+  model = EXPORTS[kind]
+  columns = list(model.__table__.columns)
+  query = session.query(*columns)
+  if since is not None:
+    query = query.filter(model.updated_at >= since)
+  query = query.order_by(model.id).execution_options(stream_results=True).yield_per(YIELD_PER)
+  # str(): a quoted_name key (Artist.genres) trips orjson's str-only keys.
+  names = [str(column.name) for column in columns]
+  for row in query:
+    yield dict(zip(names, row))
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+  chunk = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) >= size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+
+def _csv_value(value):
+  if isinstance(value, list):
+    # genres holds names, genre_ids small ints.
+    return ','.join(map(str, value))
+  if isinstance(value, datetime):
+    return value.isoformat()
+  return value
+
+
+def encode_csv(kind, rows):
+  names = [column.name for column in EXPORTS[kind].__table__.columns]
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(names)
+  for chunk in _chunks(rows):
+    for row in chunk:
+      writer.writerow([_csv_value(row[name]) for name in names])
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue().encode('utf-8')
+
+
+def encode_ndjson(rows):
+  for chunk in _chunks(rows):
+    yield b''.join(dumps(row) + b'\n' for row in chunk)
+
+
+def gzip_chunks(chunks, level=6):
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+  for chunk in chunks:
+    data = compressor.compress(chunk)
+    if data:
+      yield data
+  yield compressor.flush()
+
+
+def export_stream(session, kind, format, since=None, compress=False):
+  """Bytes of a CSV or NDJSON export, optionally gzipped, as a generator."""
+  rows = export_rows(session, kind, since=since)
+  chunks = encode_csv(kind, rows) if format == 'csv' else encode_ndjson(rows)
+  return gzip_chunks(chunks) if compress else chunks
+
+
+def parse_since(value):
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400, 'since must be an ISO 8601 timestamp')
+
+
+@export.route('/<any(venues, artists, shows):kind>.<any(csv, ndjson):format>')
+def export_table(kind, format):
+  since = parse_since(request.args.get('since'))
+  compress = request.args.get('gzip') in ('1', 'true')
+  filename = '{}.{}{}'.format(kind, format, '.gz' if compress else '')
+  response = Response(
+    stream_with_context(export_stream(db.session, kind, format, since=since, compress=compress)),
+    mimetype='application/gzip' if compress else FORMATS[format],
+  )
+  response.headers['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+  return response
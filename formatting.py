@@ -0,0 +1,42 @@
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+from functools import lru_cache
+
+PATTERNS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+DEFAULT_LOCALE = 'en'
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format='medium', locale=DEFAULT_LOCALE):
+  """(DateTimePattern, Locale) for a named or literal babel pattern."""
+  # Imported on the first formatted date, not at app start.
+  from babel import Locale
+  from babel.dates import parse_pattern
+  return parse_pattern(PATTERNS.get(format, format)), Locale.parse(locale)
+
+
+def _as_datetime(value):
+  if isinstance(value, datetime):
+    return value
+  # Older callers still hand over strings; only they pay for dateutil.
+  import dateutil.parser
+  return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale=DEFAULT_LOCALE):
+  """Jinja `datetime` filter; takes a datetime (or a parseable string)."""
+  pattern, locale = compiled_pattern(format, locale)
+  return pattern.apply(_as_datetime(value), locale)
+
+
+def format_datetimes(values, format='medium', locale=DEFAULT_LOCALE):
+  """Format a batch of datetimes with one pattern lookup."""
+  pattern, locale = compiled_pattern(format, locale)
+  apply = pattern.apply
+  return [apply(_as_datetime(value), locale) for value in values]
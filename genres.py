@@ -0,0 +1,144 @@
+#----------------------------------------------------------------------------#
+# Genre encoding and filtering.
+#----------------------------------------------------------------------------#
+import json
+import threading
+
+from sqlalchemy import and_, func, select
+
+from database import table_version
+
+# Genre code = position in this list + 1, so codes fit a SMALLINT and a bit
+# of a Python int. The order is part of the stored encoding: append only.
+GENRES = [
+  'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+  'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+  'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+  'Other',
+]
+GENRE_CODES = dict((genre, code) for code, genre in enumerate(GENRES, 1))
+
+# Longest id list sent as one bound parameter each; SQLite allows 999 (or
+# 32766 since 3.32) per statement, and the listing adds a few of its own.
+MAX_BOUND_IDS = 500
+
+
+def encode_genres(genres):
+  """Sorted genre codes for a list of genre names; unknown names are dropped."""
+  return sorted(set(GENRE_CODES[genre] for genre in genres or [] if genre in GENRE_CODES))
+
+
+def decode_genres(codes):
+  return [GENRES[code - 1] for code in codes or [] if 0 < code <= len(GENRES)]
+
+
+class GenreFilter(object):
+  """Genres to match, `all` (AND) or `any` (OR), plus an optional state."""
+
+  def __init__(self, genres=None, match='all', state=None):
+    self.codes = encode_genres(genres)
+    self.match = 'any' if match == 'any' else 'all'
+    self.state = state or None
+    self.unknown = bool(genres) and len(self.codes) < len(set(genres))
+
+  @classmethod
+  def from_args(cls, args):
+    return cls(args.getlist('genre'), args.get('match', 'all'), args.get('state'))
+
+  def __bool__(self):
+    return bool(self.codes or self.state or self.unknown)
+
+
+class GenreBitmapIndex(object):
+  """Per-genre and per-state bitmaps of entity ids, as Python ints.
+
+  The fallback for databases without array operators: AND/OR of genres and
+  the state restriction are single big-int operations.
+  """
+
+  def __init__(self, rows):
+    self.genres = {}
+    self.states = {}
+    for id, codes, state in rows:
+      bit = 1 << id
+      for code in codes or []:
+        self.genres[code] = self.genres.get(code, 0) | bit
+      if state:
+        self.states[state] = self.states.get(state, 0) | bit
+
+  def match(self, genre_filter):
+    bitmaps = [self.genres.get(code, 0) for code in genre_filter.codes]
+    if not bitmaps:
+      bitmap = -1
+    elif genre_filter.match == 'any':
+      bitmap = 0
+      for each in bitmaps:
+        bitmap |= each
+    else:
+      bitmap = bitmaps[0]
+      for each in bitmaps[1:]:
+        bitmap &= each
+    if genre_filter.state:
+      bitmap &= self.states.get(genre_filter.state, 0)
+    if bitmap == -1:
+      return None
+    return [i for i, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def bitmap_index(session, model):
+  """The GenreBitmapIndex of `model`, rebuilt once its table has changed.
+
+  Only databases without array operators use it. Each worker keeps its
+  own and checks the table_version first, so writes made by any worker
+  are seen on the next lookup.
+  """
+  version = table_version(session, model)
+  with _indexes_lock:
+    built = _indexes.get(model)
+    if built is None or built[0] != version:
+      built = _indexes[model] = (version, GenreBitmapIndex(session.query(model.id, model.genre_ids, model.state)))
+    return built[1]
+
+
+def invalidate_genre_index(model=None):
+  with _indexes_lock:
+    if model is None:
+      _indexes.clear()
+    else:
+      _indexes.pop(model, None)
+
+
+def genre_criterion(session, model, genre_filter):
+  """SQL criterion restricting `model` rows to `genre_filter`.
+
+  On Postgres the array operators @> (all) and && (any) are answered from
+  the GIN index on genre_ids; elsewhere the bitmap index yields the ids.
+  """
+  if genre_filter.unknown and (genre_filter.match == 'all' or not genre_filter.codes):
+    return model.id.in_([])
+  if session.get_bind().dialect.name == 'postgresql':
+    criteria = []
+    if genre_filter.codes:
+      if genre_filter.match == 'any':
+        criteria.append(model.genre_ids.overlap(genre_filter.codes))
+      else:
+        criteria.append(model.genre_ids.contains(genre_filter.codes))
+    if genre_filter.state:
+      criteria.append(model.state == genre_filter.state)
+    return and_(*criteria)
+  ids = bitmap_index(session, model).match(genre_filter)
+  if ids is None:
+    return model.id.isnot(None)
+  return id_criterion(model, ids)
+
+
+def id_criterion(model, ids):
+  """`model.id IN ids`; a long list goes as one JSON parameter, read back with json_each()."""
+  if len(ids) <= MAX_BOUND_IDS:
+    return model.id.in_(ids)
+  listed = func.json_each(json.dumps(ids)).table_valued('value')
+  return model.id.in_(select(listed.c.value))
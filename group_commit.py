@@ -0,0 +1,217 @@
+#----------------------------------------------------------------------------#
+# Group commit.
+#----------------------------------------------------------------------------#
+# With GROUP_COMMIT on, create handlers hand their inserts to a committer
+# thread instead of committing themselves. The committer runs the writes of
+# every request waiting at that moment in one transaction, so a burst of
+# posts pays for one commit (one fsync) per batch instead of one per
+# request; one failing write never takes the others of its batch down with
+# it (see GroupCommit.commit_batch).
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitMetrics(object):
+  """Batch sizes, commit latency and per-write latency of the committer."""
+
+  SAMPLES = 1024
+
+  def __init__(self):
+    self.batches = 0
+    self.writes = 0
+    self.failed = 0
+    self.retried_batches = 0
+    self.max_batch = 0
+    self._batch_sizes = deque(maxlen=self.SAMPLES)
+    self._commit_seconds = deque(maxlen=self.SAMPLES)
+    self._write_seconds = deque(maxlen=self.SAMPLES)
+    self._lock = threading.Lock()
+
+  def record(self, size, failed, commit_seconds, write_seconds):
+    with self._lock:
+      self.batches += 1
+      self.writes += size
+      self.failed += failed
+      self.max_batch = max(self.max_batch, size)
+      self._batch_sizes.append(size)
+      self._commit_seconds.append(commit_seconds)
+      self._write_seconds.extend(write_seconds)
+
+  def retried(self):
+    with self._lock:
+      self.retried_batches += 1
+
+  @staticmethod
+  def _percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else 0
+
+  def snapshot(self):
+    with self._lock:
+      sizes = sorted(self._batch_sizes)
+      commits = sorted(self._commit_seconds)
+      writes = sorted(self._write_seconds)
+    return {
+      'batches': self.batches,
+      'writes': self.writes,
+      'failed': self.failed,
+      'retried_batches': self.retried_batches,
+      'batch_size_avg': round(sum(sizes) / float(len(sizes)), 2) if sizes else 0.0,
+      'batch_size_p95': self._percentile(sizes, 0.95),
+      'batch_size_max': self.max_batch,
+      'commit_ms_avg': round(sum(commits) * 1000 / len(commits), 3) if commits else 0.0,
+      'commit_ms_p95': round(self._percentile(commits, 0.95) * 1000, 3),
+      'write_ms_p50': round(self._percentile(writes, 0.5) * 1000, 3),
+      'write_ms_p95': round(self._percentile(writes, 0.95) * 1000, 3),
+    }
+
+
+class GroupCommit(object):
+  """Runs write(session) callables in committed transactions.
+
+  run() is the one entry point for handlers in both modes. Without
+  GROUP_COMMIT it runs the write on the request's session and commits.
+  With it, the write is queued and a background committer runs up to
+  GROUP_COMMIT_MAX_ITEMS queued writes per transaction, waiting at most
+  GROUP_COMMIT_MAX_WAIT_MS after the first for more to arrive; run()
+  returns once that transaction has committed. A write still queued after
+  GROUP_COMMIT_TIMEOUT is cancelled, never run, and run() raises
+  TimeoutError, so the client can safely retry. A write's result must not
+  be an ORM object, whose session is not the caller's: return ids.
+  """
+
+  def __init__(self, app=None):
+    self.metrics = GroupCommitMetrics()
+    self._thread = None
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.app = app
+    self.enabled = app.config.get('GROUP_COMMIT', False)
+    self.max_items = app.config.get('GROUP_COMMIT_MAX_ITEMS', 64)
+    self.max_wait = app.config.get('GROUP_COMMIT_MAX_WAIT_MS', 5) / 1000.0
+    self.timeout = app.config.get('GROUP_COMMIT_TIMEOUT', 30)
+    # A full queue blocks new writes until the committer catches up.
+    self.queue = queue.Queue(maxsize=app.config.get('GROUP_COMMIT_QUEUE_SIZE', 10000))
+    app.extensions['group_commit'] = self
+
+  def run(self, write):
+    """write(session)'s result once committed; its exception if it failed."""
+    if not self.enabled:
+      try:
+        result = write(db.session)
+        db.session.commit()
+      except Exception:
+        db.session.rollback()
+        raise
+      return result
+    self.start()
+    future = Future()
+    self.queue.put((write, future, time.perf_counter()))
+    try:
+      return future.result(timeout=self.timeout)
+    except TimeoutError:
+      # Still queued: the committer will skip it. Already in a transaction:
+      # giving up now would leave the caller unaware of a committed write.
+      if future.cancel():
+        raise
+      return future.result()
+
+  def start(self):
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+  def _next_batch(self):
+    # set_running_or_notify_cancel() drops the writes run() gave up on,
+    # and makes the others impossible to cancel from then on.
+    batch = []
+    while not batch:
+      item = self.queue.get()
+      if item[1].set_running_or_notify_cancel():
+        batch.append(item)
+    deadline = time.perf_counter() + self.max_wait
+    while len(batch) < self.max_items:
+      remaining = deadline - time.perf_counter()
+      try:
+        item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+      except queue.Empty:
+        break
+      if item[1].set_running_or_notify_cancel():
+        batch.append(item)
+    return batch
+
+  def _run(self):
+    with self.app.app_context():
+      while True:
+        batch = self._next_batch()
+        try:
+          self.commit_batch(batch)
+        except Exception as e:
+          logger.exception('group commit of %d writes failed', len(batch))
+          for write, future, queued in batch:
+            if not future.done():
+              future.set_exception(e)
+        finally:
+          db.session.remove()
+
+  def commit_batch(self, batch):
+    """Run a batch of (write, future, queued at) in one transaction and settle the futures.
+
+    Writes run back to back first. If one raises, the batch is rolled back
+    and run again with a savepoint around each write, so only the failing
+    ones are dropped; if the commit itself fails, each write is committed
+    on its own.
+    """
+    began = time.perf_counter()
+    try:
+      outcomes = self._apply(batch, savepoints=False)
+    except Exception as e:
+      db.session.rollback()
+      if len(batch) == 1:
+        outcomes = [(batch[0][1], None, e)]
+      else:
+        self.metrics.retried()
+        try:
+          outcomes = self._apply(batch, savepoints=True)
+        except Exception:
+          db.session.rollback()
+          for item in batch:
+            self.commit_batch([item])
+          return
+    done = time.perf_counter()
+    self.metrics.record(len(batch), sum(1 for future, result, error in outcomes if error is not None),
+                        done - began, [done - queued for write, future, queued in batch])
+    for future, result, error in outcomes:
+      if error is None:
+        future.set_result(result)
+      else:
+        future.set_exception(error)
+
+  def _apply(self, batch, savepoints):
+    session = db.session
+    outcomes = []
+    for write, future, queued in batch:
+      if not savepoints:
+        outcomes.append((future, write(session), None))
+        continue
+      try:
+        with session.begin_nested():
+          outcomes.append((future, write(session), None))
+      except Exception as e:
+        outcomes.append((future, None, e))
+    session.commit()
+    return outcomes
+
+  def stats(self):
+    return dict(self.metrics.snapshot(), enabled=self.enabled, queued=self.queue.qsize())
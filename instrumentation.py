@@ -0,0 +1,201 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#----------------------------------------------------------------------------#
+import heapq
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('sql_profile')
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN \((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def statement_shape(statement):
+  """Statement text with literals and IN lists folded, for grouping repeats."""
+  shape = _WHITESPACE.sub(' ', statement).strip()
+  shape = _IN_LIST.sub('IN (...)', shape)
+  return _LITERAL.sub('?', shape)
+
+
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+
+class RequestProfile(object):
+  """Statements run while serving one request."""
+
+  def __init__(self, slowest=5):
+    self.started = time.perf_counter()
+    self.count = 0
+    self.seconds = 0.0
+    self.shapes = Counter()
+    self.budget = None
+    self._slowest = []
+    self._keep = slowest
+
+  def record(self, statement, seconds):
+    self.count += 1
+    self.seconds += seconds
+    self.shapes[statement_shape(statement)] += 1
+    entry = (seconds, self.count, statement)
+    if len(self._slowest) < self._keep:
+      heapq.heappush(self._slowest, entry)
+    elif entry > self._slowest[0]:
+      heapq.heapreplace(self._slowest, entry)
+
+  @property
+  def slowest(self):
+    return [(seconds, statement) for seconds, n, statement in sorted(self._slowest, reverse=True)]
+
+  def repeated(self, threshold):
+    """Shapes run at least `threshold` times: N+1 candidates such as a lazy
+    relationship load per row of a listing."""
+    return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class EndpointTotals(object):
+
+  def __init__(self):
+    self.requests = 0
+    self.queries = 0
+    self.sql_seconds = 0.0
+    self.max_queries = 0
+    self.n_plus_one = 0
+    self.budget = None
+
+  def snapshot(self):
+    return {
+      'requests': self.requests,
+      'queries': self.queries,
+      'queries_per_request': round(self.queries / self.requests, 2) if self.requests else 0,
+      'max_queries': self.max_queries,
+      'sql_ms': round(self.sql_seconds * 1000, 1),
+      'n_plus_one': self.n_plus_one,
+      'budget': self.budget,
+    }
+
+
+def query_budget(limit):
+  """Declare the most queries a view may run for one request."""
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      profile = g.get('sql_profile')
+      if profile is not None:
+        profile.budget = limit
+      return view(*args, **kwargs)
+    wrapper.query_budget = limit
+    return wrapper
+  return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('sql_profile_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  starts = conn.info.get('sql_profile_start')
+  if not starts:
+    return
+  seconds = time.perf_counter() - starts.pop()
+  if has_request_context():
+    profile = g.get('sql_profile')
+    if profile is not None:
+      profile.record(statement, seconds)
+
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def _listen():
+  # On the Engine class, so every engine and bind is covered; statements
+  # outside a profiled request (CLI, background threads) are ignored.
+  global _listening
+  with _listening_lock:
+    if not _listening:
+      event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+      event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+      _listening = True
+
+
+class SqlProfiler(object):
+  """Counts and times the SQL of every request.
+
+  Adds a Server-Timing header, logs a sample of slow requests with their
+  slowest statements, warns about repeated statement shapes (N+1), and
+  with SQL_ENFORCE_BUDGETS raises QueryBudgetExceeded when a view runs
+  more queries than its @query_budget.
+  """
+
+  def __init__(self, app=None):
+    self.totals = {}
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.enabled = app.config.get('SQL_PROFILE', True)
+    self.slow_ms = app.config.get('SLOW_REQUEST_MS', 500)
+    self.sample = app.config.get('SLOW_LOG_SAMPLE', 1.0)
+    self.threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+    self.slowest = app.config.get('SLOWEST_STATEMENTS', 5)
+    app.extensions['sql_profiler'] = self
+    if not self.enabled:
+      return
+    _listen()
+    app.before_request(self._start)
+    app.after_request(self._finish)
+
+  def _start(self):
+    g.sql_profile = RequestProfile(slowest=self.slowest)
+
+  def _finish(self, response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+      return response
+    elapsed = time.perf_counter() - profile.started
+    endpoint = request.endpoint or request.path
+    budget = profile.budget
+    repeated = profile.repeated(self.threshold)
+
+    with self._lock:
+      totals = self.totals.setdefault(endpoint, EndpointTotals())
+      totals.requests += 1
+      totals.queries += profile.count
+      totals.sql_seconds += profile.seconds
+      totals.max_queries = max(totals.max_queries, profile.count)
+      totals.n_plus_one += bool(repeated)
+      totals.budget = budget
+
+    response.headers.add('Server-Timing', 'sql;dur={:.1f};desc="{} queries"'.format(profile.seconds * 1000, profile.count))
+    response.headers.add('Server-Timing', 'app;dur={:.1f}'.format(elapsed * 1000))
+
+    for shape, n in repeated:
+      logger.warning('possible N+1 in %s: %d x %s', endpoint, n, shape)
+    if elapsed * 1000 >= self.slow_ms and random.random() < self.sample:
+      logger.info('slow request %s %s: %.1f ms, %d queries, %.1f ms SQL; slowest: %s',
+                  request.method, request.full_path, elapsed * 1000, profile.count, profile.seconds * 1000,
+                  ' | '.join('{:.1f} ms {}'.format(s * 1000, statement_shape(sql)) for s, sql in profile.slowest))
+    if budget is not None and profile.count > budget:
+      message = '{} ran {} queries, over its budget of {}'.format(endpoint, profile.count, budget)
+      if current_app.config.get('SQL_ENFORCE_BUDGETS', current_app.testing):
+        raise QueryBudgetExceeded(message)
+      logger.warning(message)
+    return response
+
+  def stats(self):
+    with self._lock:
+      return dict((endpoint, totals.snapshot())
+                  for endpoint, totals in sorted(self.totals.items()))
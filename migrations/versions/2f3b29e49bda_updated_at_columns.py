@@ -0,0 +1,30 @@
+"""updated_at columns for incremental exports
+
+Revision ID: 2f3b29e49bda
+Revises: f231f1a79f25
+Create Date: 2026-10-18 13:05:12.550871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f3b29e49bda'
+down_revision = 'f231f1a79f25'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venues', 'Artists', 'Shows')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        op.create_index('ix_{}_updated_at'.format(table), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,64 @@
+"""show end time and overlap constraints
+
+Revision ID: 5e0c3a9b7d12
+Revises: 8d41b7c2e06f
+Create Date: 2026-10-18 21:14:37.509128
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c3a9b7d12'
+down_revision = '8d41b7c2e06f'
+branch_labels = None
+depends_on = None
+
+# models.DEFAULT_SHOW_LENGTH, for the shows that already exist.
+DEFAULT_HOURS = 3
+
+OVERLAP = (
+    'SELECT 1 FROM "Shows" s JOIN "Shows" later ON later.{fk} = s.{fk}'
+    ' AND later.start_time >= s.start_time AND later.start_time < s.end_time'
+    ' AND (later.start_time > s.start_time OR later.id > s.id) LIMIT 1'
+)
+
+# As raw DDL: create_exclude_constraint() can't take the tsrange() expression.
+EXCLUDE = (
+    'ALTER TABLE "Shows" ADD CONSTRAINT {name} EXCLUDE USING gist'
+    ' ({fk} WITH =, tsrange(start_time, end_time) WITH &&)'
+)
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    op.add_column('Shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    if postgresql:
+        op.execute("UPDATE \"Shows\" SET end_time = start_time + interval '{} hours'".format(DEFAULT_HOURS))
+    else:
+        # Same text format as start_time (SQLAlchemy's, with microseconds), so the two compare as strings.
+        op.execute("UPDATE \"Shows\" SET end_time = strftime('%Y-%m-%d %H:%M:%S', start_time, '+{} hours')"
+                   " || substr(start_time, 20)".format(DEFAULT_HOURS))
+    with op.batch_alter_table('Shows') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+    if not postgresql:
+        return
+
+    op.create_check_constraint('ck_shows_length', 'Shows',
+                               "end_time > start_time AND end_time <= start_time + interval '24 hours'")
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for fk in ('venue_id', 'artist_id'):
+        if op.get_bind().execute(sa.text(OVERLAP.format(fk=fk))).first():
+            raise RuntimeError('Shows double-booked on {}; list them with `flask check-bookings` '
+                               'and reschedule them before upgrading'.format(fk))
+    for name, fk in (('ex_shows_venue_overlap', 'venue_id'), ('ex_shows_artist_overlap', 'artist_id')):
+        op.execute(EXCLUDE.format(name=name, fk=fk))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('ex_shows_artist_overlap', 'Shows')
+        op.drop_constraint('ex_shows_venue_overlap', 'Shows')
+        op.drop_constraint('ck_shows_length', 'Shows', type_='check')
+    op.drop_column('Shows', 'end_time')
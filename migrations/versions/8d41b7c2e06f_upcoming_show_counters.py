@@ -0,0 +1,41 @@
+"""upcoming show counters on venues and artists
+
+Revision ID: 8d41b7c2e06f
+Revises: cf27e530908e
+Create Date: 2026-10-18 16:05:12.447310
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7c2e06f'
+down_revision = 'cf27e530908e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same clock as the app (naive local time); the rollover thread and
+    # `flask check-counters --fix` keep the counts current from here on.
+    now = datetime.now()
+    for table, fk in (('Venues', 'venue_id'), ('Artists', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.execute(sa.text(
+            'UPDATE "{table}" SET '
+            '  upcoming_show_count = (SELECT count(*) FROM "Shows"'
+            '    WHERE "Shows".{fk} = "{table}".id AND "Shows".start_time > :now),'
+            '  next_show_at = (SELECT min(start_time) FROM "Shows"'
+            '    WHERE "Shows".{fk} = "{table}".id AND "Shows".start_time > :now)'
+            .format(table=table, fk=fk)
+        ).bindparams(now=now))
+
+
+def downgrade():
+    for table in ('Artists', 'Venues'):
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'upcoming_show_count')
@@ -0,0 +1,27 @@
+"""name listing indexes
+
+Revision ID: b7e2d94c1a38
+Revises: 5e0c3a9b7d12
+Create Date: 2026-10-18 23:02:41.371846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d94c1a38'
+down_revision = '5e0c3a9b7d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # directory.name_key(): the keyset order of /artists and the name-ordered venue listing.
+    op.create_index('ix_venues_name_id', 'Venues', [sa.text("coalesce(name, '')"), 'id'], unique=False)
+    op.create_index('ix_artists_name_id', 'Artists', [sa.text("coalesce(name, '')"), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_id', table_name='Artists')
+    op.drop_index('ix_venues_name_id', table_name='Venues')
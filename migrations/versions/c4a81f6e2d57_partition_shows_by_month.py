@@ -0,0 +1,157 @@
+"""partition shows by month
+
+Revision ID: c4a81f6e2d57
+Revises: b7e2d94c1a38
+Create Date: 2026-10-19 00:41:09.226315
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a81f6e2d57'
+down_revision = 'b7e2d94c1a38'
+branch_labels = None
+depends_on = None
+
+# Partitions created past the current month; show_partitions.py keeps
+# config.SHOW_PARTITIONS_AHEAD months ahead from then on.
+MONTHS_AHEAD = 12
+
+CREATE_TABLE = (
+    'CREATE TABLE "Shows" ('
+    ' id integer NOT NULL DEFAULT nextval(\'"Shows_id_seq"\'),'
+    ' artist_id integer NOT NULL CONSTRAINT "Shows_artist_id_fkey" REFERENCES "Artists" (id),'
+    ' venue_id integer NOT NULL CONSTRAINT "Shows_venue_id_fkey" REFERENCES "Venues" (id),'
+    ' start_time timestamp without time zone NOT NULL,'
+    ' end_time timestamp without time zone NOT NULL,'
+    ' updated_at timestamp without time zone NOT NULL DEFAULT now(),'
+    ' CONSTRAINT "Shows_pkey" PRIMARY KEY ({primary_key}),'
+    " CONSTRAINT ck_shows_length CHECK (end_time > start_time AND end_time <= start_time + interval '24 hours')"
+    '){partitioning}'
+)
+
+COPY_ROWS = (
+    'INSERT INTO "Shows" (id, artist_id, venue_id, start_time, end_time, updated_at)'
+    ' SELECT id, artist_id, venue_id, start_time, end_time, updated_at FROM "{}"'
+)
+
+INDEXES = (
+    ('ix_shows_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_shows_start_time_id', ['start_time', 'id']),
+    ('ix_Shows_updated_at', ['updated_at']),
+)
+
+EXCLUDE = (
+    'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" EXCLUDE USING gist'
+    ' ({column} WITH =, tsrange(start_time, end_time) WITH &&)'
+)
+EXCLUSIONS = (
+    ('ex_shows_venue_overlap', 'venue_overlap', 'venue_id'),
+    ('ex_shows_artist_overlap', 'artist_overlap', 'artist_id'),
+)
+
+# The per-partition exclusions can't see a show of the neighbouring month.
+# Only a show that runs past the end of its month, or starts within 24
+# hours (the longest show) of its start, can overlap one there; this
+# trigger checks those against the whole table. The advisory locks, per
+# venue and per artist, make a second such booking wait for the first to
+# commit, and the check's fresh READ COMMITTED snapshot then sees it.
+BOUNDARY_CHECK = """
+CREATE FUNCTION shows_month_boundary_check() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    month timestamp := date_trunc('month', NEW.start_time);
+BEGIN
+    IF NEW.start_time >= month + interval '24 hours' AND NEW.end_time <= month + interval '1 month' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_advisory_xact_lock(1, NEW.venue_id);
+    PERFORM pg_advisory_xact_lock(2, NEW.artist_id);
+    IF EXISTS (
+        SELECT 1 FROM "Shows"
+        WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id) AND id <> NEW.id
+          AND start_time > NEW.start_time - interval '24 hours' AND start_time < NEW.end_time
+          AND end_time > NEW.start_time AND date_trunc('month', start_time) <> month
+    ) THEN
+        RAISE EXCEPTION 'show % overlaps a show of the same venue or artist in another month', NEW.id
+            USING ERRCODE = 'exclusion_violation';
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+BOUNDARY_TRIGGER = (
+    'CREATE TRIGGER shows_month_boundary AFTER INSERT OR UPDATE OF venue_id, artist_id, start_time, end_time'
+    ' ON "Shows" FOR EACH ROW EXECUTE FUNCTION shows_month_boundary_check()'
+)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def set_aside(name):
+    """Rename Shows to `name`, freeing its index and constraint names."""
+    op.execute('ALTER TABLE "Shows" RENAME TO "{}"'.format(name))
+    op.execute('ALTER TABLE "{0}" RENAME CONSTRAINT "Shows_pkey" TO "{0}_pkey"'.format(name))
+    for index, columns in INDEXES:
+        op.drop_index(index, table_name=name)
+    op.execute('ALTER SEQUENCE "Shows_id_seq" OWNED BY NONE')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    set_aside('Shows_unpartitioned')
+    for constraint, suffix, column in EXCLUSIONS:
+        op.drop_constraint(constraint, 'Shows_unpartitioned')
+    op.execute(CREATE_TABLE.format(primary_key='id, start_time', partitioning=' PARTITION BY RANGE (start_time)'))
+    op.execute('ALTER SEQUENCE "Shows_id_seq" OWNED BY "Shows".id')
+
+    # A month per partition, from the first show's to MONTHS_AHEAD months
+    # from now; later shows go to the default partition until their month
+    # gets one.
+    first = bind.execute(sa.text('SELECT min(start_time) FROM "Shows_unpartitioned"')).scalar() or datetime.now()
+    month, last = datetime(first.year, first.month, 1), add_months(datetime.now(), MONTHS_AHEAD)
+    partitions = ['Shows_default']
+    op.execute('CREATE TABLE "Shows_default" PARTITION OF "Shows" DEFAULT')
+    while month <= last:
+        name = 'Shows_{:%Y_%m}'.format(month)
+        op.execute("CREATE TABLE \"{}\" PARTITION OF \"Shows\" FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(
+            name, month, add_months(month, 1)))
+        partitions.append(name)
+        month = add_months(month, 1)
+
+    op.execute(COPY_ROWS.format('Shows_unpartitioned'))
+    op.drop_table('Shows_unpartitioned')
+    for index, columns in INDEXES:
+        op.create_index(index, 'Shows', columns, unique=False)
+    # Exclusion constraints can't span partitions: one pair per partition.
+    for name in partitions:
+        for constraint, suffix, column in EXCLUSIONS:
+            op.execute(EXCLUDE.format(table=name, name='{}_{}'.format(name, suffix), column=column))
+    # Partitions created later inherit the trigger.
+    op.execute(BOUNDARY_CHECK)
+    op.execute(BOUNDARY_TRIGGER)
+    op.execute('ANALYZE "Shows"')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    set_aside('Shows_partitioned')
+    op.execute(CREATE_TABLE.format(primary_key='id', partitioning=''))
+    op.execute('ALTER SEQUENCE "Shows_id_seq" OWNED BY "Shows".id')
+    op.execute(COPY_ROWS.format('Shows_partitioned'))
+    op.drop_table('Shows_partitioned')
+    op.execute('DROP FUNCTION shows_month_boundary_check()')
+    for index, columns in INDEXES:
+        op.create_index(index, 'Shows', columns, unique=False)
+    for constraint, suffix, column in EXCLUSIONS:
+        op.execute(EXCLUDE.format(table='Shows', name=constraint, column=column))
@@ -0,0 +1,33 @@
+"""trigram name search
+
+Revision ID: ca386145b441
+Revises: ea2a0388a505
+Create Date: 2026-10-18 09:40:03.118210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ca386145b441'
+down_revision = 'ea2a0388a505'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venues_name_trgm', 'Venues', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'Artists', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_artists_name_trgm', table_name='Artists')
+    op.drop_index('ix_venues_name_trgm', table_name='Venues')
@@ -0,0 +1,53 @@
+"""genre codes with GIN indexes
+
+Revision ID: cf27e530908e
+Revises: 2f3b29e49bda
+Create Date: 2026-10-18 14:32:40.018843
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'cf27e530908e'
+down_revision = '2f3b29e49bda'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of genres.GENRES at the time of this migration; a
+# genre's code is its position in this list plus one.
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Other',
+]
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    genre_ids = postgresql.ARRAY(sa.SmallInteger()) if postgres else sa.JSON()
+    default = '{}' if postgres else '[]'
+    op.add_column('Venues', sa.Column('genre_ids', genre_ids, server_default=default, nullable=False))
+    op.add_column('Artists', sa.Column('genre_ids', genre_ids, server_default=default, nullable=False))
+
+    if postgres:
+        op.execute(sa.text(
+            'UPDATE "Artists" SET genre_ids = ARRAY('
+            '  SELECT DISTINCT array_position(CAST(:genres AS text[]), genre)::smallint'
+            '  FROM unnest(genres) AS genre'
+            '  WHERE array_position(CAST(:genres AS text[]), genre) IS NOT NULL'
+            '  ORDER BY 1)'
+        ).bindparams(genres=GENRES))
+        op.create_index('ix_venues_genre_ids', 'Venues', ['genre_ids'], unique=False, postgresql_using='gin')
+        op.create_index('ix_artists_genre_ids', 'Artists', ['genre_ids'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_artists_genre_ids', table_name='Artists')
+        op.drop_index('ix_venues_genre_ids', table_name='Venues')
+    op.drop_column('Artists', 'genre_ids')
+    op.drop_column('Venues', 'genre_ids')
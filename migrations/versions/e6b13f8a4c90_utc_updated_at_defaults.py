@@ -0,0 +1,34 @@
+"""utc updated_at defaults
+
+Revision ID: e6b13f8a4c90
+Revises: c4a81f6e2d57
+Create Date: 2026-10-19 02:14:37.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b13f8a4c90'
+down_revision = 'c4a81f6e2d57'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venues', 'Artists', 'Shows')
+
+
+def upgrade():
+    # now() is the session's local time once stored in a timestamp
+    # without time zone; the ORM writes UTC. SQLite's default is UTC already.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.alter_column(table, 'updated_at', server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.alter_column(table, 'updated_at', server_default=sa.func.now())
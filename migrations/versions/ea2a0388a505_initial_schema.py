@@ -0,0 +1,62 @@
+"""initial schema
+
+Revision ID: ea2a0388a505
+Revises: 
+Create Date: 2026-10-18 09:12:41.372118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'ea2a0388a505'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Venues',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('address', sa.String(length=120), nullable=True),
+    sa.Column('phone', sa.String(length=120), nullable=True),
+    sa.Column('image_link', sa.String(length=500), nullable=True),
+    sa.Column('facebook_link', sa.String(length=120), nullable=True),
+    sa.Column('venue_web_url', sa.String(length=120), nullable=True),
+    sa.Column('talent_description', sa.String(length=255), nullable=True),
+    sa.Column('seeking_talent', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Artists',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('phone', sa.String(length=120), nullable=True),
+    sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=False),
+    sa.Column('image_link', sa.String(length=500), nullable=True),
+    sa.Column('facebook_link', sa.String(length=120), nullable=True),
+    sa.Column('artist_web_url', sa.String(length=120), nullable=True),
+    sa.Column('artist_talent_description', sa.String(length=255), nullable=True),
+    sa.Column('artist_seeking_talent', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Shows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artists.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venues.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('Shows')
+    op.drop_table('Artists')
+    op.drop_table('Venues')
@@ -0,0 +1,30 @@
+"""show and venue indexes
+
+Revision ID: f231f1a79f25
+Revises: ca386145b441
+Create Date: 2026-10-18 10:21:56.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f231f1a79f25'
+down_revision = 'ca386145b441'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'Shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'Shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'Shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venues_state_city', 'Venues', ['state', 'city', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_state_city', table_name='Venues')
+    op.drop_index('ix_shows_start_time_id', table_name='Shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='Shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='Shows')
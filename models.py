@@ -1,13 +1,59 @@
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Genre codes (see genres.py) as a small-int array; GIN-indexed on Postgres,
+# stored as a JSON list elsewhere.
+GenreIds = db.ARRAY(db.SmallInteger).with_variant(db.JSON(), 'sqlite')
+# Artists' genre names, likewise.
+GenreNames = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
+
+
+class utcnow(FunctionElement):
+  """The database's current time in UTC, naive like datetime.utcnow().
+
+  updated_at's server default: rows written around the ORM, such as by
+  COPY in bulk_import.py, must carry the same clock as the ORM's rows.
+  """
+  type = db.DateTime()
+  inherit_cache = True
+
 
-db = SQLAlchemy()
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+  # SQLite's CURRENT_TIMESTAMP is UTC.
+  return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+  return "timezone('utc', now())"
+
+
+# A show without an end time runs this long; none runs longer than the
+# maximum, which bounds how far back an overlapping show can start.
+DEFAULT_SHOW_LENGTH = timedelta(hours=3)
+MAX_SHOW_LENGTH = timedelta(hours=24)
 
 
 class Venue(db.Model):
   __tablename__ = 'Venues'
+  __table_args__ = (
+    db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_venues_state_city', 'state', 'city', 'id'),
+    db.Index('ix_venues_genre_ids', 'genre_ids', postgresql_using='gin'),
+    db.Index('ix_venues_name_id', db.text("coalesce(name, '')"), 'id'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String)
   city = db.Column(db.String(120))
@@ -19,36 +65,63 @@ class Venue(db.Model):
   venue_web_url = db.Column(db.String(120))
   talent_description = db.Column(db.String(255))
   seeking_talent = db.Column(db.Boolean, default=False)
+  genre_ids = db.Column(GenreIds, nullable=False, default=list)
+  upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  next_show_at = db.Column(db.DateTime)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utcnow(), index=True)
   shows = db.relationship("Show", backref="Venue", lazy=True)
 
 class Artist(db.Model):
   __tablename__ = 'Artists'
+  __table_args__ = (
+    db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_artists_genre_ids', 'genre_ids', postgresql_using='gin'),
+    db.Index('ix_artists_name_id', db.text("coalesce(name, '')"), 'id'),
+  )
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String)
   city = db.Column(db.String(120))
   state = db.Column(db.String(120))
   phone = db.Column(db.String(120))
-  genres = db.Column("genres", db.ARRAY(db.String()), nullable=False)
+  genres = db.Column("genres", GenreNames, nullable=False)
+  genre_ids = db.Column(GenreIds, nullable=False, default=list)
   image_link = db.Column(db.String(500))
   facebook_link = db.Column(db.String(120))
   artist_web_url = db.Column(db.String(120))
   artist_talent_description = db.Column(db.String(255))
   artist_seeking_talent = db.Column(db.Boolean, default=False)
+  upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  next_show_at = db.Column(db.DateTime)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utcnow(), index=True)
 
 
+def _default_end_time(context):
+  return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_LENGTH
+
+
+# On Postgres, migration c4a81f6e2d57 partitions Shows by month of
+# start_time, with the exclusion constraints below on each partition (see
+# show_partitions.py); db.create_all() and SQLite get this plain table.
 class Show(db.Model):
   __tablename__ = 'Shows'
+  __table_args__ = (
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    # Postgres refuses a booking that overlaps another show of the same
+    # venue or artist, whichever worker inserts it (see bookings.py). Once
+    # Shows is partitioned these hold within a month, and a trigger checks
+    # the shows near the turn of a month (see show_partitions.py).
+    db.CheckConstraint("end_time > start_time AND end_time <= start_time + interval '24 hours'",
+                       name='ck_shows_length').ddl_if(dialect='postgresql'),
+    ExcludeConstraint(('venue_id', '='), (db.func.tsrange(db.column('start_time'), db.column('end_time')), '&&'),
+                      name='ex_shows_venue_overlap', using='gist').ddl_if(dialect='postgresql'),
+    ExcludeConstraint(('artist_id', '='), (db.func.tsrange(db.column('start_time'), db.column('end_time')), '&&'),
+                      name='ex_shows_artist_overlap', using='gist').ddl_if(dialect='postgresql'),
+  )
   id = db.Column(db.Integer, primary_key=True)
-  artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
-  venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artists.id'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venues.id'), nullable=False)
   start_time = db.Column(db.DateTime, nullable=False)
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
-app.jinja_env.filters['datetime'] = format_datetime
+  end_time = db.Column(db.DateTime, nullable=False, default=_default_end_time)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utcnow(), index=True)
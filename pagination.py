@@ -0,0 +1,91 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+DEFAULT_PAGE_SIZE = 60
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+  pass
+
+
+def _encode_value(value):
+  if isinstance(value, datetime):
+    return {'dt': value.isoformat()}
+  return value
+
+
+def _decode_value(value):
+  if isinstance(value, dict) and 'dt' in value:
+    return datetime.fromisoformat(value['dt'])
+  return value
+
+
+def encode_cursor(values):
+  """Opaque, URL-safe token for a tuple of sort key values."""
+  raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+  return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, width):
+  try:
+    padded = token + '=' * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+  except (ValueError, TypeError):
+    raise InvalidCursor(token)
+  if not isinstance(values, list) or len(values) != width:
+    raise InvalidCursor(token)
+  return tuple(_decode_value(value) for value in values)
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+  try:
+    size = int(value)
+  except (TypeError, ValueError):
+    return default
+  return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, keys, key_of, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+  """Fetch one page of `query` ordered ascending by the `keys` columns.
+
+  `after`/`before` are cursors from a previous page; `key_of(row)` returns the
+  tuple of key values for a result row. One extra row is fetched to tell
+  whether there is a further page, so no COUNT(*) is ever issued.
+  """
+  if after and before:
+    raise InvalidCursor('after and before are mutually exclusive')
+  key = tuple_(*keys)
+  # The bound on the leading key is implied by the row comparison, but it
+  # is what lets SQLite seek an index rather than scan it.
+  if before:
+    values = decode_cursor(before, len(keys))
+    query = query.filter(keys[0] <= values[0], key < tuple_(*values))
+    query = query.order_by(*[column.desc() for column in keys])
+  else:
+    if after:
+      values = decode_cursor(after, len(keys))
+      query = query.filter(keys[0] >= values[0], key > tuple_(*values))
+    query = query.order_by(*keys)
+
+  rows = query.limit(limit + 1).all()
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  if before:
+    rows.reverse()
+
+  if not rows:
+    return Page([], None, None)
+  first, last = encode_cursor(key_of(rows[0])), encode_cursor(key_of(rows[-1]))
+  if before:
+    return Page(rows, last, first if has_more else None)
+  return Page(rows, last if has_more else None, first if after else None)
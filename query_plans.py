@@ -0,0 +1,175 @@
+#----------------------------------------------------------------------------#
+# Query plan regression checks.
+#----------------------------------------------------------------------------#
+import json
+import random
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, text
+
+from counters import recount_all
+from models import Venue, Artist, Show, DEFAULT_SHOW_LENGTH
+from show_partitions import partition_parent
+
+HotPath = namedtuple('HotPath', ['label', 'method', 'path', 'data', 'allow_seq_scan', 'postgres_only'])
+PlanResult = namedtuple('PlanResult', ['label', 'statement', 'scans', 'seq_scans'])
+
+TABLES = {Venue.__tablename__, Artist.__tablename__, Show.__tablename__}
+
+# The config switches of the background threads a worker starts; their
+# scans would be recorded and counted as the request's.
+BACKGROUND_JOBS = ('SHOW_ROLLOVER', 'SHOW_PARTITIONS', 'TYPEAHEAD_INDEX')
+
+
+@contextmanager
+def without_background_jobs(app):
+  """Keep the rollover, partition and typeahead threads from starting meanwhile."""
+  saved = dict((key, app.config.get(key)) for key in BACKGROUND_JOBS)
+  app.config.update(dict.fromkeys(BACKGROUND_JOBS, False))
+  try:
+    yield app
+  finally:
+    app.config.update(saved)
+
+
+@contextmanager
+def without_page_cache(app):
+  """Run every request uncached meanwhile, queries and all."""
+  page_cache = app.extensions['page_cache']
+  backend, page_cache.backend = page_cache.backend, None
+  try:
+    yield app
+  finally:
+    page_cache.backend = backend
+
+
+def hot_paths(session):
+  """Every read route in app.py, with sample ids taken from the database.
+
+  The venue directory lists every venue, so a full scan of Venues is
+  expected there; anything else, the keyset-paged listings of artists and
+  shows included, must use an index. The
+  search terms match a few of the seeded names: one that every name
+  contains is rightly read with a full scan.
+  """
+  venue_id = session.query(func.min(Venue.id)).scalar() or 1
+  artist_id = session.query(func.min(Artist.id)).scalar() or 1
+  return [
+    HotPath('venues', 'GET', '/venues', None, {'Venues'}, False),
+    HotPath('show venue', 'GET', '/venues/{}'.format(venue_id), None, set(), False),
+    HotPath('search venues', 'POST', '/venues/search', {'search_term': 'hall 1234'}, set(), True),
+    HotPath('artists', 'GET', '/artists', None, set(), False),
+    HotPath('show artist', 'GET', '/artists/{}'.format(artist_id), None, set(), False),
+    HotPath('search artists', 'POST', '/artists/search', {'search_term': 'band 1234'}, set(), True),
+    HotPath('shows', 'GET', '/shows', None, set(), False),
+    HotPath('show calendar', 'GET', '/shows?from={:%Y-%m-%d}'.format(datetime.now()), None, set(), False),
+  ]
+
+
+class StatementRecorder(object):
+  """Collects the statements an engine runs while active."""
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.statements = []
+
+  def _record(self, conn, cursor, statement, parameters, context, executemany):
+    if not executemany:
+      self.statements.append((statement, parameters))
+
+  def __enter__(self):
+    event.listen(self.engine, 'before_cursor_execute', self._record)
+    return self
+
+  def __exit__(self, *exc):
+    event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def _walk_postgres(plan):
+  yield plan
+  for child in plan.get('Plans', []):
+    for node in _walk_postgres(child):
+      yield node
+
+
+def explain(connection, statement, parameters):
+  """[(table, seq_scan)] for every table access in the statement's plan."""
+  if connection.dialect.name == 'postgresql':
+    raw = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+    return [
+      (node['Relation Name'], node['Node Type'] == 'Seq Scan')
+      for node in _walk_postgres(plan) if 'Relation Name' in node
+    ]
+  scans = []
+  for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+    words = row[-1].split()
+    if len(words) > 1 and words[0] in ('SCAN', 'SEARCH'):
+      scans.append((words[1], words[0] == 'SCAN' and 'USING' not in words))
+  return scans
+
+
+def check_plans(app, db):
+  """Drive each hot path through the test client and explain its queries."""
+  results = []
+  client = app.test_client()
+  with app.app_context():
+    engine = db.engine
+    paths = hot_paths(db.session)
+    db.session.remove()
+  postgres = engine.dialect.name == 'postgresql'
+  with without_background_jobs(app), without_page_cache(app):
+    for path in paths:
+      if path.postgres_only and not postgres:
+        continue
+      with StatementRecorder(engine) as recorder:
+        # Closed here, so a streamed page ends its request context in order.
+        with client.open(path.path, method=path.method, data=path.data) as response:
+          response.get_data()
+      with engine.connect() as connection:
+        for statement, parameters in recorder.statements:
+          # A partition of Shows counts as Shows.
+          scans = [(partition_parent(table), seq) for table, seq in explain(connection, statement, parameters)]
+          seq_scans = [table for table, seq in scans
+                       if seq and table in TABLES and table not in path.allow_seq_scan]
+          results.append(PlanResult(path.label, statement, scans, seq_scans))
+  return results
+
+
+def seed_plan_dataset(session, venues=20000, artists=20000, shows=200000, seed=0):
+  """Bulk-load enough rows that the planner prefers indexes where it can."""
+  rnd = random.Random(seed)
+  now = datetime.now()
+  session.bulk_insert_mappings(Venue, [{
+    'name': 'Venue Hall {}'.format(i),
+    'city': 'City {}'.format(i % 500),
+    'state': 'S{}'.format(i % 50),
+  } for i in range(venues)])
+  session.bulk_insert_mappings(Artist, [{
+    'name': 'Artist Band {}'.format(i),
+    'genres': ['Jazz'],
+  } for i in range(artists)])
+  session.flush()
+  first_venue = session.query(func.min(Venue.id)).scalar()
+  first_artist = session.query(func.min(Artist.id)).scalar()
+  # Three-hour slots, never two for one venue or artist, as the exclusion
+  # constraints of Shows require.
+  rows, venue_slots, artist_slots = [], set(), set()
+  while len(rows) < shows:
+    slot = rnd.randint(-8 * 730, 8 * 365)
+    venue_id = first_venue + rnd.randrange(venues)
+    artist_id = first_artist + rnd.randrange(artists)
+    if (venue_id, slot) in venue_slots or (artist_id, slot) in artist_slots:
+      continue
+    venue_slots.add((venue_id, slot))
+    artist_slots.add((artist_id, slot))
+    start = now + timedelta(hours=3 * slot)
+    rows.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start, 'end_time': start + DEFAULT_SHOW_LENGTH})
+  session.bulk_insert_mappings(Show, rows)
+  recount_all(session, now=now)
+  session.commit()
+  if session.get_bind().dialect.name == 'postgresql':
+    session.execute(text('ANALYZE'))
+    session.commit()
@@ -0,0 +1,308 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+# The replicas are SQLALCHEMY_BINDS listed in REPLICA_BINDS. SELECTs of a
+# GET request (or of a view marked @replica_reads) go to one healthy
+# replica, picked round robin per request; everything else -- writes,
+# POST handlers, CLI commands, background threads -- uses the primary.
+#
+# Read-your-writes: a request that wrote leaves a cookie pinning that
+# client's reads to the primary for REPLICA_STICKY_SECONDS, which should
+# exceed the replication lag REPLICA_MAX_LAG_SECONDS tolerates. A replica
+# whose connection fails, whose probe fails, or that lags by more than
+# that is ejected for REPLICA_EJECT_SECONDS, then probed again.
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+from database import pool_status
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(['GET', 'HEAD'])
+
+# Seconds a Postgres standby is behind, 0 when it has replayed all it received.
+POSTGRES_LAG = text(
+  'SELECT CASE WHEN pg_last_wal_receive_lsn() IS NULL'
+  ' OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0'
+  ' ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+# A query error that is the query's fault, not the replica's: statement
+# timeout (query_canceled).
+QUERY_CANCELED = '57014'
+
+_UNROUTED = object()
+
+
+class RoutingSession(Session):
+  """db.session; sends a request's SELECTs where Replicas.read_bind() says."""
+
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    if bind is None and has_request_context():
+      replicas = current_app.extensions.get('replicas')
+      if replicas is not None:
+        if self._flushing or isinstance(clause, UpdateBase):
+          replicas.wrote()
+        elif isinstance(clause, Select):
+          key = replicas.read_bind()
+          if key is not None:
+            return self._db.engines[key]
+    return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(view):
+  """Lets a POST view that only reads, such as a search form, read from a replica."""
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    g.replica_reads = True
+    return view(*args, **kwargs)
+  return wrapper
+
+
+class Replicas(object):
+  """Replica routing, read-your-writes pinning and replica health."""
+
+  def __init__(self, app=None):
+    self._thread = None
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.app = app
+    self.keys = list(app.config.get('REPLICA_BINDS') or ())
+    self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 15)
+    self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 10)
+    self.check_interval = app.config.get('REPLICA_CHECK_SECONDS', 2)
+    self.eject_seconds = app.config.get('REPLICA_EJECT_SECONDS', 30)
+    self.cookie = app.config.get('REPLICA_STICKY_COOKIE', 'read_primary_until')
+    self.state = dict((key, {'healthy': True, 'ejected_until': 0.0, 'lag': None, 'ejections': 0,
+                             'last_error': None}) for key in self.keys)
+    self._healthy = tuple(self.keys)
+    self._turn = itertools.count()
+    self.routed = Counter()
+    # db.init_app() has created the app's engines by now.
+    with app.app_context():
+      engines = app.extensions['sqlalchemy'].engines
+      self._engines = dict((key, engines[key]) for key in self.keys)
+    app.extensions['replicas'] = self
+    if self.keys:
+      app.before_request(self._before_request)
+      app.after_request(self._after_request)
+
+  def _before_request(self):
+    self.start()
+    # The page cache must not answer a pinned client from pages a replica
+    # rendered before its write reached it.
+    g.read_primary = request.method in READ_METHODS and self.pinned()
+
+  def _after_request(self, response):
+    if g.get('wrote') or (request.method not in READ_METHODS and not g.get('replica_reads')):
+      until = time.time() + self.sticky_seconds
+      response.set_cookie(self.cookie, '{:.3f}'.format(until), max_age=int(self.sticky_seconds) + 1,
+                          httponly=True, samesite='Lax')
+    return response
+
+  def pinned(self):
+    """True while this client's own recent write may not have reached the replicas."""
+    try:
+      return float(request.cookies.get(self.cookie, 0)) > time.time()
+    except ValueError:
+      return False
+
+  def read_bind(self):
+    """Bind key of the replica the current request reads from; None for the primary."""
+    key = g.get('read_bind', _UNROUTED)
+    if key is _UNROUTED:
+      key = g.read_bind = self._route()
+    return key
+
+  def _route(self):
+    if not self.keys or (request.method not in READ_METHODS and not g.get('replica_reads')):
+      return None
+    if g.get('wrote') or self.pinned():
+      self._count('pinned')
+      return None
+    healthy = self._healthy
+    if not healthy:
+      self._count('no replica')
+      return None
+    key = healthy[next(self._turn) % len(healthy)]
+    self._count(key)
+    # A replica's page is at most max_lag behind; don't keep it for longer.
+    g.cache_ttl = self.max_lag
+    return key
+
+  def _count(self, route):
+    with self._lock:
+      self.routed[route] += 1
+
+  def wrote(self):
+    """Called before the request writes: its later reads must see the write."""
+    g.wrote = True
+    g.read_bind = None
+
+  def engines(self):
+    return dict(self._engines)
+
+  def start(self):
+    with self._lock:
+      if self._thread is not None:
+        return
+      for key, engine in self.engines().items():
+        self.watch(key, engine)
+      self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+      self._thread.start()
+
+  def watch(self, key, engine):
+    """Eject replica `key` on connection errors of `engine` as well."""
+    event.listen(engine, 'handle_error', self._error_handler(key))
+
+  def _error_handler(self, key):
+    def handle_error(context):
+      error = context.original_exception
+      if getattr(error, 'sqlstate', None) == QUERY_CANCELED or getattr(error, 'pgcode', None) == QUERY_CANCELED:
+        return
+      if context.is_disconnect or isinstance(context.sqlalchemy_exception, (exc.OperationalError, exc.InterfaceError)):
+        self.eject(key, error)
+    return handle_error
+
+  def eject(self, key, error):
+    with self._lock:
+      state = self.state[key]
+      if state['healthy']:
+        logger.warning('replica %s ejected: %s', key, error)
+        state['ejections'] += 1
+      state.update(healthy=False, ejected_until=time.monotonic() + self.eject_seconds, last_error=str(error))
+      self._healthy = tuple(k for k in self.keys if self.state[k]['healthy'])
+
+  def admit(self, key, lag):
+    with self._lock:
+      state = self.state[key]
+      if not state['healthy']:
+        logger.info('replica %s back in rotation', key)
+      state.update(healthy=True, lag=lag)
+      self._healthy = tuple(k for k in self.keys if self.state[k]['healthy'])
+
+  def _run(self):
+    with self.app.app_context():
+      while True:
+        try:
+          self.check()
+        except Exception:
+          logger.exception('replica health check failed')
+        time.sleep(self.check_interval)
+
+  def check(self):
+    """Probe every replica not serving out an ejection; eject or re-admit it."""
+    for key, engine in self.engines().items():
+      if not self.state[key]['healthy'] and time.monotonic() < self.state[key]['ejected_until']:
+        continue
+      try:
+        lag = replica_lag(engine)
+      except Exception as e:
+        self.eject(key, e)
+        continue
+      if lag > self.max_lag:
+        self.eject(key, 'lagging {:.1f}s behind'.format(lag))
+      else:
+        self.admit(key, lag)
+
+  def stats(self):
+    engines = self.engines()
+    with self._lock:
+      now = time.monotonic()
+      replicas = dict((key, {
+        'healthy': state['healthy'],
+        'ejected_for': 0.0 if state['healthy'] else round(max(state['ejected_until'] - now, 0.0), 1),
+        'ejections': state['ejections'],
+        'lag_seconds': state['lag'],
+        'last_error': state['last_error'],
+        'pool': pool_status(engines[key]),
+      }) for key, state in self.state.items())
+      return {'replicas': replicas, 'healthy': list(self._healthy), 'routed': dict(self.routed),
+              'sticky_seconds': self.sticky_seconds, 'max_lag_seconds': self.max_lag}
+
+
+def replica_lag(engine):
+  """Seconds `engine`'s database is behind its primary; raises when it can't serve reads."""
+  # The import is deferred: models imports this module for RoutingSession.
+  from models import Show
+  with engine.connect() as connection:
+    connection.execute(Show.__table__.select().limit(1)).first()
+    if connection.dialect.name == 'postgresql':
+      return float(connection.execute(POSTGRES_LAG).scalar() or 0)
+  return 0.0
+
+
+class SqliteReplicator(object):
+  """Stand-in for streaming replication between SQLite files, for local runs.
+
+  Every `interval` seconds the primary is snapshotted in memory; each
+  snapshot is copied over the replicas once it is `lag` seconds old, so
+  readers of a replica see the primary as it was `lag` (up to
+  lag + interval) seconds ago.
+  """
+
+  def __init__(self, primary, replicas, lag=1.0, interval=0.1):
+    self.primary = primary
+    self.replicas = list(replicas)
+    self.lag = lag
+    self.interval = interval
+    self.copies = 0
+    self._snapshots = deque()
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self):
+    self.copy(self._snapshot(), self.replicas)
+    self._thread = threading.Thread(target=self._run, name='sqlite-replicator', daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._stopped.set()
+    if self._thread is not None:
+      self._thread.join()
+
+  def _snapshot(self):
+    snapshot = sqlite3.connect(':memory:', check_same_thread=False)
+    source = sqlite3.connect(self.primary)
+    try:
+      source.backup(snapshot)
+    finally:
+      source.close()
+    return snapshot
+
+  def copy(self, snapshot, paths):
+    for path in paths:
+      target = sqlite3.connect(path, timeout=30)
+      try:
+        snapshot.backup(target)
+      finally:
+        target.close()
+    self.copies += 1
+
+  def _run(self):
+    while not self._stopped.wait(self.interval):
+      now = time.monotonic()
+      self._snapshots.append((now, self._snapshot()))
+      due = None
+      while self._snapshots and self._snapshots[0][0] <= now - self.lag:
+        due = self._snapshots.popleft()[1]
+      if due is not None:
+        try:
+          self.copy(due, list(self.replicas))
+        except sqlite3.Error:
+          logger.exception('replicating %s failed', self.primary)
@@ -0,0 +1,160 @@
+#----------------------------------------------------------------------------#
+# Name search.
+#----------------------------------------------------------------------------#
+import re
+import threading
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from database import table_version
+from models import Venue, Artist
+
+SearchPage = namedtuple('SearchPage', ['count', 'data'])
+
+DEFAULT_LIMIT = 50
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def trigrams(text):
+  """Trigram set of `text`, padded per word the way pg_trgm does it."""
+  grams = set()
+  for word in _WORD.findall(text.lower()):
+    padded = '  ' + word + ' '
+    for i in range(len(padded) - 2):
+      grams.add(padded[i:i + 3])
+  return grams
+
+
+def similarity(left, right):
+  if not left or not right:
+    return 0.0
+  return len(left & right) / float(len(left | right))
+
+
+def _escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class NgramIndex(object):
+  """In-process trigram index over (id, name) pairs.
+
+  Mirrors the pg_trgm backed search: candidates must contain every inner
+  trigram of the term, are confirmed with a case-insensitive substring test
+  (the ILIKE semantics) and are ranked by trigram similarity.
+  """
+
+  def __init__(self, rows):
+    self.names = {}
+    self.grams = {}
+    self.postings = {}
+    for id, name in rows:
+      self.add(id, name)
+
+  def add(self, id, name):
+    name = name or ''
+    self.names[id] = name
+    self.grams[id] = trigrams(name)
+    for gram in self.grams[id]:
+      self.postings.setdefault(gram, set()).add(id)
+
+  def _candidates(self, term):
+    inner = set()
+    for word in _WORD.findall(term.lower()):
+      for i in range(len(word) - 2):
+        inner.add(word[i:i + 3])
+    if not inner:
+      return self.names.keys()
+    postings = sorted((self.postings.get(gram, set()) for gram in inner), key=len)
+    return set.intersection(*postings)
+
+  def search(self, term, limit=DEFAULT_LIMIT, offset=0):
+    needle = term.lower()
+    term_grams = trigrams(term)
+    hits = [
+      (similarity(term_grams, self.grams[id]), self.names[id], id)
+      for id in self._candidates(term)
+      if needle in self.names[id].lower()
+    ]
+    hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+    return len(hits), [(id, name) for rank, name, id in hits[offset:offset + limit]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def ngram_index(session, model):
+  """The NgramIndex of `model`, rebuilt once its table has changed.
+
+  Only databases without pg_trgm use it. Each worker keeps its own, so
+  every lookup first reads the table_version, one aggregate over indexed
+  columns, and writes made by any worker are seen on the next search.
+  """
+  version = table_version(session, model)
+  with _indexes_lock:
+    built = _indexes.get(model)
+    if built is None or built[0] != version:
+      built = _indexes[model] = (version, NgramIndex(session.query(model.id, model.name)))
+    return built[1]
+
+
+def invalidate_search_index(model=None):
+  """Drop this worker's index for `model` (or all) after a write."""
+  with _indexes_lock:
+    if model is None:
+      _indexes.clear()
+    else:
+      _indexes.pop(model, None)
+
+
+def _postgres_search(session, model, term, limit, offset):
+  matches = model.name.ilike('%' + _escape_like(term) + '%', escape='\\')
+  rank = func.similarity(model.name, term).label('rank')
+  total = func.count().over().label('total')
+  rows = (
+    session.query(model.id, model.name, rank, total)
+    .filter(matches)
+    .order_by(rank.desc(), model.name, model.id)
+    .limit(limit)
+    .offset(offset)
+    .all()
+  )
+  if not rows and offset:
+    return session.query(func.count(model.id)).filter(matches).scalar(), []
+  return (rows[0].total if rows else 0), [(row.id, row.name) for row in rows]
+
+
+def search_names(session, model, term, limit=DEFAULT_LIMIT, offset=0):
+  """Ranked (count, [(id, name)]) for names containing `term`."""
+  if session.get_bind().dialect.name == 'postgresql':
+    return _postgres_search(session, model, term, limit, offset)
+  return ngram_index(session, model).search(term, limit=limit, offset=offset)
+
+
+def upcoming_show_counts(session, model, ids):
+  """{id: upcoming show count} for all `ids`, read from the counter column."""
+  if not ids:
+    return {}
+  return dict(session.query(model.id, model.upcoming_show_count).filter(model.id.in_(ids)))
+
+
+def venue_search(session, term, limit=DEFAULT_LIMIT, offset=0):
+  count, hits = search_names(session, Venue, term, limit=limit, offset=offset)
+  counts = upcoming_show_counts(session, Venue, [id for id, name in hits])
+  return SearchPage(count, [{
+    'id': id,
+    'name': name,
+    'future_show_count': counts.get(id, 0),
+  } for id, name in hits])
+
+
+def artist_search(session, term, limit=DEFAULT_LIMIT, offset=0):
+  count, hits = search_names(session, Artist, term, limit=limit, offset=offset)
+  counts = upcoming_show_counts(session, Artist, [id for id, name in hits])
+  return SearchPage(count, [{
+    'id': id,
+    'name': name,
+    'total_upcoming_shows': counts.get(id, 0),
+  } for id, name in hits])
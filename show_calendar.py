@@ -0,0 +1,75 @@
+#----------------------------------------------------------------------------#
+# Show calendar.
+#----------------------------------------------------------------------------#
+# /shows?from=2026-11-01&to=2026-11-30&city=San+Francisco lists the shows
+# starting in a date range, optionally in one city, a keyset page at a time
+# like the plain listing: show_page() over calendar_query(). The range
+# bounds Show.start_time, so on Postgres, with Shows partitioned
+# (show_partitions.py), the query only reads the partitions of the months
+# it covers; on SQLite or an unpartitioned table the same query is a range
+# on ix_shows_start_time_id.
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+
+from models import Venue, Show
+from show_listing import show_rows_query
+
+CalendarRange = namedtuple('CalendarRange', ['start', 'end', 'city'])
+
+ARGS = ('from', 'to', 'city')
+
+# Days listed when only `from`, `to` or a city is given.
+DEFAULT_DAYS = 31
+# Longest range one request may ask for.
+MAX_DAYS = 366
+
+
+def parse_bound(value):
+  """(datetime, date_only) for a YYYY-MM-DD or ISO 8601 date and time."""
+  try:
+    if len(value) == 10:
+      return datetime.combine(date.fromisoformat(value), time()), True
+    return datetime.fromisoformat(value), False
+  except ValueError:
+    raise ValueError('{!r} is not an ISO 8601 date'.format(value))
+
+
+def calendar_range(args, today=None):
+  """The CalendarRange asked for by `from`, `to` and `city`; None for none of them.
+
+  A `to` date is inclusive, a `to` date and time is not. Raises ValueError
+  for dates it can't read and for empty or overlong ranges.
+  """
+  if not any(args.get(name) for name in ARGS):
+    return None
+  today = datetime.combine(today or date.today(), time())
+  start = parse_bound(args['from'])[0] if args.get('from') else None
+  end = None
+  if args.get('to'):
+    end, date_only = parse_bound(args['to'])
+    if date_only:
+      end += timedelta(days=1)
+  if start is None:
+    start = today if end is None or end > today else end - timedelta(days=DEFAULT_DAYS)
+  if end is None:
+    end = start + timedelta(days=DEFAULT_DAYS)
+  if end <= start:
+    raise ValueError('`to` must be after `from`')
+  if end - start > timedelta(days=MAX_DAYS):
+    raise ValueError('at most {} days at a time'.format(MAX_DAYS))
+  return CalendarRange(start, end, args.get('city') or None)
+
+
+def calendar_query(session, calendar):
+  """show_rows_query() narrowed to the calendar's range and city."""
+  query = show_rows_query(session).filter(Show.start_time >= calendar.start, Show.start_time < calendar.end)
+  if calendar.city:
+    query = query.filter(Venue.city == calendar.city)
+  return query
+
+
+def by_day(tiles):
+  """(date, [tile, ...]) for runs of show tiles starting on the same day."""
+  for day, shows in groupby(tiles, key=lambda tile: tile['start_time'].date()):
+    yield day, list(shows)
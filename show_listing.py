@@ -0,0 +1,63 @@
+#----------------------------------------------------------------------------#
+# Show listing.
+#----------------------------------------------------------------------------#
+from flask import Response, current_app, stream_with_context
+
+from models import Venue, Artist, Show
+from pagination import keyset_page, DEFAULT_PAGE_SIZE
+
+# Number of template output chunks Jinja buffers before each write.
+STREAM_BUFFER = 20
+
+
+def show_rows_query(session):
+  """Shows joined to their venue and artist, selecting only rendered columns."""
+  return (
+    session.query(
+      Show.id.label('id'),
+      Show.start_time.label('start_time'),
+      Show.end_time.label('end_time'),
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+    )
+    .join(Venue, Venue.id == Show.venue_id)
+    .join(Artist, Artist.id == Show.artist_id)
+  )
+
+
+def show_page(session, after=None, before=None, limit=DEFAULT_PAGE_SIZE, query=None):
+  """One keyset page of shows ordered by (start_time, id)."""
+  if query is None:
+    query = show_rows_query(session)
+  return keyset_page(
+    query,
+    keys=[Show.start_time, Show.id],
+    key_of=lambda row: (row.start_time, row.id),
+    after=after,
+    before=before,
+    limit=limit,
+  )
+
+
+def show_tiles(rows):
+  for row in rows:
+    yield {
+      'venue_id': row.venue_id,
+      'venue_name': row.venue_name,
+      'artist_id': row.artist_id,
+      'artist_name': row.artist_name,
+      'artist_image_link': row.artist_image_link,
+      'start_time': row.start_time,
+    }
+
+
+def stream_template(template_name, **context):
+  """Render a template as a streamed response, flushing in chunks."""
+  app = current_app._get_current_object()
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(STREAM_BUFFER)
+  return Response(stream_with_context(stream), mimetype='text/html')
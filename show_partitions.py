@@ -0,0 +1,170 @@
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+# On Postgres, migration c4a81f6e2d57 range-partitions Shows by month of
+# start_time: one partition per month, "Shows_2026_10", plus "Shows_default"
+# for shows of months that have none yet. Queries bounded on start_time
+# (the calendar, the rollover, the booking checks) only scan the months
+# they cover.
+#
+# Postgres can't enforce the double-booking exclusion constraints across a
+# partitioned table, so each month carries its own pair. A show near the
+# turn of a month is checked against the neighbouring month by the
+# shows_month_boundary trigger of the migration, which new partitions
+# inherit.
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'Shows'
+DEFAULT_PARTITION = 'Shows_default'
+PARTITION_NAME = re.compile(r'^Shows_(\d{4})_(\d{2})$')
+
+# Any number; only the worker holding it creates partitions.
+ADVISORY_LOCK = 0x5e0c3a9b
+
+EXCLUSIONS = (
+  ('venue_overlap', 'venue_id'),
+  ('artist_overlap', 'artist_id'),
+)
+
+
+def month_start(value):
+  return datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+  index = month.year * 12 + month.month - 1 + count
+  return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+  return '{}_{:%Y_%m}'.format(TABLE, month)
+
+
+def partition_parent(name):
+  """'Shows' for any partition of Shows, the name itself otherwise."""
+  return TABLE if name == DEFAULT_PARTITION or PARTITION_NAME.match(name) else name
+
+
+def is_partitioned(connection):
+  if connection.dialect.name != 'postgresql':
+    return False
+  kind = connection.execute(text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)'),
+                            {'table': '"{}"'.format(TABLE)}).scalar()
+  return kind == 'p'
+
+
+def partition_months(connection):
+  """Months that have a partition of their own."""
+  names = connection.execute(text(
+    'SELECT child.relname FROM pg_inherits'
+    ' JOIN pg_class child ON child.oid = pg_inherits.inhrelid'
+    ' WHERE pg_inherits.inhparent = to_regclass(:table)'
+  ), {'table': '"{}"'.format(TABLE)}).scalars()
+  months = set()
+  for name in names:
+    match = PARTITION_NAME.match(name)
+    if match:
+      months.add(datetime(int(match.group(1)), int(match.group(2)), 1))
+  return months
+
+
+def create_partition(connection, month):
+  """Create the partition of `month`, taking over its shows from the default partition."""
+  name, start, end = partition_name(month), month, add_months(month, 1)
+  bounds = {'start': start, 'end': end}
+  pending = connection.execute(text(
+    'SELECT 1 FROM "{}" WHERE start_time >= :start AND start_time < :end LIMIT 1'.format(DEFAULT_PARTITION)
+  ), bounds).first()
+  values = "FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(start, end)
+  if pending is None:
+    connection.execute(text('CREATE TABLE "{}" PARTITION OF "{}" FOR VALUES {}'.format(name, TABLE, values)))
+  else:
+    # The default partition may not keep rows of a range that gets its own
+    # partition: move them over, then attach the new partition.
+    connection.execute(text(
+      'CREATE TABLE "{}" (LIKE "{}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name, TABLE)
+    ))
+    connection.execute(text(
+      'WITH moved AS (DELETE FROM "{}" WHERE start_time >= :start AND start_time < :end RETURNING *)'
+      ' INSERT INTO "{}" SELECT * FROM moved'.format(DEFAULT_PARTITION, name)
+    ), bounds)
+    connection.execute(text('ALTER TABLE "{}" ATTACH PARTITION "{}" FOR VALUES {}'.format(TABLE, name, values)))
+  add_exclusions(connection, name)
+  return name
+
+
+def add_exclusions(connection, name):
+  for suffix, column in EXCLUSIONS:
+    connection.execute(text(
+      'ALTER TABLE "{0}" ADD CONSTRAINT "{0}_{1}" EXCLUDE USING gist'
+      ' ({2} WITH =, tsrange(start_time, end_time) WITH &&)'.format(name, suffix, column)
+    ))
+
+
+def ensure_partitions(connection, now=None, ahead=12):
+  """Create the missing partitions from this month to `ahead` months on; their names.
+
+  Does nothing where Shows isn't partitioned, or while another worker is at it.
+  """
+  if not is_partitioned(connection):
+    return []
+  if not connection.execute(text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK}).scalar():
+    return []
+  this_month = month_start(now or datetime.now())
+  existing = partition_months(connection)
+  return [create_partition(connection, month)
+          for month in (add_months(this_month, n) for n in range(ahead + 1)) if month not in existing]
+
+
+class ShowPartitions(object):
+  """Keeps SHOW_PARTITIONS_AHEAD months of partitions ahead of today.
+
+  Checks on a worker's first request, then every SHOW_PARTITION_CHECK_SECONDS;
+  `flask create-show-partitions` does the same from cron or a deploy.
+  """
+
+  def __init__(self, app=None):
+    self._thread = None
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.app = app
+    self.ahead = app.config.get('SHOW_PARTITIONS_AHEAD', 12)
+    self.interval = app.config.get('SHOW_PARTITION_CHECK_SECONDS', 6 * 3600)
+    app.extensions['show_partitions'] = self
+    app.before_request(self.start)
+
+  def start(self):
+    # Read per request, so a command can turn the thread off for its run.
+    if not self.app.config.get('SHOW_PARTITIONS', True):
+      return
+    with self._lock:
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name='show-partitions', daemon=True)
+        self._thread.start()
+
+  def _run(self):
+    with self.app.app_context():
+      while True:
+        try:
+          with db.engine.begin() as connection:
+            if not is_partitioned(connection):
+              return
+            created = ensure_partitions(connection, ahead=self.ahead)
+          if created:
+            logger.info('created show partitions %s', ', '.join(created))
+        except Exception:
+          logger.exception('creating show partitions failed')
+        time.sleep(self.interval)
@@ -0,0 +1,171 @@
+#----------------------------------------------------------------------------#
+# Template loading and render timing.
+#----------------------------------------------------------------------------#
+import bisect
+import compileall
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import jinja2
+from jinja2 import ChoiceLoader, FileSystemBytecodeCache, ModuleLoader, Template
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the render time histogram, in milliseconds.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+MANIFEST = 'manifest.json'
+
+
+class RenderHistogram(object):
+  """Render time per template name, bucketed like a Prometheus histogram."""
+
+  def __init__(self, buckets=BUCKETS_MS):
+    self.buckets = buckets
+    self.templates = {}
+    self._lock = threading.Lock()
+
+  def record(self, name, seconds):
+    ms = seconds * 1000
+    with self._lock:
+      entry = self.templates.get(name)
+      if entry is None:
+        entry = self.templates[name] = {'counts': [0] * (len(self.buckets) + 1), 'sum_ms': 0.0, 'max_ms': 0.0}
+      entry['counts'][bisect.bisect_left(self.buckets, ms)] += 1
+      entry['sum_ms'] += ms
+      entry['max_ms'] = max(entry['max_ms'], ms)
+
+  def snapshot(self):
+    labels = ['le_{}'.format(bound) for bound in self.buckets] + ['le_inf']
+    with self._lock:
+      return dict((name, {
+        'renders': sum(entry['counts']),
+        'avg_ms': round(entry['sum_ms'] / sum(entry['counts']), 3),
+        'max_ms': round(entry['max_ms'], 3),
+        'buckets': dict(zip(labels, entry['counts'])),
+      }) for name, entry in self.templates.items())
+
+
+class TimedTemplate(Template):
+  """Template reporting each render to its environment's histogram.
+
+  Only top-level renders count: a layout a page extends, or a template it
+  includes, runs inside the page's own render.
+  """
+
+  def render(self, *args, **kwargs):
+    histogram = getattr(self.environment, 'render_histogram', None)
+    if histogram is None:
+      return super(TimedTemplate, self).render(*args, **kwargs)
+    began = time.perf_counter()
+    try:
+      return super(TimedTemplate, self).render(*args, **kwargs)
+    finally:
+      histogram.record(self.name, time.perf_counter() - began)
+
+  def generate(self, *args, **kwargs):
+    # Streamed: count the time spent producing chunks, not the time the
+    # client takes to read them.
+    histogram = getattr(self.environment, 'render_histogram', None)
+    if histogram is None:
+      yield from super(TimedTemplate, self).generate(*args, **kwargs)
+      return
+    spent = 0.0
+    began = time.perf_counter()
+    for chunk in super(TimedTemplate, self).generate(*args, **kwargs):
+      spent += time.perf_counter() - began
+      yield chunk
+      began = time.perf_counter()
+    histogram.record(self.name, spent + time.perf_counter() - began)
+
+
+def _compilable(name):
+  return name.endswith('.html')
+
+
+def source_hashes(app):
+  """sha1 of every template source the app can load, by name."""
+  loader = app.create_global_jinja_loader()
+  hashes = {}
+  for name in loader.list_templates():
+    if _compilable(name):
+      source, filename, uptodate = loader.get_source(app.jinja_env, name)
+      hashes[name] = hashlib.sha1(source.encode('utf-8')).hexdigest()
+  return hashes
+
+
+def compile_bundle(app, target):
+  """Compile every template to a directory of Python modules for ModuleLoader.
+
+  Written next to a manifest of the sources it was built from; the .pyc
+  files are produced too, so a worker only imports, never compiles.
+  Returns the number of templates compiled.
+  """
+  env = app.jinja_env.overlay(loader=app.create_global_jinja_loader(), bytecode_cache=None)
+  staging = target.rstrip(os.sep) + '.tmp'
+  shutil.rmtree(staging, ignore_errors=True)
+  os.makedirs(staging)
+  hashes = source_hashes(app)
+  env.compile_templates(staging, filter_func=_compilable, zip=None, ignore_errors=False)
+  compileall.compile_dir(staging, quiet=1)
+  with open(os.path.join(staging, MANIFEST), 'w') as f:
+    json.dump({'jinja2': jinja2.__version__, 'templates': hashes}, f, indent=2, sort_keys=True)
+  # Swap the whole directory, so running workers never see half a bundle.
+  previous = target.rstrip(os.sep) + '.old'
+  shutil.rmtree(previous, ignore_errors=True)
+  if os.path.isdir(target):
+    os.rename(target, previous)
+  os.rename(staging, target)
+  shutil.rmtree(previous, ignore_errors=True)
+  return len(hashes)
+
+
+def bundle_is_current(app, bundle):
+  try:
+    with open(os.path.join(bundle, MANIFEST)) as f:
+      manifest = json.load(f)
+  except (OSError, ValueError):
+    return False
+  return manifest.get('jinja2') == jinja2.__version__ and manifest.get('templates') == source_hashes(app)
+
+
+class Templates(object):
+  """Loads templates without compiling them in each worker.
+
+  A bundle built at deploy time by `flask compile-templates` is loaded as
+  plain Python modules, as long as its manifest still matches the template
+  sources; otherwise (or for templates it lacks) the sources are compiled
+  once and the bytecode is kept in TEMPLATE_CACHE_DIR, shared by every
+  worker and every restart. Render times go to a per-template histogram.
+  """
+
+  def __init__(self, app=None):
+    self.bundle = None
+    self.histogram = RenderHistogram()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    env = app.jinja_env
+    env.template_class = TimedTemplate
+    if app.config.get('TEMPLATE_METRICS', True):
+      env.render_histogram = self.histogram
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if cache_dir:
+      os.makedirs(cache_dir, exist_ok=True)
+      env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    bundle = app.config.get('TEMPLATE_BUNDLE')
+    if bundle and os.path.isdir(bundle):
+      if bundle_is_current(app, bundle):
+        env.loader = ChoiceLoader([ModuleLoader(bundle), env.loader])
+        self.bundle = bundle
+      else:
+        logger.warning('template bundle %s is stale; run `flask compile-templates`', bundle)
+    app.extensions['templates'] = self
+
+  def stats(self):
+    return {'bundle': self.bundle, 'render_ms': self.histogram.snapshot()}
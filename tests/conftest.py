@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# app.py builds a module-level app from config.py on import; keep it off Postgres.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app, invalidate_indexes  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+  app = create_app(
+    SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'fyyur.db'),
+    TESTING=True,
+    WTF_CSRF_ENABLED=False,
+    CACHE_BACKEND='memory',
+    SHOW_ROLLOVER=False,
+    SHOW_PARTITIONS=False,
+    TYPEAHEAD_INDEX=False,
+    TEMPLATE_BUNDLE=str(tmp_path / 'templates'),
+    TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'),
+    STATIC_BUILD_DIR=str(tmp_path / 'static'),
+    SLOW_LOG_PATH=str(tmp_path / 'slow.log'),
+  )
+  with app.app_context():
+    db.create_all()
+  invalidate_indexes()
+  yield app
+  with app.app_context():
+    db.session.remove()
+    db.engine.dispose()
+  invalidate_indexes()
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+
+@pytest.fixture
+def session(app):
+  with app.app_context():
+    yield db.session
+    db.session.remove()
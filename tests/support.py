@@ -0,0 +1,31 @@
+"""Rows for tests, committed through the given session."""
+from datetime import datetime, timedelta
+
+from models import Venue, Artist, Show
+
+
+def add_venue(session, name='The Musical Hop', city='San Francisco', state='CA', genre_ids=(), **fields):
+  venue = Venue(name=name, city=city, state=state, genre_ids=list(genre_ids), **fields)
+  session.add(venue)
+  session.commit()
+  return venue
+
+
+def add_artist(session, name='Guns N Petals', city='San Francisco', state='CA', genres=(), genre_ids=(),
+               **fields):
+  artist = Artist(name=name, city=city, state=state, genres=list(genres), genre_ids=list(genre_ids), **fields)
+  session.add(artist)
+  session.commit()
+  return artist
+
+
+def add_show(session, venue, artist, start_time, hours=2):
+  show = Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time,
+              end_time=start_time + timedelta(hours=hours))
+  session.add(show)
+  session.commit()
+  return show
+
+
+def hours_from_now(hours):
+  return datetime.now().replace(microsecond=0) + timedelta(hours=hours)
@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+import pytest
+
+from asgi import AsyncReadApp
+from support import add_artist, add_show, add_venue, hours_from_now
+
+
+def get_all(app, paths):
+  async def fetch():
+    asgi_app = AsyncReadApp(app)
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+      responses = [await client.get(path) for path in paths]
+    for engine in asgi_app.engines.values():
+      await engine.dispose()
+    return responses
+  return asyncio.run(fetch())
+
+
+@pytest.fixture
+def ids(session):
+  venue, artist = add_venue(session, name='Venue Hall'), add_artist(session, name='The Band')
+  for hours in (-24, 24):
+    add_show(session, venue, artist, hours_from_now(hours))
+  return venue.id, artist.id
+
+
+def test_detail_pages_match_the_wsgi_app(app, ids):
+  app.extensions['page_cache'].backend = None
+  venue_id, artist_id = ids
+  paths = ['/venues/{}'.format(venue_id), '/artists/{}'.format(artist_id),
+           '/api/v1/venues/{}?past_limit=1'.format(venue_id), '/api/v1/artists/{}'.format(artist_id)]
+  client = app.test_client()
+  for path, response in zip(paths, get_all(app, paths)):
+    assert response.status_code == 200, path
+    assert response.content == client.get(path).get_data(), path
+    # Both queries ran on the async engine, and were counted against the budget.
+    assert '"2 queries"' in response.headers['server-timing'], path
+
+
+def test_cached_page_runs_no_queries(app, ids):
+  venue_id, _ = ids
+  path = '/venues/{}'.format(venue_id)
+  first, second = get_all(app, [path, path])
+  assert second.content == first.content
+  assert '"0 queries"' in second.headers['server-timing']
+
+
+def test_missing_venue_and_other_routes(app, ids):
+  missing, venues = get_all(app, ['/venues/999', '/venues'])
+  assert missing.status_code == 404
+  assert venues.status_code == 200 and 'Venue Hall' in venues.text
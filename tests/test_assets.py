@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import posixpath
+import shutil
+
+import pytest
+from PIL import Image
+
+from app import create_app
+from assets import MANIFEST, build_assets
+from models import db
+
+CSS = b'body { background: url("../img/splash.png"); }\n' * 50
+
+
+@pytest.fixture
+def static(tmp_path):
+  folder = tmp_path / 'source'
+  (folder / 'css').mkdir(parents=True)
+  (folder / 'img').mkdir()
+  (folder / 'css' / 'site.css').write_bytes(CSS)
+  Image.new('RGB', (1200, 600), 'red').save(str(folder / 'img' / 'splash.png'))
+  return str(folder)
+
+
+def test_build_fingerprints_precompresses_and_resizes(static, tmp_path):
+  target = str(tmp_path / 'built')
+  manifest = build_assets(static, target, widths=(480, 960, 1920))
+  splash, site = manifest['assets']['img/splash.png'], manifest['assets']['css/site.css']
+  assert splash.startswith('img/splash.') and site.startswith('css/site.')
+  assert [width for width, variant in manifest['variants']['img/splash.png']] == [480, 960]
+  assert Image.open(os.path.join(target, manifest['variants']['img/splash.png'][0][1])).size == (480, 240)
+  # The stylesheet points at the hashed image, and its hash covers that.
+  with open(os.path.join(target, site), 'rb') as f:
+    css = f.read()
+  assert 'url("{}")'.format(posixpath.relpath(splash, 'css')).encode() in css
+  assert sorted(manifest['encodings'][site]) == ['.br', '.gz']
+  with open(os.path.join(target, site + '.gz'), 'rb') as f:
+    assert gzip.decompress(f.read()) == css
+  # Unchanged sources build to the same names.
+  assert build_assets(static, target, widths=(480, 960, 1920))['assets'] == manifest['assets']
+
+
+@pytest.fixture(scope='module')
+def build(tmp_path_factory):
+  # The real static/ takes seconds to precompress; build it once.
+  target = str(tmp_path_factory.mktemp('assets') / 'static')
+  build_assets(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static'), target, widths=())
+  return target
+
+
+@pytest.fixture
+def built(app, build):
+  """A worker started after `flask build-assets` ran on the app's static/."""
+  shutil.copytree(build, app.config['STATIC_BUILD_DIR'])
+  worker = create_app(**app.config)
+  yield worker
+  with worker.app_context():
+    db.engine.dispose()
+
+
+def manifest_of(app):
+  with open(os.path.join(app.config['STATIC_BUILD_DIR'], MANIFEST)) as f:
+    return json.load(f)
+
+
+def test_built_assets_are_immutable(built):
+  hashed = manifest_of(built)['assets']['css/main.css']
+  with built.test_request_context():
+    url = built.jinja_env.globals['asset_url']('css/main.css')
+  assert url == '/static/' + hashed
+  client = built.test_client()
+  response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+  assert response.headers['Content-Encoding'] == 'br' and 'Accept-Encoding' in response.headers['Vary']
+  assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+  assert client.get(url).headers.get('Content-Encoding') is None
+  # Pages link the hashed name.
+  assert hashed in client.get('/').get_data(as_text=True)
+
+
+def test_unbuilt_and_stale_files_are_served_from_static(app, built):
+  manifest = manifest_of(built)
+  manifest['sources']['css/main.css'][0] += 1
+  with open(os.path.join(app.config['STATIC_BUILD_DIR'], MANIFEST), 'w') as f:
+    json.dump(manifest, f)
+  worker = create_app(**app.config)
+  with worker.test_request_context():
+    assert worker.jinja_env.globals['asset_url']('css/main.css') == '/static/css/main.css'
+  response = worker.test_client().get('/static/css/main.css')
+  assert response.status_code == 200 and not response.cache_control.immutable
+  response.close()
+  with worker.app_context():
+    db.engine.dispose()
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bookings import IntervalIndex, make_booking
+from models import DEFAULT_SHOW_LENGTH
+from support import add_artist, add_show, add_venue
+
+
+START = datetime(2030, 6, 1, 20, 0)
+
+
+def test_interval_index():
+  index = IntervalIndex()
+  index.load('a', [(START, START + timedelta(hours=2), 1), (START + timedelta(hours=3), START + timedelta(hours=4), 2)])
+  assert [ref for start, end, ref in index.overlapping('a', START + timedelta(hours=1), START + timedelta(hours=3))] == [1]
+  assert index.overlapping('a', START + timedelta(hours=2), START + timedelta(hours=3)) == []
+  assert index.overlapping('b', START, START + timedelta(hours=1)) == []
+
+
+def test_make_booking():
+  assert make_booking('1', '2', START).end_time == START + DEFAULT_SHOW_LENGTH
+  with pytest.raises(ValueError):
+    make_booking(1, 2, START, START)
+  with pytest.raises(ValueError):
+    make_booking('one', 2, START)
+
+
+def test_make_booking_normalizes_aware_times():
+  aware = datetime(2030, 6, 1, 22, 0, tzinfo=timezone(timedelta(hours=2)))
+  booking = make_booking(1, 2, aware, aware + timedelta(hours=1))
+  assert (booking.start_time, booking.end_time) == (START, START + timedelta(hours=1))
+
+
+@pytest.fixture
+def booked(session):
+  venue, artist = add_venue(session), add_artist(session)
+  other_venue, other_artist = add_venue(session, name='Elsewhere'), add_artist(session, name='Other')
+  show = add_show(session, venue, artist, START)
+  return venue.id, artist.id, other_venue.id, other_artist.id, show.id
+
+
+def check(client, *shows):
+  response = client.post('/api/v1/shows/conflicts', json={'shows': list(shows)})
+  assert response.status_code == 200
+  return response.get_json()['data']
+
+
+def test_conflicts(client, booked):
+  venue, artist, other_venue, other_artist, show = booked
+  results = check(
+    client,
+    {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T21:00:00'},
+    {'venue_id': other_venue, 'artist_id': artist, 'start_time': '2030-06-01T19:00:00'},
+    {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T22:00:00'},
+    {'venue_id': other_venue, 'artist_id': other_artist, 'start_time': '2030-06-02T01:00:00'},
+    {'venue_id': other_venue, 'artist_id': other_artist, 'start_time': '2030-06-02T02:00:00'},
+  )
+  assert [result['ok'] for result in results] == [False, False, True, True, False]
+  assert [(c['kind'], c['show_id']) for c in results[0]['conflicts']] == [('venue', show)]
+  assert [(c['kind'], c['show_id']) for c in results[1]['conflicts']] == [('artist', show)]
+  assert [(c['kind'], c['proposal']) for c in results[4]['conflicts']] == [('venue', 3), ('artist', 3)]
+
+
+def test_conflicts_with_aware_times(client, booked):
+  venue, artist, other_venue, other_artist, show = booked
+  results = check(
+    client,
+    {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T23:00:00+02:00'},
+    {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T22:00:00Z'},
+  )
+  assert [result['ok'] for result in results] == [False, True]
+
+
+@pytest.mark.parametrize('payload', [
+  {},
+  {'shows': [{'venue_id': 1, 'artist_id': 1}]},
+  {'shows': [{'venue_id': 1, 'artist_id': 1, 'start_time': 'tomorrow'}]},
+  {'shows': [{'venue_id': 1, 'artist_id': 1, 'start_time': 20300601}]},
+  {'shows': ['not a show']},
+])
+def test_bad_conflicts_request_is_400(client, payload):
+  assert client.post('/api/v1/shows/conflicts', json=payload).status_code == 400
@@ -0,0 +1,44 @@
+import pytest
+
+from instrumentation import QueryBudgetExceeded, query_budget
+from models import db, Venue, Artist
+from query_plans import hot_paths
+from support import add_artist, add_show, add_venue, hours_from_now
+
+
+def add_greedy_route(app):
+  @query_budget(1)
+  def greedy():
+    return str(db.session.query(Venue).count() + db.session.query(Artist).count())
+  app.add_url_rule('/_test/greedy', 'greedy', greedy)
+
+
+def test_over_budget_raises_under_testing(app, client):
+  add_greedy_route(app)
+  with pytest.raises(QueryBudgetExceeded):
+    client.get('/_test/greedy')
+
+
+def test_over_budget_only_warns_when_not_enforced(app, client):
+  app.config['SQL_ENFORCE_BUDGETS'] = False
+  add_greedy_route(app)
+  assert client.get('/_test/greedy').status_code == 200
+
+
+def test_hot_paths_stay_within_budget(app, client, session):
+  app.extensions['page_cache'].backend = None
+  venue, artist = add_venue(session, name='Venue Hall'), add_artist(session, name='The Band')
+  for hours in (-24, 24, 48):
+    add_show(session, venue, artist, hours_from_now(hours))
+  for path in hot_paths(session):
+    response = client.open(path.path, method=path.method, data=path.data)
+    assert response.status_code == 200, path.label
+    response.close()
+
+
+def test_check_budgets_command(app, session):
+  venue, artist = add_venue(session, name='Venue Hall'), add_artist(session, name='The Band')
+  add_show(session, venue, artist, hours_from_now(24))
+  result = app.test_cli_runner().invoke(args=['check-budgets'])
+  assert result.exit_code == 0, result.output
+  assert 'show calendar' in result.output and 'OVER' not in result.output
@@ -0,0 +1,66 @@
+import io
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from bulk_import import import_rows, read_rows
+from models import Venue, Show
+from support import add_artist, add_show, add_venue, hours_from_now
+
+VENUES = '''name,city,state,address,phone,facebook_link,genres
+Jazz Hall,San Francisco,CA,1 Main Street,415-555-0100,https://www.facebook.com/jazz,"Jazz,Blues"
+,San Francisco,CA,2 Main Street,415-555-0101,https://www.facebook.com/none,Jazz
+Folk House,New York,NY,3 Main Street,212-555-0100,https://www.facebook.com/folk,Folk
+Blues Bar,Austin,TX,4 Main Street,512-555-0100,https://www.facebook.com/blues,Blues
+Taken Hall,Austin,TX,5 Main Street,512-555-0101,https://www.facebook.com/taken,Blues
+Swing Club,Austin,TX,6 Main Street,512-555-0102,https://www.facebook.com/swing,Jazz
+'''
+
+
+def import_csv(session, kind, body, **kwargs):
+  return import_rows(session, kind, read_rows(io.StringIO(body), 'csv'), **kwargs)
+
+
+def test_invalid_rows_are_rejected_alone(session):
+  result = import_csv(session, 'venues', VENUES)
+  assert (result.read, result.inserted) == (6, 5)
+  assert [line for line, message in result.errors] == [3]
+  assert 'name' in result.errors[0][1]
+  assert session.query(Venue).filter_by(name='Jazz Hall').one().genre_ids == [2, 11]
+
+
+def test_a_refused_row_does_not_sink_its_batch(session):
+  add_venue(session, name='Taken Hall')
+  session.execute(text('CREATE UNIQUE INDEX ix_test_venue_name ON "Venues" (name)'))
+  session.commit()
+  result = import_csv(session, 'venues', VENUES, batch_size=100)
+  assert [line for line, message in result.errors] == [3, 6]
+  assert 'UNIQUE' in result.errors[1][1]
+  assert result.inserted == 4
+  assert session.query(Venue).count() == 5
+
+
+def test_shows_with_bad_references_and_double_bookings(session):
+  venue, artist = add_venue(session), add_artist(session)
+  booked = hours_from_now(24)
+  add_show(session, venue, artist, booked)
+  body = 'venue_id,artist_id,start_time\n' + ''.join('{},{},{:%Y-%m-%d %H:%M:%S}\n'.format(*row) for row in [
+    (venue.id, artist.id, hours_from_now(48)),
+    (venue.id, 999, hours_from_now(72)),
+    (venue.id, artist.id, booked),
+    (venue.id, artist.id, hours_from_now(96)),
+  ])
+  result = import_csv(session, 'shows', body)
+  assert result.inserted == 2
+  assert [line for line, message in result.errors] == [3, 4]
+  assert 'unknown artist_id' in result.errors[0][1] and 'already booked' in result.errors[1][1]
+  assert session.query(Show).count() == 3
+  session.expire_all()
+  assert venue.upcoming_show_count == 3
+
+
+def test_rows_written_outside_the_orm_are_stamped_in_utc(session):
+  # COPY and raw inserts skip the ORM's default; the server default must be UTC too.
+  session.execute(text("""INSERT INTO "Venues" (name, genre_ids) VALUES ('Raw Hall', '[]')"""))
+  stamp = session.query(Venue).filter_by(name='Raw Hall').one().updated_at
+  assert abs(stamp - datetime.utcnow()) < timedelta(minutes=1)
@@ -0,0 +1,78 @@
+import importlib
+
+import config
+from models import Venue
+from support import add_artist, add_show, add_venue, hours_from_now
+
+VENUE_FORM = {'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY', 'address': '335 Delancey Street',
+              'phone': '914-003-1132', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/pianos'}
+ARTIST_FORM = {'name': 'The Wild Sax Band', 'city': 'San Francisco', 'state': 'CA', 'phone': '432-325-5432',
+               'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/sax'}
+
+
+def page_cache(app):
+  return app.extensions['page_cache']
+
+
+def test_pages_are_cached(app, client, session):
+  add_venue(session)
+  first = client.get('/venues').get_data()
+  hits = page_cache(app).hits
+  assert client.get('/venues').get_data() == first
+  assert page_cache(app).hits == hits + 1
+
+
+def test_create_venue_invalidates_directory(client, session):
+  add_venue(session)
+  assert 'The Dueling Pianos Bar' not in client.get('/venues').get_data(as_text=True)
+  assert client.post('/venues/create', data=VENUE_FORM).status_code == 200
+  assert 'The Dueling Pianos Bar' in client.get('/venues').get_data(as_text=True)
+
+
+def test_delete_venue_invalidates_its_pages(client, session):
+  venue = add_venue(session, name='Park Square Live Music & Coffee')
+  artist = add_artist(session)
+  add_show(session, venue, artist, hours_from_now(24))
+  venue_id, artist_id = venue.id, artist.id
+  assert 'Park Square' in client.get('/venues').get_data(as_text=True)
+  assert 'Park Square' in client.get('/artists/{}'.format(artist_id)).get_data(as_text=True)
+  assert 'Park Square' in client.get('/shows').get_data(as_text=True)
+
+  client.delete('/venues/{}'.format(venue_id))
+  assert session.get(Venue, venue_id) is None
+  assert 'Park Square' not in client.get('/venues').get_data(as_text=True)
+  assert 'Park Square' not in client.get('/artists/{}'.format(artist_id)).get_data(as_text=True)
+  assert 'Park Square' not in client.get('/shows').get_data(as_text=True)
+  assert client.get('/venues/{}'.format(venue_id)).status_code == 404
+
+
+def test_create_artist_invalidates_directory(client, session):
+  add_artist(session, name='Matt Quevedo')
+  assert 'The Wild Sax Band' not in client.get('/artists').get_data(as_text=True)
+  client.post('/artists/create', data=ARTIST_FORM)
+  assert 'The Wild Sax Band' in client.get('/artists').get_data(as_text=True)
+
+
+def test_create_show_invalidates_listing_and_details(client, session):
+  venue, artist = add_venue(session), add_artist(session)
+  paths = ['/shows', '/venues/{}'.format(venue.id), '/artists/{}'.format(artist.id), '/api/v1/shows',
+           '/api/v1/venues']
+  before = dict((path, client.get(path).get_data(as_text=True)) for path in paths)
+  start = hours_from_now(48)
+  response = client.post('/shows/create', data={'venue_id': venue.id, 'artist_id': artist.id,
+                                                'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})
+  assert response.status_code == 200
+  for path in paths:
+    assert client.get(path).get_data(as_text=True) != before[path], path
+
+
+def test_several_workers_share_the_cache(monkeypatch):
+  monkeypatch.delenv('CACHE_BACKEND', raising=False)
+  try:
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert importlib.reload(config).CACHE_BACKEND == 'filesystem'
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    assert importlib.reload(config).CACHE_BACKEND == 'memory'
+  finally:
+    monkeypatch.undo()
+    importlib.reload(config)
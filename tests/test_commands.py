@@ -0,0 +1,42 @@
+from sqlalchemy import text
+
+from support import add_artist, add_show, add_venue, hours_from_now
+
+
+def run(app, *args):
+  return app.test_cli_runner().invoke(args=list(args))
+
+
+def add_shows(session):
+  venue, artist = add_venue(session, name='Venue Hall'), add_artist(session, name='The Band')
+  for hours in (-24, 24):
+    add_show(session, venue, artist, hours_from_now(hours))
+
+
+def test_check_plans_passes_with_the_indexes(app, client, session):
+  add_shows(session)
+  # A cached page runs no queries; the check must see them anyway.
+  client.get('/shows').get_data()
+  result = run(app, 'check-plans')
+  assert result.exit_code == 0, result.output
+  assert '8 statements explained, 0 with sequential scans' in result.output
+
+
+def test_check_plans_fails_on_a_sequential_scan(app, session):
+  add_shows(session)
+  for index in ('ix_shows_start_time_id', 'ix_shows_venue_id_start_time', 'ix_shows_artist_id_start_time'):
+    session.execute(text('DROP INDEX {}'.format(index)))
+  session.commit()
+  result = run(app, 'check-plans')
+  assert result.exit_code == 1
+  assert '[shows] SELECT' in result.output and '[show calendar] SELECT' in result.output
+
+
+def test_check_budgets_fails_over_budget(app, session, monkeypatch):
+  add_shows(session)
+  monkeypatch.setattr(app.view_functions['shows'], 'query_budget', 0)
+  result = run(app, 'check-budgets')
+  assert result.exit_code == 1
+  # The calendar is the same route.
+  over = [line[:16].strip() for line in result.output.splitlines() if line.endswith('OVER')]
+  assert over == ['shows', 'show calendar']
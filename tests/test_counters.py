@@ -0,0 +1,179 @@
+import os
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import text
+
+import app as fyyur
+from app import book_show, create_app, write
+from bookings import make_booking
+from counters import ShowRollover, check_counters
+from models import db, Venue, Artist
+from support import add_artist, add_show, add_venue, hours_from_now
+
+
+def book(client, venue_id, artist_id, start):
+  return client.post('/shows/create', data={'venue_id': venue_id, 'artist_id': artist_id,
+                                            'start_time': start.strftime('%Y-%m-%d %H:%M:%S')})
+
+
+def counters(session, model, id):
+  session.expire_all()
+  entity = session.get(model, id)
+  return entity.upcoming_show_count, entity.next_show_at
+
+
+def test_create_show_counts_upcoming_shows(client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  first, second = hours_from_now(48), hours_from_now(24)
+  assert book(client, venue, artist, first).status_code == 200
+  assert book(client, venue, artist, second).status_code == 200
+  assert counters(session, Venue, venue) == (2, second)
+  assert counters(session, Artist, artist) == (2, second)
+  assert check_counters(session) == []
+
+
+def test_past_show_is_not_counted(client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  assert book(client, venue, artist, hours_from_now(-48)).status_code == 200
+  assert counters(session, Venue, venue) == (0, None)
+  assert check_counters(session) == []
+
+
+def test_double_booking_is_refused_and_not_counted(app, client, session):
+  venue, artist, other = add_venue(session).id, add_artist(session).id, add_artist(session, name='Other').id
+  start = hours_from_now(24)
+  assert book(client, venue, artist, start).status_code == 200
+  show_id, conflicts = write(book_show(make_booking(venue, other, start + timedelta(hours=1))))
+  assert show_id is None and len(conflicts) == 1
+  assert counters(session, Venue, venue) == (1, start)
+  assert counters(session, Artist, other) == (0, None)
+
+
+def test_double_booking_route_answers_409_with_the_conflicts(client, session):
+  venue, artist = add_venue(session, name='Venue Hall').id, add_artist(session, name='The Band').id
+  other = add_artist(session, name='Other Band').id
+  start = hours_from_now(24)
+  assert book(client, venue, artist, start).status_code == 200
+  response = book(client, venue, other, start + timedelta(hours=1))
+  assert response.status_code == 409
+  body = response.get_data(as_text=True)
+  assert 'Already booked at that time' in body and 'The Band at Venue Hall' in body
+  assert counters(session, Artist, other) == (0, None)
+
+
+# The exclusion constraints behind a lost booking race are Postgres only
+# (ddl_if in models.py); point TEST_POSTGRES_URL at a scratch database,
+# whose tables this test drops and recreates, to run it.
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+
+@pytest.fixture
+def postgres_app(tmp_path):
+  app = create_app(SQLALCHEMY_DATABASE_URI=POSTGRES_URL, TESTING=True, WTF_CSRF_ENABLED=False, CACHE_BACKEND='memory',
+                   SHOW_ROLLOVER=False, SHOW_PARTITIONS=False, TYPEAHEAD_INDEX=False,
+                   TEMPLATE_BUNDLE=str(tmp_path / 'templates'), TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'),
+                   SLOW_LOG_PATH=str(tmp_path / 'slow.log'))
+  with app.app_context():
+    db.drop_all()
+    for extension in ('btree_gist', 'pg_trgm'):
+      db.session.execute(text('CREATE EXTENSION IF NOT EXISTS {}'.format(extension)))
+    db.session.commit()
+    db.create_all()
+  yield app
+  with app.app_context():
+    db.session.remove()
+    db.drop_all()
+    db.engine.dispose()
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='needs TEST_POSTGRES_URL')
+def test_lost_booking_race_answers_409(postgres_app, monkeypatch):
+  checks = []
+  real = fyyur.find_conflicts
+
+  def racing(session, booking):
+    # The first check ran before the other request committed its show.
+    checks.append(booking)
+    return [] if len(checks) == 1 else real(session, booking)
+
+  with postgres_app.app_context():
+    venue, artist = add_venue(db.session, name='Venue Hall'), add_artist(db.session, name='The Band')
+    other = add_artist(db.session, name='Other Band')
+    start = hours_from_now(24)
+    add_show(db.session, venue, artist, start)
+    venue_id, other_id = venue.id, other.id
+  monkeypatch.setattr(fyyur, 'find_conflicts', racing)
+  response = book(postgres_app.test_client(), venue_id, other_id, start + timedelta(hours=1))
+  assert response.status_code == 409
+  assert 'The Band at Venue Hall' in response.get_data(as_text=True)
+  assert len(checks) == 2
+
+def test_delete_venue_recounts_its_artists(client, session):
+  venue, elsewhere = add_venue(session).id, add_venue(session, name='Elsewhere').id
+  artist = add_artist(session).id
+  soon, later = hours_from_now(24), hours_from_now(72)
+  book(client, venue, artist, soon)
+  book(client, elsewhere, artist, later)
+  assert counters(session, Artist, artist) == (2, soon)
+  client.delete('/venues/{}'.format(venue))
+  assert counters(session, Artist, artist) == (1, later)
+  assert check_counters(session) == []
+
+
+def test_rollover_moves_started_shows_to_past(app, client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  soon, later = hours_from_now(1), hours_from_now(5)
+  book(client, venue, artist, soon)
+  book(client, venue, artist, later)
+  rollover = ShowRollover(app, db)
+  assert rollover.run_once(now=soon - timedelta(minutes=1)) == 0
+  assert rollover.run_once(now=soon) == 1
+  assert counters(session, Venue, venue) == (1, later)
+  assert counters(session, Artist, artist) == (1, later)
+  assert check_counters(session, now=soon) == []
+
+
+def test_rollover_sees_shows_of_other_workers(app, client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  soon = hours_from_now(1)
+  rollover = ShowRollover(app, db)
+  assert rollover.run_once(now=soon - timedelta(minutes=30)) == 0
+  # Booked by another worker: this one's rollover was never told.
+  book(client, venue, artist, soon)
+  assert rollover.run_once(now=soon) == 1
+  assert counters(session, Venue, venue) == (0, None)
+
+
+def test_rollover_writes_once_across_workers(app, client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  soon = hours_from_now(1)
+  book(client, venue, artist, soon)
+  first, second = ShowRollover(app, db), ShowRollover(app, db)
+  assert first.run_once(now=soon) == 1
+  session.expire_all()
+  rolled_at = session.get(Venue, venue).updated_at
+  assert second.run_once(now=soon) == 1
+  session.expire_all()
+  assert session.get(Venue, venue).updated_at == rolled_at
+  assert counters(session, Venue, venue) == (0, None)
+
+
+def test_rollover_wakes_for_the_next_show(app, client, session):
+  venue, artist = add_venue(session).id, add_artist(session).id
+  soon, later = hours_from_now(1), hours_from_now(3)
+  book(client, venue, artist, later)
+  rollover = ShowRollover(app, db)
+  rollover.run_once(now=soon - timedelta(hours=1))
+  assert rollover._next_at == later
+  rollover.push(None, soon, venue, artist)
+  assert rollover._next_at == soon
+
+
+def test_check_counters_repairs(session):
+  venue, artist = add_venue(session), add_artist(session)
+  add_show(session, venue, artist, hours_from_now(24))
+  mismatches = check_counters(session)
+  assert sorted(m.kind for m in mismatches) == ['artist', 'venue']
+  check_counters(session, fix=True)
+  assert check_counters(session) == []
@@ -0,0 +1,105 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from export import export, export_stream
+from genres import encode_genres
+from support import add_artist, add_show, add_venue, hours_from_now
+
+
+TOKEN = 'export-token'
+
+
+@pytest.fixture
+def client(app):
+  app.config['EXPORT_TOKEN'] = TOKEN
+  app.register_blueprint(export)
+  client = app.test_client()
+  client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + TOKEN
+  return client
+
+
+@pytest.fixture
+def rows(session):
+  venue = add_venue(session, name='The Musical Hop', genre_ids=encode_genres(['Jazz', 'Reggae']))
+  artist = add_artist(session, name='Guns N Petals', genres=['Rock n Roll', 'Jazz'],
+                      genre_ids=encode_genres(['Rock n Roll', 'Jazz']))
+  add_show(session, venue, artist, hours_from_now(24))
+
+
+def read_csv(body):
+  return list(csv.DictReader(io.StringIO(body.decode('utf-8'))))
+
+
+def read_ndjson(body):
+  return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+
+@pytest.mark.parametrize('kind', ['venues', 'artists', 'shows'])
+def test_csv_export(client, rows, kind):
+  response = client.get('/_internal/export/{}.csv'.format(kind))
+  assert response.status_code == 200
+  assert response.mimetype == 'text/csv'
+  exported = read_csv(response.get_data())
+  assert len(exported) == 1 and exported[0]['id'] == '1'
+
+
+def test_csv_export_lists(client, rows):
+  venue = read_csv(client.get('/_internal/export/venues.csv').get_data())[0]
+  artist = read_csv(client.get('/_internal/export/artists.csv').get_data())[0]
+  assert venue['genre_ids'] == '11,16'
+  assert artist['genres'] == 'Rock n Roll,Jazz'
+  assert artist['genre_ids'] == '11,17'
+
+
+@pytest.mark.parametrize('kind', ['venues', 'artists', 'shows'])
+def test_ndjson_export(client, rows, kind):
+  response = client.get('/_internal/export/{}.ndjson'.format(kind))
+  assert response.mimetype == 'application/x-ndjson'
+  exported = read_ndjson(response.get_data())
+  assert len(exported) == 1 and exported[0]['id'] == 1
+
+
+def test_ndjson_export_values(client, rows):
+  artist = read_ndjson(client.get('/_internal/export/artists.ndjson').get_data())[0]
+  show = read_ndjson(client.get('/_internal/export/shows.ndjson').get_data())[0]
+  assert artist['genre_ids'] == [11, 17]
+  assert datetime.fromisoformat(show['end_time']) - datetime.fromisoformat(show['start_time']) == timedelta(hours=2)
+
+
+def test_gzip_export(client, rows):
+  response = client.get('/_internal/export/venues.csv?gzip=1')
+  assert response.mimetype == 'application/gzip'
+  assert read_csv(gzip.decompress(response.get_data()))[0]['name'] == 'The Musical Hop'
+
+
+def test_since_filter(client, rows):
+  later = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+  assert read_ndjson(client.get('/_internal/export/shows.ndjson?since=' + later).get_data()) == []
+  assert client.get('/_internal/export/shows.ndjson?since=yesterday').status_code == 400
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_export_stream(session, format):
+  for n in range(10):
+    add_venue(session, name='Hall {}'.format(n), genre_ids=encode_genres(['Jazz']))
+  body = b''.join(export_stream(session, 'venues', format))
+  exported = read_csv(body) if format == 'csv' else read_ndjson(body)
+  assert [row['name'] for row in exported] == ['Hall {}'.format(n) for n in range(10)]
+
+
+def test_export_needs_the_token(app, client, rows):
+  assert app.test_client().get('/_internal/export/venues.csv').status_code == 401
+  other = app.test_client()
+  other.environ_base['HTTP_AUTHORIZATION'] = 'Bearer guess'
+  assert other.get('/_internal/export/venues.csv').status_code == 401
+  app.config['EXPORT_TOKEN'] = None
+  assert client.get('/_internal/export/venues.csv').status_code == 404
+
+
+def test_export_is_off_by_default(app, rows):
+  assert app.test_client().get('/_internal/export/venues.csv').status_code == 404
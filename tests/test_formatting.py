@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from formatting import compiled_pattern, format_datetime, format_datetimes
+from support import add_artist, add_show, add_venue
+
+WHEN = datetime(2019, 5, 21, 21, 30)
+
+
+def test_named_and_literal_patterns():
+  assert format_datetime(WHEN) == 'Tue 05, 21, 2019 9:30PM'
+  assert format_datetime(WHEN, 'full') == 'Tuesday May, 21, 2019 at 9:30PM'
+  assert format_datetime(WHEN, 'y-MM-dd') == '2019-05-21'
+  assert format_datetime(WHEN, 'full', locale='de') == 'Dienstag Mai, 21, 2019 at 9:30PM'
+
+
+def test_strings_are_still_parsed():
+  assert format_datetime('2019-05-21T21:30:00') == format_datetime(WHEN)
+
+
+def test_patterns_are_compiled_once():
+  compiled_pattern.cache_clear()
+  assert format_datetimes([WHEN, WHEN.replace(hour=9)], 'full') == [
+    'Tuesday May, 21, 2019 at 9:30PM', 'Tuesday May, 21, 2019 at 9:30AM']
+  format_datetime(WHEN, 'full')
+  info = compiled_pattern.cache_info()
+  assert (info.misses, info.hits) == (1, 1)
+
+
+def test_template_filter(client, session):
+  venue, artist = add_venue(session), add_artist(session)
+  add_show(session, venue, artist, datetime(2035, 5, 21, 21, 30))
+  assert 'Monday May, 21, 2035 at 9:30PM' in client.get('/artists/{}'.format(artist.id)).get_data(as_text=True)
@@ -0,0 +1,97 @@
+import re
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import genres
+from genres import GenreBitmapIndex, GenreFilter, decode_genres, encode_genres, genre_criterion
+from models import Venue, Artist
+from support import add_artist, add_venue
+
+
+def codes(*names):
+  return encode_genres(names)
+
+
+def test_encode_and_decode():
+  assert encode_genres(['Jazz', 'Blues', 'Jazz', 'Swing']) == [2, 11]
+  assert decode_genres([2, 11]) == ['Blues', 'Jazz']
+
+
+def test_filter_from_args():
+  genre_filter = GenreFilter.from_args(MultiDict([('genre', 'Jazz'), ('genre', 'Blues'), ('match', 'any')]))
+  assert genre_filter.codes == [2, 11] and genre_filter.match == 'any'
+  assert not GenreFilter.from_args(MultiDict())
+  assert GenreFilter(['Swing']).unknown
+
+
+def test_bitmap_index():
+  index = GenreBitmapIndex([(1, codes('Jazz', 'Blues'), 'CA'), (2, codes('Jazz'), 'NY'), (3, codes('Blues'), 'CA')])
+  assert index.match(GenreFilter(['Jazz', 'Blues'])) == [1]
+  assert index.match(GenreFilter(['Jazz', 'Blues'], match='any')) == [1, 2, 3]
+  assert index.match(GenreFilter(['Blues'], state='CA')) == [1, 3]
+  assert index.match(GenreFilter(state='NY')) == [2]
+  assert index.match(GenreFilter(['Rock n Roll'])) == []
+
+
+@pytest.fixture
+def venues(session):
+  add_venue(session, name='Jazz and Blues Hall', genre_ids=codes('Jazz', 'Blues'))
+  add_venue(session, name='Jazz Club', genre_ids=codes('Jazz'), state='NY', city='New York')
+  add_venue(session, name='Blues Bar', genre_ids=codes('Blues'))
+  add_venue(session, name='Folk House', genre_ids=codes('Folk'))
+
+
+def venue_names(client, query):
+  return sorted(re.findall(r'<h5>(.*?)</h5>', client.get('/venues?' + query).get_data(as_text=True)))
+
+
+def test_venues_all_genres(client, venues):
+  assert venue_names(client, 'genre=Jazz&genre=Blues') == ['Jazz and Blues Hall']
+
+
+def test_venues_any_genre(client, venues):
+  assert venue_names(client, 'genre=Jazz&genre=Blues&match=any') == ['Blues Bar', 'Jazz Club', 'Jazz and Blues Hall']
+
+
+def test_venues_genre_and_state(client, venues):
+  assert venue_names(client, 'genre=Jazz&state=NY') == ['Jazz Club']
+
+
+def test_venues_unknown_genre(client, venues):
+  assert venue_names(client, 'genre=Swing') == []
+  assert venue_names(client, 'genre=Swing&genre=Folk&match=any') == ['Folk House']
+
+
+def test_artists_by_genre(client, session):
+  add_artist(session, name='Sax Band', genres=['Jazz'], genre_ids=codes('Jazz'))
+  add_artist(session, name='Rock Band', genres=['Rock n Roll'], genre_ids=codes('Rock n Roll'))
+  body = client.get('/artists?genre=Jazz').get_data(as_text=True)
+  assert re.findall(r'<h5>(.*?)</h5>', body) == ['Sax Band']
+
+
+def test_long_id_lists_go_as_one_parameter(session, monkeypatch):
+  monkeypatch.setattr(genres, 'MAX_BOUND_IDS', 2)
+  for n in range(5):
+    add_venue(session, name='Jazz {}'.format(n), genre_ids=codes('Jazz'))
+  add_venue(session, name='Folk', genre_ids=codes('Folk'))
+  criterion = genre_criterion(session, Venue, GenreFilter(['Jazz']))
+  assert session.query(Venue).filter(criterion).count() == 5
+
+
+def test_new_rows_reach_the_index(client, session):
+  add_artist(session, name='Sax Band', genres=['Jazz'], genre_ids=codes('Jazz'))
+  assert genre_criterion(session, Artist, GenreFilter(['Jazz'])) is not None
+  client.post('/artists/create', data={'name': 'Trumpet Trio', 'city': 'San Francisco', 'state': 'CA',
+                                       'genres': ['Jazz'], 'phone': '415-555-0100'})
+  body = client.get('/artists?genre=Jazz').get_data(as_text=True)
+  assert re.findall(r'<h5>(.*?)</h5>', body) == ['Sax Band', 'Trumpet Trio']
+
+
+def test_index_sees_writes_it_was_not_told_about(session):
+  venue = add_venue(session, name='Jazz Club', genre_ids=codes('Jazz'))
+  assert session.query(Venue).filter(genre_criterion(session, Venue, GenreFilter(['Jazz']))).count() == 1
+  # Written by another worker: this one's index was never invalidated.
+  venue.genre_ids = codes('Blues')
+  session.commit()
+  assert session.query(Venue).filter(genre_criterion(session, Venue, GenreFilter(['Jazz']))).count() == 0
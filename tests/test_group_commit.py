@@ -0,0 +1,65 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from group_commit import GroupCommit
+from models import Venue
+
+
+def add_venue(name, started=None, release=None):
+  def write(session):
+    if started is not None:
+      started.set()
+      release.wait(5)
+    venue = Venue(name=name, city='San Francisco', state='CA', genre_ids=[])
+    session.add(venue)
+    session.flush()
+    return venue.id
+  return write
+
+
+def names(session):
+  session.expire_all()
+  return sorted(name for name, in session.query(Venue.name))
+
+
+@pytest.fixture
+def group_commit(app):
+  app.config.update(GROUP_COMMIT=True, GROUP_COMMIT_MAX_WAIT_MS=0)
+  committer = GroupCommit(app)
+  committer.timeout = 0.2
+  return committer
+
+
+def test_commits_without_grouping(app, session):
+  app.config['GROUP_COMMIT'] = False
+  assert GroupCommit(app).run(add_venue('Inline Hall')) == 1
+  assert names(session) == ['Inline Hall']
+
+
+def test_commits_queued_writes(group_commit, session):
+  assert [group_commit.run(add_venue('Hall {}'.format(n))) for n in range(3)] == [1, 2, 3]
+  assert names(session) == ['Hall 0', 'Hall 1', 'Hall 2']
+
+
+def test_timed_out_write_is_never_committed(group_commit, session):
+  started, release = threading.Event(), threading.Event()
+  slow = threading.Thread(target=group_commit.run, args=(add_venue('Slow Hall', started, release),))
+  slow.start()
+  started.wait(5)
+  # The committer is busy with Slow Hall: this one times out in the queue.
+  with pytest.raises(TimeoutError):
+    group_commit.run(add_venue('Queued Hall'))
+  release.set()
+  slow.join(5)
+  group_commit.run(add_venue('Later Hall'))
+  assert names(session) == ['Later Hall', 'Slow Hall']
+
+
+def test_running_write_is_waited_for(group_commit, session):
+  started, release = threading.Event(), threading.Event()
+  timer = threading.Timer(0.5, release.set)
+  timer.start()
+  assert group_commit.run(add_venue('Slow Hall', started, release)) == 1
+  assert names(session) == ['Slow Hall']
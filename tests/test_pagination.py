@@ -0,0 +1,98 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from support import add_artist, add_show, add_venue, hours_from_now
+
+SHOW_LINK = re.compile(r'<h4>(.*?)</h4>')
+NEXT_LINK = re.compile(r'class="next"><a href="([^"]+)"')
+PREVIOUS_LINK = re.compile(r'class="previous"><a href="([^"]+)"')
+
+
+def link(pattern, body):
+  match = pattern.search(body)
+  return match.group(1).replace('&amp;', '&') if match else None
+
+
+def test_cursor_round_trip():
+  values = (datetime(2026, 11, 1, 20, 30), 42)
+  assert decode_cursor(encode_cursor(values), 2) == values
+
+
+@pytest.mark.parametrize('token', ['garbage', 'W10', encode_cursor((1, 2, 3)), '!!!'])
+def test_bad_cursor(token):
+  with pytest.raises(InvalidCursor):
+    decode_cursor(token, 2)
+
+
+@pytest.fixture
+def shows(session):
+  venue = add_venue(session)
+  artists = [add_artist(session, name='Artist {}'.format(n)) for n in range(3)]
+  # Three artists per hour, so the listing has ties on start_time.
+  return [add_show(session, venue if n % 3 == 0 else add_venue(session, name='Hall {}'.format(n)),
+                   artists[n % 3], hours_from_now(n // 3 + 1)).id
+          for n in range(25)]
+
+
+def test_show_pages_cover_every_show_once(client, shows):
+  url, seen, pages = '/shows?limit=4', [], 0
+  while url:
+    response = client.get(url)
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    seen += SHOW_LINK.findall(body)
+    url = link(NEXT_LINK, body)
+    pages += 1
+  assert len(seen) == len(shows)
+  assert pages == 7
+
+
+def test_show_pages_back_and_forth(client, shows):
+  first = client.get('/shows?limit=4').get_data(as_text=True)
+  second = client.get(link(NEXT_LINK, first)).get_data(as_text=True)
+  back = client.get(link(PREVIOUS_LINK, second)).get_data(as_text=True)
+  assert SHOW_LINK.findall(back) == SHOW_LINK.findall(first)
+  assert link(PREVIOUS_LINK, first) is None
+
+
+def test_api_show_cursors(client, shows):
+  first = client.get('/api/v1/shows?limit=10&fields=id').get_json()
+  second = client.get('/api/v1/shows?limit=10&fields=id&after=' + first['next_cursor']).get_json()
+  back = client.get('/api/v1/shows?limit=10&fields=id&before=' + second['prev_cursor']).get_json()
+  ids = [row['id'] for row in first['data'] + second['data']]
+  assert len(set(ids)) == 20
+  assert back['data'] == first['data']
+
+
+def test_artist_directory_pages(client, session):
+  for n in range(7):
+    add_artist(session, name='Band {:02d}'.format(n))
+  first = client.get('/artists?limit=5').get_data(as_text=True)
+  second = client.get(link(NEXT_LINK, first)).get_data(as_text=True)
+  names = re.findall(r'<h5>(.*?)</h5>', first) + re.findall(r'<h5>(.*?)</h5>', second)
+  assert names == ['Band {:02d}'.format(n) for n in range(7)]
+  assert link(NEXT_LINK, second) is None
+
+
+@pytest.mark.parametrize('path', [
+  '/shows?after=garbage',
+  '/shows?before=garbage',
+  '/shows?after={0}&before={0}'.format(encode_cursor((datetime(2026, 1, 1), 1))),
+  '/artists?after=garbage',
+  '/api/v1/shows?after=garbage',
+  '/api/v1/artists?before=garbage',
+  '/api/v1/venues?group=none&after=garbage',
+])
+def test_bad_cursor_is_400(client, path):
+  assert client.get(path).status_code == 400
+
+
+def test_calendar_pages_keep_their_filters(client, shows):
+  url = '/shows?from={:%Y-%m-%d}&limit=4'.format(hours_from_now(0))
+  first = client.get(url).get_data(as_text=True)
+  following = link(NEXT_LINK, first)
+  assert 'limit=4' in following and 'from=' in following
+  assert len(SHOW_LINK.findall(client.get(following).get_data(as_text=True))) == 4
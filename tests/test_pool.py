@@ -0,0 +1,63 @@
+import pytest
+from flask import g
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import NullPool
+
+from database import (MeteredQueuePool, engine_options, local_statement_timeout, pool_status,
+                      statement_timeout, view_statement_timeout)
+
+POSTGRES = 'postgresql+psycopg://fyyur@db/fyyur'
+
+
+def test_pool_is_a_share_of_the_connection_limit():
+  options = engine_options({'SQLALCHEMY_DATABASE_URI': POSTGRES, 'DB_MAX_CONNECTIONS': 20, 'WEB_CONCURRENCY': 3,
+                            'DB_STATEMENT_TIMEOUT': 5000})
+  assert options['poolclass'] is MeteredQueuePool and options['pool_size'] == 6
+  assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+  options = engine_options({'SQLALCHEMY_DATABASE_URI': POSTGRES, 'DB_POOL_SIZE': 4, 'WEB_CONCURRENCY': 3})
+  assert options['pool_size'] == 4
+
+
+def test_transaction_mode_leaves_pooling_to_pgbouncer():
+  options = engine_options({'SQLALCHEMY_DATABASE_URI': POSTGRES, 'DB_POOL_MODE': 'transaction'})
+  assert options == {'poolclass': NullPool, 'connect_args': {'prepare_threshold': None}}
+  assert engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}) == {}
+
+
+def test_checkouts_waits_and_timeouts_are_counted(tmp_path):
+  engine = create_engine('sqlite:///{}'.format(tmp_path / 'pool.db'), poolclass=MeteredQueuePool,
+                         pool_size=1, max_overflow=0, pool_timeout=0.05)
+  held = engine.connect()
+  with pytest.raises(exc.TimeoutError):
+    engine.connect()
+  status = pool_status(engine)
+  assert (status['checkouts'], status['waits'], status['timeouts']) == (2, 1, 1)
+  assert status['saturation'] == 1.0 and status['checkout_ms_max'] >= 50
+  held.close()
+  engine.connect().close()
+  status = pool_status(engine)
+  assert (status['checkouts'], status['waits'], status['saturation']) == (3, 1, 0.0)
+  engine.dispose()
+
+
+def test_metrics_route_reports_the_pool(client):
+  client.get('/venues')
+  pool = client.get('/_internal/metrics').get_json()['pool']
+  assert pool['pool'] == 'MeteredQueuePool' and pool['checkouts'] >= 1 and pool['timeouts'] == 0
+
+
+def test_route_statement_timeout(app):
+  @statement_timeout('SEARCH_STATEMENT_TIMEOUT')
+  def search():
+    return local_statement_timeout()
+  app.config['SEARCH_STATEMENT_TIMEOUT'] = 1500
+  with app.test_request_context():
+    assert view_statement_timeout(search) == 1500
+    assert str(search()) == 'SET LOCAL statement_timeout = 1500'
+  with app.test_request_context():
+    # Session mode sets the default at connect time.
+    assert local_statement_timeout() is None
+    app.config.update(DB_POOL_MODE='transaction', DB_STATEMENT_TIMEOUT=5000)
+    assert str(local_statement_timeout()) == 'SET LOCAL statement_timeout = 5000'
+    g.statement_timeout = 200
+    assert str(local_statement_timeout()) == 'SET LOCAL statement_timeout = 200'
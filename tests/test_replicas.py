@@ -0,0 +1,117 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from models import db, Venue
+from support import add_venue
+
+
+@pytest.fixture(autouse=True)
+def forget_replica_bind():
+  yield
+  # db is shared by every app; init_app() registered a metadata for the
+  # bind, which other tests' create_all() would then look for.
+  db.metadatas.pop('replica_1', None)
+
+
+def make_app(tmp_path, replica_url):
+  app = create_app(
+    SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'primary.db'),
+    SQLALCHEMY_BINDS={'replica_1': replica_url},
+    REPLICA_BINDS=['replica_1'],
+    # The health thread probes once on the first request, then waits.
+    REPLICA_CHECK_SECONDS=3600,
+    TESTING=True,
+    WTF_CSRF_ENABLED=False,
+    CACHE_BACKEND='none',
+    SHOW_ROLLOVER=False,
+    SHOW_PARTITIONS=False,
+    TYPEAHEAD_INDEX=False,
+    TEMPLATE_BUNDLE=str(tmp_path / 'templates'),
+    TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'),
+    STATIC_BUILD_DIR=str(tmp_path / 'static'),
+    SLOW_LOG_PATH=str(tmp_path / 'slow.log'),
+  )
+  with app.app_context():
+    db.create_all(bind_key=None)
+  return app
+
+
+@pytest.fixture
+def app(tmp_path):
+  app = make_app(tmp_path, 'sqlite:///{}'.format(tmp_path / 'replica.db'))
+  with app.app_context():
+    db.metadata.create_all(db.engines['replica_1'])
+    # Rows only the replica has tell where a read went.
+    with db.engines['replica_1'].begin() as connection:
+      connection.execute(insert(Venue), [{'name': 'Replica Hall', 'city': 'Austin', 'state': 'TX', 'genre_ids': []}])
+  yield app
+  with app.app_context():
+    db.session.remove()
+    for engine in db.engines.values():
+      engine.dispose()
+
+
+def venue_names(client):
+  return client.get('/api/v1/venues?group=none').get_json()['data']
+
+
+def replicas(app):
+  return app.extensions['replicas']
+
+
+def test_reads_go_to_a_replica(app, client, session):
+  add_venue(session, name='Primary Hall')
+  assert [venue['name'] for venue in venue_names(client)] == ['Replica Hall']
+  assert replicas(app).routed['replica_1'] == 1
+
+
+def test_a_write_pins_the_client_to_the_primary(app, client):
+  response = client.post('/venues/create', data={'name': 'Primary Hall', 'city': 'New York', 'state': 'NY',
+                                                 'phone': '914-003-1132', 'genres': ['Jazz']})
+  assert response.status_code == 200
+  assert 'read_primary_until' in response.headers['Set-Cookie']
+  assert [venue['name'] for venue in venue_names(client)] == ['Primary Hall']
+  assert replicas(app).routed['pinned'] == 1
+  # Another client still reads from the replica.
+  assert [venue['name'] for venue in venue_names(app.test_client())] == ['Replica Hall']
+
+
+def test_ejected_replica_is_skipped(app, client, session):
+  add_venue(session, name='Primary Hall')
+  replicas(app).eject('replica_1', 'test')
+  assert [venue['name'] for venue in venue_names(client)] == ['Primary Hall']
+  assert replicas(app).routed['no replica'] == 1
+  assert not replicas(app).stats()['replicas']['replica_1']['healthy']
+
+
+@pytest.fixture
+def broken_app(tmp_path):
+  app = make_app(tmp_path, 'sqlite:///{}'.format(tmp_path / 'missing' / 'replica.db'))
+  yield app
+  with app.app_context():
+    db.session.remove()
+    for engine in db.engines.values():
+      engine.dispose()
+
+
+def test_failing_replica_is_ejected(broken_app, monkeypatch):
+  # No probes: the query error alone must eject it.
+  monkeypatch.setattr(replicas(broken_app), '_run', lambda: None)
+  client = broken_app.test_client()
+  with pytest.raises(OperationalError):
+    client.get('/api/v1/venues?group=none')
+  assert not replicas(broken_app).state['replica_1']['healthy']
+  assert client.get('/api/v1/venues?group=none').status_code == 200
+
+
+def test_health_check_ejects_and_readmits(broken_app, tmp_path):
+  with broken_app.app_context():
+    replicas(broken_app).check()
+    assert not replicas(broken_app).state['replica_1']['healthy']
+    (tmp_path / 'missing').mkdir()
+    db.metadata.create_all(db.engines['replica_1'])
+    replicas(broken_app).state['replica_1']['ejected_until'] = 0
+    replicas(broken_app).check()
+  assert replicas(broken_app).state['replica_1']['healthy']
@@ -0,0 +1,17 @@
+from search import venue_search
+from support import add_venue
+
+
+def names(session, term):
+  return [hit['name'] for hit in venue_search(session, term).data]
+
+
+def test_index_sees_writes_it_was_not_told_about(session):
+  venue = add_venue(session, name='Jazz Hall')
+  assert names(session, 'hall') == ['Jazz Hall']
+  # Written by another worker: this one's index was never invalidated.
+  add_venue(session, name='Blues Hall')
+  assert sorted(names(session, 'hall')) == ['Blues Hall', 'Jazz Hall']
+  venue.name = 'Jazz Club'
+  session.commit()
+  assert names(session, 'hall') == ['Blues Hall']
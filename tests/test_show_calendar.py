@@ -0,0 +1,149 @@
+import os
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import exc, text
+from werkzeug.datastructures import MultiDict
+
+from app import create_app
+from models import db
+from show_calendar import calendar_query, calendar_range
+from show_partitions import create_partition, ensure_partitions, is_partitioned
+from support import add_artist, add_show, add_venue
+
+TODAY = date(2030, 3, 10)
+
+
+def range_of(**args):
+  return calendar_range(MultiDict(args), today=TODAY)
+
+
+def test_calendar_range():
+  assert range_of() is None
+  assert range_of(city='Austin') == (datetime(2030, 3, 10), datetime(2030, 4, 10), 'Austin')
+  # A `to` date is inclusive, a `to` date and time is not.
+  assert range_of(**{'from': '2030-03-01', 'to': '2030-03-31'})[:2] == (datetime(2030, 3, 1), datetime(2030, 4, 1))
+  assert range_of(to='2030-03-31T20:00:00')[:2] == (datetime(2030, 3, 10), datetime(2030, 3, 31, 20))
+  assert range_of(to='2030-01-31')[:2] == (datetime(2030, 1, 1), datetime(2030, 2, 1))
+
+
+@pytest.mark.parametrize('args', [
+  {'from': 'March'},
+  {'from': '2030-03-10', 'to': '2030-03-01'},
+  {'from': '2030-01-01', 'to': '2031-01-02'},
+])
+def test_unusable_ranges(args):
+  with pytest.raises(ValueError):
+    range_of(**args)
+
+
+@pytest.fixture
+def shows(session):
+  hall, club = add_venue(session, name='Venue Hall'), add_venue(session, name='Club', city='New York', state='NY')
+  artist = add_artist(session, name='The Band')
+  for venue, start in [(hall, datetime(2030, 2, 28, 20)), (hall, datetime(2030, 3, 1, 20)),
+                       (club, datetime(2030, 3, 2, 20)), (hall, datetime(2030, 3, 31, 20)),
+                       (hall, datetime(2030, 4, 1, 20))]:
+    add_show(session, venue, artist, start)
+  return hall, club
+
+
+def days_listed(response):
+  assert response.status_code == 200
+  body = response.get_data(as_text=True)
+  return [day for day in ('February 28', 'March 1', 'March 2', 'March 31', 'April 1') if day + ', 2030</h3>' in body]
+
+
+def test_calendar_lists_the_range(client, shows):
+  assert days_listed(client.get('/shows?from=2030-03-01&to=2030-03-31')) == ['March 1', 'March 2', 'March 31']
+  assert days_listed(client.get('/shows?from=2030-03-01&to=2030-03-31&city=New+York')) == ['March 2']
+  assert 'No shows in Austin' in client.get('/shows?from=2030-03-01&city=Austin').get_data(as_text=True)
+
+
+def test_calendar_pages_keep_the_filters(client, shows):
+  first = client.get('/shows?from=2030-03-01&to=2030-03-31&city=San+Francisco&limit=1').get_data(as_text=True)
+  assert 'March 1, 2030</h3>' in first
+  later = first.split('<li class="next"><a href="')[1].split('"')[0].replace('&amp;', '&')
+  assert 'city=San+Francisco' in later and 'to=2030-03-31' in later
+  assert days_listed(client.get(later)) == ['March 31']
+
+
+def test_calendar_refuses_overlong_and_unreadable_ranges(client):
+  assert client.get('/shows?from=2030-01-01&to=2031-06-01').status_code == 400
+  assert client.get('/shows?from=yesterday').status_code == 400
+
+
+def test_create_show_partitions_needs_postgres(app):
+  result = app.test_cli_runner().invoke(args=['create-show-partitions'])
+  assert result.exit_code == 2 and 'not partitioned' in result.output
+
+
+# Shows is only partitioned on Postgres, by migration c4a81f6e2d57; point
+# TEST_POSTGRES_URL at a scratch database, whose schema these tests drop and
+# migrate from scratch, to run them.
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+
+def reset_schema():
+  db.session.execute(text('DROP SCHEMA public CASCADE'))
+  db.session.execute(text('CREATE SCHEMA public'))
+  db.session.commit()
+
+
+@pytest.fixture
+def migrated_app(tmp_path):
+  from flask_migrate import Migrate, upgrade
+  app = create_app(SQLALCHEMY_DATABASE_URI=POSTGRES_URL, TESTING=True, CACHE_BACKEND='none',
+                   SHOW_ROLLOVER=False, SHOW_PARTITIONS=False, TYPEAHEAD_INDEX=False,
+                   TEMPLATE_BUNDLE=str(tmp_path / 'templates'), TEMPLATE_CACHE_DIR=str(tmp_path / 'jinja'),
+                   SLOW_LOG_PATH=str(tmp_path / 'slow.log'))
+  Migrate(app, db)
+  with app.app_context():
+    reset_schema()
+    upgrade(directory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations'))
+  yield app
+  with app.app_context():
+    db.session.remove()
+    reset_schema()
+    db.engine.dispose()
+
+
+def partition_of(show):
+  return db.session.execute(text('SELECT tableoid::regclass::text FROM "Shows" WHERE id = :id'),
+                            {'id': show.id}).scalar()
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='needs TEST_POSTGRES_URL')
+def test_partitions_are_created_ahead(migrated_app):
+  with migrated_app.app_context():
+    with db.engine.begin() as connection:
+      assert is_partitioned(connection)
+      assert ensure_partitions(connection, now=datetime(2040, 1, 15), ahead=2) == [
+        'Shows_2040_01', 'Shows_2040_02', 'Shows_2040_03']
+    with db.engine.begin() as connection:
+      assert ensure_partitions(connection, now=datetime(2040, 1, 15), ahead=2) == []
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='needs TEST_POSTGRES_URL')
+def test_new_partition_takes_over_its_shows(migrated_app):
+  with migrated_app.app_context():
+    venue, artist = add_venue(db.session, name='Venue Hall'), add_artist(db.session, name='The Band')
+    show = add_show(db.session, venue, artist, datetime(2041, 6, 5, 20))
+    assert partition_of(show) == '"Shows_default"'
+    db.session.commit()
+    with db.engine.begin() as connection:
+      assert create_partition(connection, datetime(2041, 6, 1)) == 'Shows_2041_06'
+    assert partition_of(show) == '"Shows_2041_06"'
+    db.session.commit()
+    # The new partition refuses double bookings like the others.
+    with pytest.raises(exc.IntegrityError):
+      add_show(db.session, venue, add_artist(db.session, name='Other Band'), datetime(2041, 6, 5, 21))
+    db.session.rollback()
+    # The calendar of June only reads June's partition.
+    calendar = range_of(**{'from': '2041-06-01', 'to': '2041-06-30'})
+    query = calendar_query(db.session, calendar)
+    compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    plan = '\n'.join(db.session.execute(text('EXPLAIN ' + str(compiled))).scalars())
+    assert 'Shows_2041_06' in plan and 'Shows_default' not in plan
+  response = migrated_app.test_client().get('/shows?from=2041-06-01&to=2041-06-30')
+  assert 'The Band' in response.get_data(as_text=True)
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+
+import pytest
+
+from app import create_app
+from models import db
+from templating import MANIFEST, compile_bundle
+
+
+@pytest.fixture
+def restart(app):
+  """Build another app from `app`'s config, as a newly started worker would."""
+  started = []
+
+  def restart():
+    started.append(create_app(**app.config))
+    return started[-1]
+  yield restart
+  for other in started:
+    with other.app_context():
+      db.engine.dispose()
+
+
+def bundle_of(app):
+  return app.config['TEMPLATE_BUNDLE']
+
+
+def test_compiled_bundle_is_loaded(app, restart):
+  count = compile_bundle(app, bundle_of(app))
+  with open(os.path.join(bundle_of(app), MANIFEST)) as f:
+    assert len(json.load(f)['templates']) == count
+  worker = restart()
+  assert worker.extensions['templates'].bundle == bundle_of(app)
+  template = worker.jinja_env.get_template('pages/home.html')
+  assert os.path.dirname(template.filename) == bundle_of(app)
+  assert worker.test_client().get('/').get_data() == app.test_client().get('/').get_data()
+
+
+def test_stale_bundle_falls_back_to_the_sources(app, restart, caplog):
+  compile_bundle(app, bundle_of(app))
+  path = os.path.join(bundle_of(app), MANIFEST)
+  with open(path) as f:
+    manifest = json.load(f)
+  # As if pages/home.html had been edited since the bundle was built.
+  manifest['templates']['pages/home.html'] = '0' * 40
+  with open(path, 'w') as f:
+    json.dump(manifest, f)
+  with caplog.at_level(logging.WARNING, logger='templating'):
+    worker = restart()
+  assert worker.extensions['templates'].bundle is None
+  assert 'is stale' in caplog.text
+  template = worker.jinja_env.get_template('pages/home.html')
+  assert template.filename.endswith(os.path.join('templates', 'pages', 'home.html'))
+  assert worker.test_client().get('/').status_code == 200
+
+
+def test_sources_share_a_bytecode_cache(app, client):
+  assert client.get('/').status_code == 200
+  assert os.listdir(app.config['TEMPLATE_CACHE_DIR'])
+  render_ms = client.get('/_internal/metrics').get_json()['templates']['render_ms']
+  assert render_ms['pages/home.html']['renders'] == 1
+
+
+def test_compile_templates_command(app, tmp_path):
+  result = app.test_cli_runner().invoke(args=['compile-templates', '--target', str(tmp_path / 'bundle')])
+  assert result.exit_code == 0, result.output
+  assert 'compiled' in result.output and os.path.exists(str(tmp_path / 'bundle' / MANIFEST))
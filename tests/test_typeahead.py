@@ -0,0 +1,50 @@
+from query_plans import BACKGROUND_JOBS, without_background_jobs
+from support import add_artist
+import typeahead as typeahead_module
+from typeahead import TypeaheadIndex
+
+
+def test_index_search():
+  index = TypeaheadIndex([(1, 'The Wild Sax Band', 3), (2, 'Sax Trio', 0), (3, 'Café Sax', 5)])
+  assert index.search('sax') == [(3, 'Café Sax'), (1, 'The Wild Sax Band'), (2, 'Sax Trio')]
+  assert index.search('cafe s') == [(3, 'Café Sax')]
+  index.put(2, 'Sax Trio', 9)
+  index.remove(3)
+  assert index.search('sax', limit=1) == [(2, 'Sax Trio')]
+
+
+def test_index_is_built_on_first_lookup(app, client, session):
+  app.config['TYPEAHEAD_INDEX'] = True
+  typeahead = app.extensions['typeahead']
+  add_artist(session, name='The Wild Sax Band')
+  client.get('/artists')
+  assert typeahead._thread is None
+  response = client.get('/api/typeahead/artists?q=wild')
+  assert response.get_json()['data'] == [{'id': 1, 'name': 'The Wild Sax Band'}]
+  typeahead._thread.join(5)
+  assert client.get('/api/typeahead/artists?q=sax').get_json()['data'][0]['name'] == 'The Wild Sax Band'
+  assert 'artists' in typeahead.indexes
+
+
+def test_index_sees_writes_of_other_workers(app, client, session, monkeypatch):
+  monkeypatch.setattr(typeahead_module, 'VERSION_CHECK_SECONDS', 0)
+  app.config['TYPEAHEAD_INDEX'] = True
+  typeahead = app.extensions['typeahead']
+  add_artist(session, name='The Wild Sax Band')
+  client.get('/api/typeahead/artists?q=sax')
+  typeahead._thread.join(5)
+  # Written by another worker, or by flask import-data: nobody called refresh().
+  add_artist(session, name='Sax Trio')
+  client.get('/api/typeahead/artists?q=sax')
+  typeahead._thread.join(5)
+  names = [hit['name'] for hit in client.get('/api/typeahead/artists?q=sax').get_json()['data']]
+  assert sorted(names) == ['Sax Trio', 'The Wild Sax Band']
+
+def test_without_background_jobs(app, client):
+  app.config.update(SHOW_ROLLOVER=True, SHOW_PARTITIONS=True, TYPEAHEAD_INDEX=True)
+  with without_background_jobs(app):
+    client.get('/api/typeahead/venues?q=hall')
+  assert app.extensions['typeahead']._thread is None
+  assert app.extensions['show_partitions']._thread is None
+  assert app.extensions['show_rollover']._thread is None
+  assert all(app.config[key] for key in BACKGROUND_JOBS)
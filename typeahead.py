@@ -0,0 +1,293 @@
+#----------------------------------------------------------------------------#
+# Typeahead.
+#----------------------------------------------------------------------------#
+import bisect
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from flask import Blueprint, abort, current_app, request
+
+from api import conditional, json_response
+from database import table_version
+from models import db, Venue, Artist
+
+logger = logging.getLogger(__name__)
+
+typeahead = Blueprint('typeahead', __name__, url_prefix='/api/typeahead')
+typeahead.after_request(conditional)
+
+MODELS = {'artists': Artist, 'venues': Venue}
+DEFAULT_RESULTS = 10
+MAX_RESULTS = 20
+# Seconds between table_version checks of one index; each is a COUNT.
+VERSION_CHECK_SECONDS = 1.0
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+  """Lower case without diacritics: 'Café Öre' -> 'cafe ore'."""
+  text = text or ''
+  if text.isascii():
+    return text.lower()
+  decomposed = unicodedata.normalize('NFKD', text)
+  return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokens(text):
+  return _TOKEN.findall(fold(text))
+
+
+class TypeaheadIndex(object):
+  """Word-prefix index over (id, name, rank): most upcoming shows first, then shorter names.
+
+  `entries` is a sorted array of (folded word, id), one per distinct word
+  of each name, so the names with a word starting with a prefix are one
+  contiguous slice found by bisection. Slices longer than HEAVY (short or
+  very common prefixes) get a cached list of their ids in rank order; the
+  first `limit` ids of it that match the rest of the query are the
+  answer, so a query never sorts more than HEAVY ids. One and two letter
+  prefixes are ranked up front, longer ones on first use. Writes update
+  the array and the cached lists in place.
+  """
+
+  HEAVY = 256
+  RANKED_UP_FRONT = 2
+
+  def __init__(self, rows=()):
+    self.entries = []
+    self.items = {}
+    self.ranked = {}
+    self._lock = threading.RLock()
+    for id, name, rank in rows:
+      words, score = self._describe(id, name, rank)
+      self.items[id] = (name, words, score)
+      self.entries.extend((word, id) for word in words)
+    self.entries.sort()
+    self._rank_short_prefixes()
+
+  def __len__(self):
+    return len(self.items)
+
+  def _describe(self, id, name, rank):
+    words = tuple(sorted(set(sys.intern(word) for word in _TOKEN.findall(fold(name)))))
+    return words, (-(rank or 0), len(name or ''), id)
+
+  def _score(self, id):
+    return self.items[id][2]
+
+  def _rank_short_prefixes(self):
+    # One pass over the names in rank order fills every short prefix list
+    # already sorted; most of them are heavy.
+    lists = {}
+    for id in sorted(self.items, key=self._score):
+      prefixes = set(word[:n] for word in self.items[id][1] for n in range(1, self.RANKED_UP_FRONT + 1))
+      for prefix in prefixes:
+        lists.setdefault(prefix, []).append(id)
+    self.ranked = dict((prefix, ids) for prefix, ids in lists.items() if len(ids) > self.HEAVY)
+
+  def _range(self, prefix):
+    lo = bisect.bisect_left(self.entries, (prefix,))
+    hi = bisect.bisect_left(self.entries, (prefix + '\U0010ffff',), lo)
+    return lo, hi
+
+  def _in_order(self, prefix, lo, hi):
+    ranked = self.ranked.get(prefix)
+    if ranked is None:
+      ranked = sorted(set(id for word, id in self.entries[lo:hi]), key=self._score)
+      if hi - lo > self.HEAVY:
+        self.ranked[prefix] = ranked
+    return ranked
+
+  def _cached_prefixes(self, words):
+    return set(word[:n] for word in words for n in range(1, len(word) + 1) if word[:n] in self.ranked)
+
+  def search(self, query, limit=DEFAULT_RESULTS):
+    """[(id, name)] whose words start with every token of `query`, best first."""
+    wanted = tokens(query)
+    if not wanted:
+      return []
+    with self._lock:
+      ranges = [(self._range(token), token) for token in set(wanted)]
+      (lo, hi), token = min(ranges, key=lambda r: r[0][1] - r[0][0])
+      others = [other for other in wanted if other != token]
+      results = []
+      for id in self._in_order(token, lo, hi):
+        name, words, score = self.items[id]
+        if all(any(word.startswith(other) for word in words) for other in others):
+          results.append((id, name))
+          if len(results) >= limit:
+            break
+      return results
+
+  def put(self, id, name, rank=0):
+    """Add or replace one name; a new rank alone only reorders the cached lists."""
+    with self._lock:
+      words, score = self._describe(id, name, rank)
+      old = self.items.get(id)
+      if old is not None and old[1] == words:
+        self._unrank(id, words)
+        self.items[id] = (name, words, score)
+        self._rank(id, words)
+        return
+      self.remove(id)
+      self.items[id] = (name, words, score)
+      for word in words:
+        bisect.insort(self.entries, (word, id))
+      self._rank(id, words)
+
+  def remove(self, id):
+    with self._lock:
+      if id not in self.items:
+        return
+      name, words, score = self.items[id]
+      self._unrank(id, words)
+      for word in words:
+        i = bisect.bisect_left(self.entries, (word, id))
+        if i < len(self.entries) and self.entries[i] == (word, id):
+          del self.entries[i]
+      del self.items[id]
+
+  def _rank(self, id, words):
+    for prefix in self._cached_prefixes(words):
+      bisect.insort(self.ranked[prefix], id, key=self._score)
+
+  def _unrank(self, id, words):
+    score = self._score(id)
+    for prefix in self._cached_prefixes(words):
+      ranked = self.ranked[prefix]
+      i = bisect.bisect_left(ranked, score, key=self._score)
+      if i < len(ranked) and ranked[i] == id:
+        del ranked[i]
+
+
+def _rows(session, model):
+  query = session.query(model.id, model.name, model.upcoming_show_count)
+  return query.execution_options(yield_per=10000)
+
+
+def _database_search(session, model, query, limit):
+  # Until the index is built: names with a word starting with each word of
+  # the query. ILIKE neither folds diacritics nor splits words on
+  # punctuation, so unlike the index 'cafe' misses 'Café' and 'sax' misses
+  # 'Jazz-Sax'; these lookups are the first few of a worker only.
+  words = query.split()
+  if not words:
+    return []
+  rows = session.query(model.id, model.name)
+  for word in words:
+    term = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    rows = rows.filter(model.name.ilike(term + '%', escape='\\') | model.name.ilike('% ' + term + '%', escape='\\'))
+  rows = rows.order_by(model.upcoming_show_count.desc(), model.name, model.id).limit(limit)
+  return [(id, name) for id, name in rows]
+
+
+class Typeahead(object):
+  """Per-worker typeahead indexes of artist and venue names.
+
+  Built in a background thread on the worker's first typeahead lookup
+  (unless TYPEAHEAD_INDEX is off); until then lookups go to the database.
+  Write handlers call refresh() with the ids they touched, and the entries
+  are re-read, replaced or dropped. Writes of other workers and of
+  `flask import-data` are caught by a table_version check, at most every
+  VERSION_CHECK_SECONDS: once it has moved, the index is rebuilt in the background and
+  the old one answers until the new one is ready.
+  """
+
+  def __init__(self, app=None):
+    self.indexes = {}
+    self.versions = {}
+    self._checked = {}
+    self._pending = dict((kind, set()) for kind in MODELS)
+    self._lock = threading.Lock()
+    self._thread = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.app = app
+    app.extensions['typeahead'] = self
+
+  def start(self):
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._build, name='typeahead-index', daemon=True)
+        self._thread.start()
+
+  def _build(self):
+    with self.app.app_context():
+      for kind, model in MODELS.items():
+        try:
+          # Read before the rows: a write landing meanwhile moves it again.
+          version = table_version(db.session, model)
+          if kind in self.indexes and self.versions.get(kind) == version:
+            continue
+          index = TypeaheadIndex(_rows(db.session, model))
+        except Exception:
+          logger.exception('building the %s typeahead index failed', kind)
+          continue
+        finally:
+          db.session.remove()
+        with self._lock:
+          self.indexes[kind] = index
+          self.versions[kind] = version
+          pending, self._pending[kind] = self._pending[kind], set()
+        self.refresh(db.session, kind, pending)
+        logger.info('typeahead index of %d %s ready', len(index), kind)
+      db.session.remove()
+
+  def search(self, session, kind, query, limit=DEFAULT_RESULTS):
+    index = self.indexes.get(kind)
+    if self.app.config.get('TYPEAHEAD_INDEX', True):
+      if index is None or self._changed(session, kind):
+        self.start()
+    if index is None:
+      return _database_search(session, MODELS[kind], query, limit)
+    return index.search(query, limit=limit)
+
+  def _changed(self, session, kind):
+    now = time.monotonic()
+    if now - self._checked.get(kind, 0.0) < VERSION_CHECK_SECONDS:
+      return False
+    self._checked[kind] = now
+    return self.versions.get(kind) != table_version(session, MODELS[kind])
+
+  def refresh(self, session, kind, ids):
+    """Re-read the names and ranks of `ids` after a write."""
+    ids = set(ids)
+    with self._lock:
+      index = self.indexes.get(kind)
+      if index is None:
+        if self._thread is not None:
+          self._pending[kind].update(ids)
+        return
+    if not ids:
+      return
+    model = MODELS[kind]
+    found = dict((id, (name, rank)) for id, name, rank in _rows(session, model).filter(model.id.in_(ids)))
+    for id in ids:
+      if id in found:
+        index.put(id, *found[id])
+      else:
+        index.remove(id)
+
+
+def refresh_typeahead(session, kind, *ids):
+  current_app.extensions['typeahead'].refresh(session, kind, ids)
+
+
+@typeahead.route('/<kind>')
+def suggest(kind):
+  if kind not in MODELS:
+    abort(404)
+  try:
+    limit = min(max(int(request.args.get('limit', DEFAULT_RESULTS)), 1), MAX_RESULTS)
+  except ValueError:
+    limit = DEFAULT_RESULTS
+  query = request.args.get('q', '')
+  hits = current_app.extensions['typeahead'].search(db.session, kind, query, limit=limit)
+  return json_response({'query': query, 'data': [{'id': id, 'name': name} for id, name in hits]})